@@ -19,11 +19,21 @@ class Settings(BaseSettings):
     echo_sql: bool = Field(True, env='ECHO_SQL')
     version: str = Field(..., env='VERSION')
     description: str = Field(..., env='DESCRIPTION')
+    candle_cache_max_entries: int = Field(10_000, env='CANDLE_CACHE_MAX_ENTRIES')
+    candle_cache_max_bytes: int = Field(64 * 1024 * 1024, env='CANDLE_CACHE_MAX_BYTES')
+    raw_pool_min_size: int = Field(2, env='RAW_POOL_MIN_SIZE')
+    raw_pool_max_size: int = Field(10, env='RAW_POOL_MAX_SIZE')
+    raw_statement_cache_size: int = Field(256, env='RAW_STATEMENT_CACHE_SIZE')
 
     @property
     def asyncpg_database_url(self):
         return f'postgresql+asyncpg://{self.db_user}:{self.db_password}@{self.db_host}/{self.db_user}'
 
+    @property
+    def asyncpg_dsn(self):
+        """Plain DSN for asyncpg itself, without the SQLAlchemy driver prefix."""
+        return f'postgresql://{self.db_user}:{self.db_password}@{self.db_host}/{self.db_user}'
+
     @property
     def database_psycopg_url(self):
         return f'postgresql+psycopg2://{self.db_user}:{self.db_password}@{self.db_host}/{self.db_user}'
@@ -0,0 +1,89 @@
+import re
+from typing import Optional
+
+import numpy as np
+
+from core.candles import CandleFrame
+
+DAY = 24 * 60 * 60
+
+# Dividends are announced as a ratio of the par value, prices are stored in thousands of VND.
+PAR_VALUE_VND = 10_000
+PRICE_UNIT_VND = 1_000
+
+# Ex-right dates are published as midnight Asia/Ho_Chi_Minh (UTC+7).
+VIETNAM_UTC_OFFSET = 7 * 60 * 60
+
+RATIO_PATTERN = re.compile(r"tỉ lệ\s*([\d.,:/]+)")
+
+
+def parse_ratio(title: Optional[str]) -> Optional[float]:
+    """
+    The ratio of a dividend event title, e.g. ``"PAN: chia cổ tức bằng tiền, tỉ lệ 0.05 (500 đồng/cổ phiếu)"``.
+    ``a/b`` and ``a:b`` (``b`` new shares for ``a`` held) are accepted as well.
+    """
+    match = RATIO_PATTERN.search(title or "")
+    if not match:
+        return None
+    ratio = match.group(1).rstrip(".,").replace(",", ".")
+    try:
+        if "/" in ratio:
+            numerator, denominator = ratio.split("/", 1)
+            return float(numerator) / float(denominator)
+        if ":" in ratio:
+            held, issued = ratio.split(":", 1)
+            return float(issued) / float(held)
+        return float(ratio)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def ex_date_epoch(exright_date: int) -> int:
+    """Midnight UTC of the Vietnamese calendar day of ``exright_date``, which is where the daily bar starts."""
+    local_day = (int(exright_date) + VIETNAM_UTC_OFFSET) // DAY
+    return local_day * DAY
+
+
+def event_factor(event_type: str, ratio: Optional[float], previous_close: Optional[float]) -> Optional[float]:
+    """
+    Price multiplier for the bars before the ex-right date, ``None`` when the event does not adjust prices.
+
+    Cash dividends remove the paid amount from the previous close, stock dividends and bonus shares
+    divide the price by ``1 + ratio``. Rights issues are left out, their subscription price is not
+    part of the event.
+    """
+    if not ratio or ratio <= 0:
+        return None
+    if event_type == "cash":
+        if not previous_close:
+            return None
+        dividend = ratio * PAR_VALUE_VND / PRICE_UNIT_VND
+        if dividend >= previous_close:
+            return None
+        return (previous_close - dividend) / previous_close
+    if event_type == "stock":
+        return 1.0 / (1.0 + ratio)
+    return None
+
+
+def cumulative_factors(factors: np.ndarray) -> np.ndarray:
+    """For events sorted by ex-date, the product of each factor with all the later ones."""
+    return np.cumprod(factors[::-1])[::-1]
+
+
+def apply_adjustments(frame: CandleFrame, ex_dates: np.ndarray, cumulative: np.ndarray) -> CandleFrame:
+    """
+    Back-adjust ``frame``: a bar is multiplied by the cumulative factor of the first event after it,
+    volumes are divided by the same multiplier.
+    """
+    if not len(frame) or not ex_dates.shape[0]:
+        return frame
+    multiplier = np.append(cumulative, 1.0)[np.searchsorted(ex_dates, frame.t, side="right")]
+    return CandleFrame(
+        frame.t,
+        frame.o * multiplier,
+        frame.h * multiplier,
+        frame.l * multiplier,
+        frame.c * multiplier,
+        np.rint(frame.v / multiplier),
+    )
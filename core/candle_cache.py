@@ -0,0 +1,207 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional, Protocol
+
+from config import get_settings
+from core.candles import CandleFrame
+
+DAY = 24 * 60 * 60
+
+# Width of one cache block per continuous aggregate, wide enough to hold a useful number of bars.
+BLOCK_SECONDS = {
+    "one_day_candle": 128 * DAY,
+    "one_week_candle": 3 * 364 * DAY,
+    "one_month_candle": 10 * 365 * DAY,
+    "three_months_candle": 20 * 365 * DAY,
+    "six_months_candle": 20 * 365 * DAY,
+    "one_year_candle": 50 * 365 * DAY,
+}
+
+# Upper bound of one bar per view, a block ending before ``now - bar`` only holds closed bars.
+MAX_BAR_SECONDS = {
+    "one_day_candle": DAY,
+    "one_week_candle": 7 * DAY,
+    "one_month_candle": 31 * DAY,
+    "three_months_candle": 92 * DAY,
+    "six_months_candle": 184 * DAY,
+    "one_year_candle": 366 * DAY,
+}
+
+DEFAULT_BLOCK_SECONDS = 128 * DAY
+
+
+class CacheStorage(Protocol):
+    """Backend of :class:`CandleCache`, implement it to keep the blocks somewhere else than in-process."""
+
+    def get(self, key: Hashable) -> Optional[Any]: ...
+
+    def set(self, key: Hashable, value: Any, size: int) -> None: ...
+
+    def delete(self, key: Hashable) -> None: ...
+
+    def keys(self) -> list: ...
+
+    def clear(self) -> None: ...
+
+
+class LRUStorage:
+    """In-process storage evicting the least recently used entries once ``max_entries`` or ``max_bytes`` is hit."""
+
+    def __init__(self, max_entries: int = 10_000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries: OrderedDict = OrderedDict()
+        # The refresh job invalidates from the scheduler thread.
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, size):
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def delete(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.current_bytes -= entry[1]
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries.keys())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+
+Fetcher = Callable[[int, int], Awaitable[CandleFrame]]
+
+
+class CandleCache:
+    """
+    Cache of closed candles keyed by ``(symbol, view, block_start)``.
+
+    Requests are split into blocks aligned on ``BLOCK_SECONDS``. Blocks which can only contain
+    closed bars are served from the storage, missing ones are fetched in as few range queries
+    as possible, and the block holding the open bar is always read from the database.
+    """
+
+    def __init__(self, storage: CacheStorage):
+        self.storage = storage
+
+    @staticmethod
+    def block_seconds(view: str) -> int:
+        return BLOCK_SECONDS.get(view, DEFAULT_BLOCK_SECONDS)
+
+    async def get_frame(self, symbol: str, view: str, start: int, end: int, fetch: Fetcher,
+                        now: Optional[int] = None) -> CandleFrame:
+        """
+        Return the candles of ``symbol`` in ``view`` with ``start <= t <= end``.
+        ``fetch(start, end)`` reads an inclusive epoch range from the database.
+        """
+        now = int(time.time()) if now is None else now
+        size = self.block_seconds(view)
+        closed_before = now - MAX_BAR_SECONDS.get(view, DAY)
+
+        frames = []
+        missing = []
+        block = (start // size) * size
+        while block <= end and block + size <= closed_before:
+            cached = self.storage.get((symbol, view, block))
+            if cached is None:
+                missing.append(block)
+            else:
+                if missing:
+                    frames.append(await self._load_blocks(symbol, view, missing, fetch))
+                    missing = []
+                frames.append(cached)
+            block += size
+        if missing:
+            frames.append(await self._load_blocks(symbol, view, missing, fetch))
+
+        if block <= end:
+            # Open block: never cached, only the requested part is read.
+            frames.append(await fetch(max(block, start), end))
+
+        return CandleFrame.concat(frames).between(start, end)
+
+    async def _load_blocks(self, symbol: str, view: str, blocks: list, fetch: Fetcher) -> CandleFrame:
+        size = self.block_seconds(view)
+        frame = await fetch(blocks[0], blocks[-1] + size - 1)
+        for block in blocks:
+            part = frame.between(block, block + size - 1)
+            self.storage.set((symbol, view, block), part, part.nbytes)
+        return frame
+
+    def invalidate_view(self, view: str, symbol: Optional[str] = None):
+        for key in self.storage.keys():
+            if key[1] == view and (symbol is None or key[0] == symbol):
+                self.storage.delete(key)
+
+    def clear(self):
+        self.storage.clear()
+
+
+class ResultCache:
+    """
+    Whole results derived from a view (downsampled series, indicators) keyed by ``(symbol, view, key)``
+    and dropped together with the view's candle blocks.
+    """
+
+    def __init__(self, storage: CacheStorage):
+        self.storage = storage
+
+    def get(self, symbol: str, view: str, key: Hashable):
+        return self.storage.get((symbol, view, key))
+
+    def set(self, symbol: str, view: str, key: Hashable, value, size: int):
+        self.storage.set((symbol, view, key), value, size)
+
+    def invalidate_view(self, view: str, symbol: Optional[str] = None):
+        for key in self.storage.keys():
+            if key[1] == view and (symbol is None or key[0] == symbol):
+                self.storage.delete(key)
+
+    def clear(self):
+        self.storage.clear()
+
+
+candle_cache = CandleCache(
+    LRUStorage(
+        max_entries=get_settings().candle_cache_max_entries,
+        max_bytes=get_settings().candle_cache_max_bytes,
+    )
+)
+
+downsample_cache = ResultCache(LRUStorage(max_entries=2_000, max_bytes=16 * 1024 * 1024))
+
+indicator_cache = ResultCache(LRUStorage(max_entries=5_000, max_bytes=32 * 1024 * 1024))
+
+VIEW_CACHES = [candle_cache, downsample_cache, indicator_cache]
+
+# Adjustment factors per symbol, cleared once scripts/compute_price_adjustments.py has run.
+adjustment_cache = LRUStorage(max_entries=5_000, max_bytes=8 * 1024 * 1024)
+
+
+def invalidate_view(view: str, symbol: Optional[str] = None):
+    """Drop everything cached from ``view``, call it once the view has been refreshed."""
+    for cache in VIEW_CACHES:
+        cache.invalidate_view(view, symbol)
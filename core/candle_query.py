@@ -0,0 +1,156 @@
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import text
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+STOCK_PRICE_TABLE = "stockprice"
+
+# Assumed spacing of the raw ``stockprice`` rows, used to estimate how many rows a scan touches.
+RAW_ROW_SECONDS = MINUTE
+
+# Below this range, bucketing ``stockprice`` directly is cheap and avoids the aggregates refresh lag.
+RAW_RANGE_SECONDS = 2 * DAY
+
+CANDLE_COLUMNS_SQL = "open, high, low, close, volume"
+
+
+@dataclass(frozen=True)
+class Resolution:
+    name: str
+    interval: str
+    seconds: int
+    view: Optional[str] = None
+
+
+RESOLUTIONS = {
+    resolution.name: resolution for resolution in (
+        Resolution("1", "1 minute", MINUTE, "one_minute_candle"),
+        Resolution("3", "3 minutes", 3 * MINUTE),
+        Resolution("5", "5 minutes", 5 * MINUTE),
+        Resolution("15", "15 minutes", 15 * MINUTE, "fifteen_minutes_candle"),
+        Resolution("30", "30 minutes", 30 * MINUTE),
+        Resolution("45", "45 minutes", 45 * MINUTE),
+        Resolution("1H", "1 hour", HOUR, "one_hour_candle"),
+        Resolution("2H", "2 hours", 2 * HOUR),
+        Resolution("4H", "4 hours", 4 * HOUR),
+        Resolution("1D", "1 day", DAY, "one_day_candle"),
+        Resolution("1W", "1 week", 7 * DAY, "one_week_candle"),
+        Resolution("1M", "1 month", 30 * DAY, "one_month_candle"),
+        Resolution("3M", "3 months", 91 * DAY, "three_months_candle"),
+        Resolution("6M", "6 months", 182 * DAY, "six_months_candle"),
+        Resolution("1Y", "1 year", 365 * DAY, "one_year_candle"),
+    )
+}
+
+# Bucket width of every continuous aggregate, a refresh window has to start on one of its buckets.
+VIEW_INTERVALS = {resolution.view: resolution.interval for resolution in RESOLUTIONS.values() if resolution.view}
+
+# Intraday continuous aggregates which can be re-bucketed into coarser intraday bars.
+INTRADAY_VIEWS = {
+    resolution.view: resolution.seconds
+    for resolution in RESOLUTIONS.values() if resolution.view and resolution.seconds < DAY
+}
+
+
+@dataclass(frozen=True)
+class QueryPlan:
+    resolution: Resolution
+    relation: str
+    rebucket: bool
+    estimated_rows: int
+
+    @property
+    def is_view(self) -> bool:
+        return self.relation != STOCK_PRICE_TABLE and not self.rebucket
+
+
+def plan_query(resolution: Resolution, start: int, end: int, existing_views: set) -> QueryPlan:
+    """
+    Pick the cheapest source for ``resolution`` over ``[start, end]``.
+
+    A continuous aggregate of the exact resolution is read as is. Intraday bars without their
+    own aggregate are built with ``time_bucket`` either over ``stockprice`` (short or recent
+    ranges, always fresh) or over the coarsest intraday aggregate whose bucket divides them.
+    """
+    span = max(end - start, 0)
+    if resolution.view in existing_views and (resolution.seconds >= DAY or span > RAW_RANGE_SECONDS):
+        return QueryPlan(resolution, resolution.view, False, span // resolution.seconds + 1)
+
+    candidates = [QueryPlan(resolution, STOCK_PRICE_TABLE, True, span // RAW_ROW_SECONDS + 1)]
+    if span > RAW_RANGE_SECONDS:
+        for view, seconds in INTRADAY_VIEWS.items():
+            if view in existing_views and seconds < resolution.seconds and resolution.seconds % seconds == 0:
+                candidates.append(QueryPlan(resolution, view, True, span // seconds + 1))
+    # On a tie the pre-aggregated view wins, it is already materialized.
+    return min(candidates, key=lambda plan: (plan.estimated_rows, plan.relation == STOCK_PRICE_TABLE))
+
+
+def candle_sql(plan: QueryPlan, multi_symbol: bool = False, order: str = "ASC", limit: bool = False):
+    """
+    SQL returning ``t`` (epoch seconds) followed by OHLCV for ``plan``, prefixed by ``symbol``
+    when ``multi_symbol`` is set. Binds ``:start_datetime``, ``:end_datetime``, ``:symbol`` or
+    ``:symbols`` and ``:limit`` when ``limit`` is set.
+    """
+    symbol_filter = "symbol = ANY(:symbols)" if multi_symbol else "symbol = :symbol"
+    symbol_column = "symbol, " if multi_symbol else ""
+    limit_clause = "LIMIT :limit" if limit else ""
+    time_column = '"time"' if plan.relation == STOCK_PRICE_TABLE else "ts"
+
+    if not plan.rebucket:
+        return text(f"""
+            SELECT {symbol_column}EXTRACT(EPOCH FROM ts)::BIGINT AS t, {CANDLE_COLUMNS_SQL}
+            FROM {plan.relation}
+            WHERE {symbol_filter}
+                AND ts BETWEEN :start_datetime AND :end_datetime
+            ORDER BY {symbol_column}ts {order}
+            {limit_clause};
+        """)
+
+    return text(f"""
+        SELECT {symbol_column}EXTRACT(EPOCH FROM bucket)::BIGINT AS t, {CANDLE_COLUMNS_SQL}
+        FROM (
+            SELECT
+                {symbol_column}time_bucket(INTERVAL '{plan.resolution.interval}', {time_column}) AS bucket,
+                first(open, {time_column}) AS open,
+                max(high) AS high,
+                min(low) AS low,
+                last(close, {time_column}) AS close,
+                sum(volume) AS volume
+            FROM {plan.relation}
+            WHERE {symbol_filter}
+                AND {time_column} BETWEEN :start_datetime AND :end_datetime
+            GROUP BY {symbol_column}bucket
+        ) AS buckets
+        ORDER BY {symbol_column}bucket {order}
+        {limit_clause};
+    """)
+
+
+def align_start(resolution: Resolution, start: int) -> int:
+    """Move ``start`` back to the beginning of its intraday bucket so the first bar is complete."""
+    if resolution.seconds >= DAY:
+        return start
+    return start - start % resolution.seconds
+
+
+_existing_views: set = set()
+_existing_views_loaded_at: Optional[float] = None
+EXISTING_VIEWS_TTL = 10 * 60
+
+
+async def existing_views(session) -> set:
+    """Names of the continuous aggregates present in the database, cached for ``EXISTING_VIEWS_TTL``."""
+    global _existing_views, _existing_views_loaded_at
+
+    if _existing_views_loaded_at is None or time.monotonic() - _existing_views_loaded_at > EXISTING_VIEWS_TTL:
+        queryset = await session.execute(
+            text("SELECT view_name FROM timescaledb_information.continuous_aggregates;")
+        )
+        _existing_views = {row[0] for row in queryset.all()}
+        _existing_views_loaded_at = time.monotonic()
+    return _existing_views
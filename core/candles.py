@@ -0,0 +1,103 @@
+import io
+
+import numpy as np
+import pyarrow as pa
+
+CANDLE_COLUMNS = ("t", "o", "h", "l", "c", "v")
+
+# Row layout used when writing the candles as a single .npy payload.
+NPY_DTYPE = np.dtype([
+    ("t", "<i8"),
+    ("o", "<f8"),
+    ("h", "<f8"),
+    ("l", "<f8"),
+    ("c", "<f8"),
+    ("v", "<i8"),
+])
+
+
+class CandleFrame:
+    """
+    Columnar OHLCV candles.
+
+    Every column is a contiguous NumPy array so the frame can be sliced, concatenated
+    and encoded (JSON, Arrow, npy) without going through per-row Python objects.
+    ``t`` holds UTC epoch seconds, ``o/h/l/c`` are float64 and ``v`` is int64.
+    """
+
+    __slots__ = CANDLE_COLUMNS
+
+    def __init__(self, t, o, h, l, c, v):
+        self.t = np.ascontiguousarray(t, dtype=np.int64)
+        self.o = np.ascontiguousarray(o, dtype=np.float64)
+        self.h = np.ascontiguousarray(h, dtype=np.float64)
+        self.l = np.ascontiguousarray(l, dtype=np.float64)
+        self.c = np.ascontiguousarray(c, dtype=np.float64)
+        self.v = np.ascontiguousarray(v, dtype=np.int64)
+
+    @classmethod
+    def empty(cls) -> "CandleFrame":
+        return cls(*(np.empty(0) for _ in CANDLE_COLUMNS))
+
+    @classmethod
+    def from_records(cls, records) -> "CandleFrame":
+        """
+        Build a frame from ``(t, open, high, low, close, volume)`` records, where ``t`` is
+        already an epoch in seconds. The records are converted in one pass into a 2D
+        float64 block, NULL volumes become 0.
+        """
+        if not records:
+            return cls.empty()
+        block = np.array(records, dtype=np.float64)
+        volume = np.nan_to_num(block[:, 5], nan=0.0)
+        return cls(block[:, 0], block[:, 1], block[:, 2], block[:, 3], block[:, 4], volume)
+
+    @classmethod
+    def concat(cls, frames) -> "CandleFrame":
+        frames = [frame for frame in frames if len(frame)]
+        if not frames:
+            return cls.empty()
+        if len(frames) == 1:
+            return frames[0]
+        return cls(*(np.concatenate([getattr(frame, col) for frame in frames]) for col in CANDLE_COLUMNS))
+
+    def __len__(self) -> int:
+        return self.t.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, col).nbytes for col in CANDLE_COLUMNS)
+
+    def take(self, index) -> "CandleFrame":
+        return CandleFrame(*(getattr(self, col)[index] for col in CANDLE_COLUMNS))
+
+    def between(self, start: int, end: int) -> "CandleFrame":
+        """Return the candles with ``start <= t <= end``, ``t`` must be sorted ascending."""
+        lo = np.searchsorted(self.t, start, side="left")
+        hi = np.searchsorted(self.t, end, side="right")
+        return self.take(slice(lo, hi))
+
+    def to_ohlc_response(self, symbol: str) -> dict:
+        """The TradingView UDF history shape served by ``/api/v1/stock``."""
+        response = {col: getattr(self, col).tolist() for col in CANDLE_COLUMNS}
+        response["symbol"] = symbol
+        response["s"] = "ok" if len(self) else "no_data"
+        return response
+
+    def to_npy(self) -> bytes:
+        rows = np.empty(len(self), dtype=NPY_DTYPE)
+        for col in CANDLE_COLUMNS:
+            rows[col] = getattr(self, col)
+        buffer = io.BytesIO()
+        np.save(buffer, rows, allow_pickle=False)
+        return buffer.getvalue()
+
+    def to_arrow(self, symbol: str) -> bytes:
+        table = pa.table(
+            {col: getattr(self, col) for col in CANDLE_COLUMNS},
+            metadata={"symbol": symbol},
+        )
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
@@ -0,0 +1,361 @@
+import codecs
+import csv
+import functools
+import io
+import logging
+import struct
+import time
+from datetime import timezone
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy import text
+
+from core.price_validation import Quarantine
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL binary COPY framing.
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+COPY_TRAILER = struct.pack("!h", -1)
+
+# timestamptz is sent as microseconds since 2000-01-01 UTC.
+PG_EPOCH = np.datetime64("2000-01-01T00:00:00", "us")
+
+STOCKPRICE_COPY_SQL = 'COPY stockprice(symbol, "time", "open", high, low, "close", volume) FROM STDIN WITH (FORMAT binary)'
+
+# Rows are copied into a temporary table first and merged from there: a bar already loaded is
+# updated instead of duplicated (ux_stockprice_symbol_time), so a file can be loaded again safely.
+STAGING_TABLE_SQL = "CREATE TEMP TABLE IF NOT EXISTS stockprice_staging (LIKE stockprice INCLUDING DEFAULTS);"
+
+STAGING_COPY_SQL = STOCKPRICE_COPY_SQL.replace("COPY stockprice(", "COPY stockprice_staging(")
+
+# The last copy of a bar wins when a batch holds it twice, ON CONFLICT cannot touch a row twice.
+# RETURNING only sees the bars inserted or changed, an unchanged bar is filtered out by the WHERE.
+MERGE_STAGING_SQL = """
+    WITH merged AS (
+        INSERT INTO {table}(symbol, "time", "open", high, low, "close", volume)
+        SELECT DISTINCT ON (symbol, "time") symbol, "time", "open", high, low, "close", volume
+        FROM stockprice_staging
+        ORDER BY symbol, "time", ctid DESC
+        ON CONFLICT (symbol, "time") DO UPDATE SET
+            "open" = EXCLUDED."open",
+            high = EXCLUDED.high,
+            low = EXCLUDED.low,
+            "close" = EXCLUDED."close",
+            volume = EXCLUDED.volume
+        WHERE ({table}."open", {table}.high, {table}.low, {table}."close", {table}.volume)
+            IS DISTINCT FROM (EXCLUDED."open", EXCLUDED.high, EXCLUDED.low, EXCLUDED."close", EXCLUDED.volume)
+        RETURNING "time"
+    )
+    SELECT count(*), min("time"), max("time") FROM merged;
+"""
+
+# Rows encoded at once, bounds the memory used while a file streams into COPY.
+CHUNK_ROWS = 50_000
+
+# Bytes read from an S3 body at once while it is parsed.
+READ_BYTES = 1024 * 1024
+
+
+def read_chunks(body, chunk_size: int = READ_BYTES) -> Iterator[bytes]:
+    """The bytes of a file object or S3 ``StreamingBody``, ``chunk_size`` at a time."""
+    return iter(lambda: body.read(chunk_size), b"")
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """UTF-8 lines of a byte stream, decoded incrementally so a character split across chunks is kept."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+def stream_csv_rows(chunks: Iterable[bytes]) -> Iterator[dict]:
+    """
+    Parse a price CSV from its byte chunks into dict rows. Only the current chunk and line are held,
+    unlike ``body.read().decode().splitlines()`` which keeps the bytes, the text and every line at once.
+    """
+    return csv.DictReader(iter_lines(chunks))
+
+
+def batched(rows: Iterable[dict], size: int = CHUNK_ROWS) -> Iterator[list]:
+    """Lists of at most ``size`` rows."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _row_dtype(symbol_length: int) -> np.dtype:
+    """One binary COPY tuple of stockprice with a symbol of ``symbol_length`` bytes, big-endian."""
+    return np.dtype([
+        ("fields", ">i2"),
+        ("symbol_length", ">i4"), ("symbol", f"S{symbol_length}"),
+        ("time_length", ">i4"), ("time", ">i8"),
+        ("open_length", ">i4"), ("open", ">f8"),
+        ("high_length", ">i4"), ("high", ">f8"),
+        ("low_length", ">i4"), ("low", ">f8"),
+        ("close_length", ">i4"), ("close", ">f8"),
+        ("volume_length", ">i4"), ("volume", ">i8"),
+    ])
+
+
+def encode_stockprice(symbols: np.ndarray, times: np.ndarray, opens: np.ndarray, highs: np.ndarray,
+                      lows: np.ndarray, closes: np.ndarray, volumes: np.ndarray) -> bytes:
+    """
+    Binary COPY tuples (no header or trailer) for columnar rows. ``symbols`` are bytes, ``times`` are
+    ``datetime64`` in UTC. Rows are grouped by symbol length so every group is one fixed-width record array.
+    """
+    lengths = np.char.str_len(symbols)
+    parts = []
+    for symbol_length in np.unique(lengths):
+        index = np.flatnonzero(lengths == symbol_length)
+        records = np.empty(index.shape[0], dtype=_row_dtype(int(symbol_length)))
+        records["fields"] = 7
+        records["symbol_length"] = symbol_length
+        records["symbol"] = symbols[index]
+        records["time_length"] = 8
+        records["time"] = (times[index].astype("datetime64[us]") - PG_EPOCH).astype(np.int64)
+        for name, values in (("open", opens), ("high", highs), ("low", lows), ("close", closes)):
+            records[f"{name}_length"] = 8
+            records[name] = values[index]
+        records["volume_length"] = 8
+        records["volume"] = volumes[index]
+        parts.append(records.tobytes())
+    return b"".join(parts)
+
+
+def parse_floats(values: list) -> np.ndarray:
+    """Floats of CSV fields, NaN for an empty or malformed one."""
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        parsed = np.full(len(values), np.nan)
+        for index, value in enumerate(values):
+            try:
+                parsed[index] = float(value)
+            except (TypeError, ValueError):
+                pass
+        return parsed
+
+
+def parse_time(value) -> np.datetime64:
+    """A CSV date or timestamp (UTC), NaT when it is empty or malformed."""
+    try:
+        return np.datetime64(value or "NaT", "us")
+    except (TypeError, ValueError):
+        return np.datetime64("NaT", "us")
+
+
+def parse_times(values: list) -> np.ndarray:
+    try:
+        return np.array(values, dtype="datetime64[us]")
+    except (TypeError, ValueError):
+        return np.array([parse_time(value) for value in values], dtype="datetime64[us]")
+
+
+def csv_columns(rows: list) -> dict:
+    """
+    Parsed price CSV rows (``Ticker, Date, Open, High, Low, Close, Volume``) as the columns
+    :func:`encode_stockprice` takes, dates taken as UTC. A field which does not parse becomes NaN (NaT for
+    the date, -1 for the volume) and :func:`core.price_validation.validate_bars` rejects its row.
+    """
+    volumes = parse_floats([row["Volume"] or 0 for row in rows])
+    return {
+        "symbols": np.array([(row["Ticker"] or "").encode() for row in rows], dtype=bytes),
+        "times": parse_times([row["Date"] for row in rows]),
+        "opens": parse_floats([row["Open"] for row in rows]),
+        "highs": parse_floats([row["High"] for row in rows]),
+        "lows": parse_floats([row["Low"] for row in rows]),
+        "closes": parse_floats([row["Close"] for row in rows]),
+        "volumes": np.where(np.isfinite(volumes), volumes, -1).astype(np.int64),
+    }
+
+
+def encode_csv_rows(rows: Iterable[dict], screen: Optional[Callable[[dict, bool], dict]] = None,
+                    final: bool = True) -> bytes:
+    """
+    Encode parsed price CSV rows, through ``screen`` (columns and whether they are the last chunk in,
+    columns kept out) when given. The screen is called on the last chunk even when it is empty.
+    """
+    rows = list(rows)
+    if not rows and screen is None:
+        return b""
+    columns = csv_columns(rows)
+    if screen is not None:
+        columns = screen(columns, final)
+    return encode_stockprice(**columns)
+
+
+def copy_chunks(rows: Iterable[dict], chunk_rows: int = CHUNK_ROWS,
+                screen: Optional[Callable[[dict, bool], dict]] = None) -> Iterator[bytes]:
+    """
+    The whole binary COPY payload of ``rows``, produced ``chunk_rows`` rows at a time. ``screen`` sees
+    every chunk of the stream, the last one flagged, so it can validate bars across the chunks.
+    """
+    yield COPY_HEADER
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            yield encode_csv_rows(chunk, screen, final=False)
+            chunk = []
+    yield encode_csv_rows(chunk, screen)
+    yield COPY_TRAILER
+
+
+class IteratorStream(io.RawIOBase):
+    """Read-only file object over an iterator of bytes, what ``cursor.copy_expert`` pulls from."""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self.chunks = chunks
+        self.buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        while not self.buffer:
+            try:
+                self.buffer = next(self.chunks)
+            except StopIteration:
+                return 0
+        size = min(len(target), len(self.buffer))
+        target[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return size
+
+
+class MergedRows(NamedTuple):
+    """Bars a load inserted or changed and the time range they cover (UTC), ``None`` when there are none."""
+    count: int
+    earliest: Optional[np.datetime64] = None
+    latest: Optional[np.datetime64] = None
+
+
+class CountingRows:
+    """
+    Pass rows through while counting them, collecting their symbols and the time range they cover.
+    ``merged`` is set by :func:`copy_stockprice` once the rows are loaded.
+    """
+
+    def __init__(self, rows: Iterable[dict]):
+        self.rows = rows
+        self.count = 0
+        self.symbols = set()
+        self.earliest: Optional[np.datetime64] = None
+        self.latest: Optional[np.datetime64] = None
+        self.merged: Optional[MergedRows] = None
+
+    def __iter__(self):
+        for row in self.rows:
+            self.count += 1
+            self.symbols.add(row["Ticker"])
+            row_time = parse_time(row["Date"])
+            # A row without a valid time is quarantined, it does not widen the range.
+            if not np.isnat(row_time):
+                if self.earliest is None or row_time < self.earliest:
+                    self.earliest = row_time
+                if self.latest is None or row_time > self.latest:
+                    self.latest = row_time
+            yield row
+
+
+def utc_datetime64(moment) -> Optional[np.datetime64]:
+    """A timestamptz read with psycopg2 as a UTC ``datetime64[us]``, ``None`` stays ``None``."""
+    if moment is None:
+        return None
+    return np.datetime64(moment.astimezone(timezone.utc).replace(tzinfo=None), "us")
+
+
+def stockprice_high_water_mark(engine, symbol: str) -> Optional[np.datetime64]:
+    """
+    Time of the newest ``stockprice`` row of ``symbol`` (UTC), ``None`` when nothing is loaded yet.
+    Read on its own pooled connection, the COPY connection is busy while the rows stream.
+    """
+    with engine.connect() as connection:
+        loaded_until = connection.execute(
+            text('SELECT max("time") FROM stockprice WHERE symbol = :symbol;'),
+            parameters={"symbol": symbol},
+        ).scalar()
+    return utc_datetime64(loaded_until)
+
+
+def rows_after(rows: Iterable[dict], high_water_mark: Callable[[str], Optional[np.datetime64]],
+               label: str = "") -> Iterator[dict]:
+    """
+    Only the rows newer than their symbol's high-water mark, looked up once per symbol. A row at or before
+    the mark is dropped even when its values changed, only use it on a file whose loaded rows are current.
+    """
+    marks = {}
+    skipped = 0
+    for row in rows:
+        symbol = row["Ticker"]
+        if symbol not in marks:
+            marks[symbol] = high_water_mark(symbol)
+        mark = marks[symbol]
+        row_time = parse_time(row["Date"])
+        # A row without a valid time is let through to be quarantined.
+        if mark is None or np.isnat(row_time) or row_time > mark:
+            yield row
+        else:
+            skipped += 1
+    if skipped:
+        logger.info(f"Skipped {skipped} rows of {label} at or before the loaded high-water mark.")
+
+
+def stage_and_merge(cursor, stream, table: str = "stockprice") -> MergedRows:
+    """
+    COPY a binary stream into the staging table and merge it into ``table`` on the same cursor, in the
+    caller's transaction. Returns the bars inserted or changed, unchanged bars are not rewritten.
+    """
+    cursor.execute(STAGING_TABLE_SQL)
+    cursor.copy_expert(STAGING_COPY_SQL, stream, size=1024 * 1024)
+    cursor.execute(MERGE_STAGING_SQL.format(table=table))
+    count, earliest, latest = cursor.fetchone()
+    cursor.execute("TRUNCATE stockprice_staging;")
+    return MergedRows(count, utc_datetime64(earliest), utc_datetime64(latest))
+
+
+def copy_encoded(cursor, tuples: bytes) -> MergedRows:
+    """Merge tuples already encoded with :func:`encode_stockprice` into ``stockprice`` on ``cursor``."""
+    return stage_and_merge(cursor, io.BytesIO(COPY_HEADER + tuples + COPY_TRAILER))
+
+
+def copy_stockprice(cursor, rows: Iterable[dict], label: str, merge: bool = True,
+                    validate: bool = True) -> CountingRows:
+    """
+    Stream price CSV rows into ``stockprice`` with a binary COPY on ``cursor``, merged through the staging
+    table unless ``merge`` is off (a plain COPY fails on a bar already loaded). Unless ``validate`` is off,
+    bars failing :func:`core.price_validation.validate_bars` go to ``price_quarantine`` instead. The caller
+    owns the transaction, commit once per file. Returns the counted rows (``count``, ``symbols``), their
+    ``merged`` bars cover the time range the candle views have to be refreshed over.
+    """
+    counted = CountingRows(rows)
+    quarantine = Quarantine() if validate else None
+    screen = functools.partial(quarantine.screen, label) if validate else None
+    started = time.perf_counter()
+    stream = IteratorStream(copy_chunks(counted, screen=screen))
+    if merge:
+        counted.merged = stage_and_merge(cursor, stream)
+    else:
+        cursor.copy_expert(STOCKPRICE_COPY_SQL, stream, size=1024 * 1024)
+        counted.merged = MergedRows(cursor.rowcount, counted.earliest, counted.latest)
+    if quarantine is not None:
+        quarantine.write(cursor)
+    elapsed = time.perf_counter() - started
+    logger.info(f"Copied {counted.count} rows ({counted.merged.count} new or changed) from {label} in {elapsed:.2f}s "
+                f"({counted.count / elapsed if elapsed else 0:.0f} rows/s)")
+    return counted
@@ -0,0 +1,103 @@
+import hashlib
+from typing import Optional
+
+import numpy as np
+
+from core.candle_cache import LRUStorage
+from core.screener import MarketMatrix
+
+MAX_SYMBOLS = 500
+
+# Sessions, the market matrix holds a bit more than 400.
+MAX_WINDOW = 250
+
+
+class ReturnMatrix:
+    """Daily log returns of every symbol of a :class:`MarketMatrix`, NaN where either bar is missing."""
+    __slots__ = ("days", "returns", "index")
+
+    def __init__(self, days: np.ndarray, returns: np.ndarray, index: dict):
+        self.days = days
+        self.returns = returns
+        self.index = index
+
+    @classmethod
+    def from_market(cls, matrix: MarketMatrix) -> "ReturnMatrix":
+        present = np.diff(matrix.bars, axis=1, prepend=0) > 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = np.diff(np.log(matrix.close), axis=1)
+        returns[~(present[:, 1:] & present[:, :-1] & np.isfinite(returns))] = np.nan
+        index = {symbol: row for row, symbol in enumerate(matrix.symbols.tolist())}
+        return cls(matrix.days[1:], returns, index)
+
+
+def covariance_and_correlation(returns: np.ndarray) -> tuple:
+    """
+    Covariance and correlation of the rows of ``returns`` (symbol x day) with a single matrix product.
+    A missing return counts as the symbol's mean return, which keeps both matrices positive semi-definite.
+    """
+    valid = ~np.isnan(returns)
+    mean = np.nanmean(returns, axis=1)
+    centered = np.where(valid, returns - mean[:, None], 0.0)
+    covariance = centered @ centered.T / (returns.shape[1] - 1)
+    deviation = np.sqrt(np.diag(covariance))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        correlation = np.clip(covariance / np.outer(deviation, deviation), -1.0, 1.0)
+    np.fill_diagonal(correlation, 1.0)
+    return covariance, correlation
+
+
+def symbols_key(symbols: list) -> str:
+    return hashlib.sha1(",".join(symbols).encode()).hexdigest()
+
+
+class CorrelationEngine:
+    """Log returns derived once per market matrix, and results memoized per (symbol set, window, as-of day)."""
+
+    def __init__(self):
+        self._source: Optional[MarketMatrix] = None
+        self._returns: Optional[ReturnMatrix] = None
+        self.results = LRUStorage(max_entries=500, max_bytes=64 * 1024 * 1024)
+
+    def returns(self, matrix: MarketMatrix) -> ReturnMatrix:
+        if self._source is not matrix:
+            self._returns = ReturnMatrix.from_market(matrix)
+            self._source = matrix
+            self.results.clear()
+        return self._returns
+
+    def compute(self, matrix: MarketMatrix, symbols: list, window: int) -> Optional[dict]:
+        """
+        Covariance and correlation of the daily log returns of ``symbols`` over the last ``window`` sessions.
+        Symbols without data or without any variance in the window are reported as missing.
+        """
+        returns = self.returns(matrix)
+        if returns.days.shape[0] < window:
+            return None
+        symbols = sorted(set(symbols))
+        key = (symbols_key(symbols), window, int(returns.days[-1]))
+        cached = self.results.get(key)
+        if cached is not None:
+            return cached
+
+        rows = [returns.index[symbol] for symbol in symbols if symbol in returns.index]
+        window_returns = returns.returns[rows, -window:]
+        enough = (np.count_nonzero(~np.isnan(window_returns), axis=1) >= 2)
+        enough[enough] = np.nanstd(window_returns[enough], axis=1) > 0
+        found = [symbol for symbol in symbols if symbol in returns.index]
+        kept = [symbol for symbol, keep in zip(found, enough) if keep]
+
+        covariance, correlation = covariance_and_correlation(window_returns[enough])
+        kept_set = set(kept)
+        result = {
+            "t": int(returns.days[-1]),
+            "symbols": kept,
+            "missing": [symbol for symbol in symbols if symbol not in kept_set],
+            "covariance": covariance,
+            "correlation": correlation,
+        }
+        self.results.set(key, result, covariance.nbytes + correlation.nbytes)
+        return result
+
+
+correlation_engine = CorrelationEngine()
@@ -0,0 +1,112 @@
+import hashlib
+import threading
+import time
+from typing import Iterable, Optional
+
+from fastapi import Request
+from sqlalchemy import text
+
+from core.candle_cache import adjustment_cache, invalidate_view
+
+ALL_SYMBOLS = "*"
+
+BUMP_DATA_VERSION_SQL = text("""
+    INSERT INTO dataversion(scope, symbol, version)
+    VALUES (:scope, :symbol, 1)
+    ON CONFLICT (scope, symbol) DO UPDATE
+        SET version = dataversion.version + 1, updated_at = current_timestamp(0);
+""")
+
+
+def bump_data_version(session, scope: str, symbols: Optional[Iterable[str]] = None):
+    """
+    Mark ``scope`` (a table, view or collection name) as changed for ``symbols``, or for every
+    symbol when omitted. Runs in the caller's transaction, call it from the ingest/refresh jobs.
+    """
+    symbols = [ALL_SYMBOLS] if symbols is None else sorted(set(symbols))
+    if symbols:
+        session.execute(BUMP_DATA_VERSION_SQL, [{"scope": scope, "symbol": symbol} for symbol in symbols])
+
+
+class DataVersions:
+    """
+    In-process copy of ``dataversion``, reloaded at most every ``ttl`` seconds so validating an
+    ETag does not cost a query. Blocks cached from a view are dropped when its version moves,
+    which also covers the ingest jobs running in another process.
+    """
+
+    def __init__(self, ttl: float = 30):
+        self.ttl = ttl
+        self._versions: dict = {}
+        self._scope_totals: dict = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def expire(self):
+        """Force a reload on the next request, used right after an in-process refresh."""
+        with self._lock:
+            self._loaded_at = None
+
+    async def load(self, session):
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return
+        queryset = await session.execute(text("SELECT scope, symbol, version FROM dataversion;"))
+        versions = {(scope, symbol): version for scope, symbol, version in queryset.all()}
+        scope_totals = {}
+        for (scope, _), version in versions.items():
+            scope_totals[scope] = scope_totals.get(scope, 0) + version
+
+        with self._lock:
+            changed = {key for key, version in versions.items() if self._versions.get(key) != version}
+            first_load = self._loaded_at is None and not self._versions
+            self._versions = versions
+            self._scope_totals = scope_totals
+            self._loaded_at = time.monotonic()
+        if not first_load:
+            self._invalidate(changed)
+
+    @staticmethod
+    def _invalidate(changed: set):
+        for scope, symbol in changed:
+            if scope == "priceadjustment":
+                adjustment_cache.clear()
+            else:
+                invalidate_view(scope, None if symbol == ALL_SYMBOLS else symbol)
+
+    def token(self, scope: str, symbol: Optional[str] = None) -> str:
+        """Version of ``scope`` for one symbol, or for the whole scope when ``symbol`` is None."""
+        if symbol is None:
+            return f"{scope}:{self._scope_totals.get(scope, 0)}"
+        return (f"{scope}:{self._versions.get((scope, ALL_SYMBOLS), 0)}"
+                f".{self._versions.get((scope, symbol), 0)}")
+
+    async def etag(self, session, request: Request, scopes: Iterable[tuple]) -> str:
+        """
+        ETag of the response to ``request`` given the ``(scope, symbol)`` it is built from,
+        ``symbol`` None standing for every symbol of the scope. ``session`` is only queried when the
+        versions reload, anything with ``execute`` will do, e.g. the raw pool itself.
+        """
+        await self.load(session)
+        tokens = ",".join(self.token(scope, symbol) for scope, symbol in scopes)
+        digest = hashlib.sha1(f"{request.url.path}?{request.url.query}|{tokens}".encode()).hexdigest()
+        return f'"{digest}"'
+
+
+def scopes_for(scope: str, symbols: Optional[Iterable[str]]) -> list:
+    """``(scope, symbol)`` pairs for a list of symbols, the whole scope when no symbol is given."""
+    symbols = list(symbols or [])
+    if not symbols:
+        return [(scope, None)]
+    return [(scope, symbol) for symbol in symbols]
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+data_versions = DataVersions()
@@ -0,0 +1,72 @@
+import numpy as np
+
+from core.candles import CandleFrame
+
+DOWNSAMPLE_METHODS = ("lttb", "ohlc")
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Indices kept by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept. The bucket bounds and the averages of every
+    bucket are computed in one vectorized pass, then each bucket picks the point forming the
+    largest triangle with the previously kept point and the average of the next bucket.
+    """
+    n = x.shape[0]
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    edges = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:-1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:-1], edges[:-1]) / counts
+    # The bucket after the last one is the final point itself.
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        area = np.abs(
+            (x[previous] - next_x[bucket]) * (y[lo:hi] - y[previous])
+            - (x[previous] - x[lo:hi]) * (next_y[bucket] - y[previous])
+        )
+        previous = lo + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def ohlc_rebucket(frame: CandleFrame, threshold: int) -> CandleFrame:
+    """
+    Merge consecutive bars into ``threshold`` bars, keeping the true open, high, low, close
+    and total volume of every group.
+    """
+    n = len(frame)
+    if threshold >= n or threshold < 1:
+        return frame
+
+    starts = np.unique(np.linspace(0, n, threshold, endpoint=False).astype(np.int64))
+    ends = np.append(starts[1:], n) - 1
+    return CandleFrame(
+        frame.t[starts],
+        frame.o[starts],
+        np.maximum.reduceat(frame.h, starts),
+        np.minimum.reduceat(frame.l, starts),
+        frame.c[ends],
+        np.add.reduceat(frame.v, starts),
+    )
+
+
+def downsample(frame: CandleFrame, max_points: int, method: str = "lttb") -> CandleFrame:
+    if len(frame) <= max_points:
+        return frame
+    if method == "ohlc":
+        return ohlc_rebucket(frame, max_points)
+    return frame.take(lttb_indices(frame.t, frame.c, max_points))
@@ -0,0 +1,184 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Tell a writer there is nothing left to load, or that the fetch of its object failed.
+_DONE = object()
+_FAILED = object()
+
+
+class StageTimer:
+    """
+    Busy time and item count per stage, summed over the threads running it. ``wait:<stage>`` stages
+    are the time spent blocked on the queue: producers waiting on full writers point at Postgres,
+    writers waiting on an empty queue point at S3 or the parsing.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self.items = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def iterate(self, name: str, iterable: Iterable) -> Iterator:
+        """Pass the items of ``iterable`` through, timing how long each one took to produce."""
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.add(name, time.perf_counter() - started)
+            yield item
+
+    def add(self, name: str, seconds: float, items: int = 1):
+        with self._lock:
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+            self.items[name] = self.items.get(name, 0) + items
+
+    def report(self, elapsed: float):
+        logger.info(f"Import pipeline finished in {elapsed:.2f}s.")
+        for name in sorted(self.seconds):
+            seconds = self.seconds[name]
+            items = self.items[name]
+            logger.info(f"  {name:<12} {seconds:9.2f}s | {items:>6} items | {seconds / items * 1000:9.1f} ms/item")
+
+
+class FetchFailed(Exception):
+    """The fetch of an object failed part way, raised to its writer so nothing of it is committed."""
+
+
+class _ObjectItems:
+    """The items of one object as its fetcher queues them, counting the time the writer waited on them."""
+
+    def __init__(self, key: str, items: queue.Queue):
+        self.key = key
+        self.items = items
+        self.waited = 0.0
+        self.finished = False
+
+    def __iter__(self):
+        while not self.finished:
+            waiting = time.perf_counter()
+            item = self.items.get()
+            self.waited += time.perf_counter() - waiting
+            if item is _DONE or item is _FAILED:
+                self.finished = True
+                if item is _FAILED:
+                    raise FetchFailed(self.key)
+                return
+            yield item
+
+    def drain(self):
+        """Take what is left so the fetcher is not blocked on a full queue."""
+        try:
+            for _ in self:
+                pass
+        except FetchFailed:
+            pass
+
+
+class ImportPipeline:
+    """
+    Bounded producer/consumer pipeline: ``fetch_workers`` threads fetch and parse the objects, ``writers``
+    threads load them into the database, one object at a time each.
+
+    ``fetch(key)`` yields the parsed items of a key. The object goes to a writer as soon as its first item
+    is ready and ``write(key, items)`` loads it while it is still parsed, so an object is written by one
+    writer, e.g. in one transaction. At most ``queue_size`` parsed items of an object wait for its writer
+    and at most ``writers`` objects wait for a writer, full queues block the fetchers so memory stays
+    bounded when Postgres is the slow side. A fetch failing part way raises :class:`FetchFailed` from
+    ``items`` and the object is skipped. The value ``write`` returns is collected.
+
+    Both run on worker threads and must not share a database connection. They can time their own steps
+    on ``timer``, e.g. the S3 request apart from the parsing.
+    """
+
+    def __init__(self, fetch: Callable, write: Callable, fetch_workers: int = 8, writers: int = 1,
+                 queue_size: int = 4, timer: Optional[StageTimer] = None):
+        self.fetch = fetch
+        self.write = write
+        self.fetch_workers = fetch_workers
+        self.writers = writers
+        self.queue_size = queue_size
+        self.timer = timer or StageTimer()
+
+    def run(self, keys: Iterable[str]) -> list:
+        """Load every key, returns the results of ``write``. The first writer error is raised at the end."""
+        objects = queue.Queue(maxsize=self.writers)
+        results = []
+        errors = []
+        started = time.perf_counter()
+
+        def produce(key: str):
+            items = None
+            try:
+                for item in self.timer.iterate("fetch", self.fetch(key)):
+                    waiting = time.perf_counter()
+                    if items is None:
+                        items = queue.Queue(maxsize=self.queue_size)
+                        objects.put(_ObjectItems(key, items))
+                    items.put(item)
+                    self.timer.add("wait:writer", time.perf_counter() - waiting)
+            except Exception:
+                logger.exception(f"Could not fetch {key}, it is not loaded.")
+                if items is not None:
+                    items.put(_FAILED)
+                return
+            if items is not None:
+                items.put(_DONE)
+
+        def consume():
+            while True:
+                waiting = time.perf_counter()
+                entry = objects.get()
+                self.timer.add("wait:fetch", time.perf_counter() - waiting)
+                if entry is _DONE:
+                    return
+                # Keep draining after a failure, the fetchers would block on a full queue otherwise.
+                if errors:
+                    entry.drain()
+                    continue
+                writing = time.perf_counter()
+                try:
+                    results.append(self.write(entry.key, entry))
+                except FetchFailed:
+                    logger.warning(f"Skipped {entry.key}, its fetch failed while it was written.")
+                except Exception as error:
+                    logger.exception("Loading failed, the remaining objects are skipped.")
+                    errors.append(error)
+                finally:
+                    entry.drain()
+                    self.timer.add("write", time.perf_counter() - writing - entry.waited)
+                    self.timer.add("wait:fetch", entry.waited, items=0)
+
+        writer_threads = [threading.Thread(target=consume, name=f"import-writer-{index}", daemon=True)
+                          for index in range(self.writers)]
+        for thread in writer_threads:
+            thread.start()
+        with ThreadPoolExecutor(max_workers=self.fetch_workers, thread_name_prefix="import-fetch") as executor:
+            for key in keys:
+                executor.submit(produce, key)
+        for _ in writer_threads:
+            objects.put(_DONE)
+        for thread in writer_threads:
+            thread.join()
+
+        self.timer.report(time.perf_counter() - started)
+        if errors:
+            raise errors[0]
+        return results
@@ -0,0 +1,167 @@
+import math
+from dataclasses import dataclass
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class InvalidIndicator(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class IndicatorSpec:
+    """One requested indicator, written ``name:param:param`` in the query string (``macd:12:26:9``)."""
+    name: str
+    params: tuple
+
+    @property
+    def key(self) -> str:
+        return ":".join([self.name, *(f"{param:g}" for param in self.params)])
+
+    @property
+    def warmup(self) -> int:
+        """Bars needed before the first returned value for the output to be settled."""
+        if self.name in ("sma", "bb"):
+            return int(self.params[0]) - 1
+        if self.name in ("ema", "rsi"):
+            return 3 * int(self.params[0])
+        if self.name == "macd":
+            return 3 * int(self.params[1]) + int(self.params[2])
+        return 0
+
+
+# Longest period accepted, the warm-up bars read before the requested range grow with it.
+MAX_PERIOD = 500
+
+# name -> default params
+INDICATORS = {
+    "sma": (20,),
+    "ema": (20,),
+    "rsi": (14,),
+    "macd": (12, 26, 9),
+    "bb": (20, 2),
+}
+
+
+def parse_indicators(value: str) -> list:
+    specs = []
+    for item in value.split(","):
+        item = item.strip().lower()
+        if not item:
+            continue
+        name, *params = item.split(":")
+        if name not in INDICATORS:
+            raise InvalidIndicator(f"Unknown indicator {name}.")
+        defaults = INDICATORS[name]
+        if len(params) > len(defaults):
+            raise InvalidIndicator(f"Too many parameters for {name}.")
+        try:
+            parsed = tuple(float(param) for param in params) + defaults[len(params):]
+        except ValueError:
+            raise InvalidIndicator(f"Invalid parameters for {name}.")
+        if not all(math.isfinite(param) for param in parsed):
+            raise InvalidIndicator(f"Invalid parameters for {name}.")
+        for index, param in enumerate(parsed):
+            # Every parameter but the Bollinger width is a bar count.
+            if name == "bb" and index == 1:
+                if param <= 0:
+                    raise InvalidIndicator(f"Invalid parameters for {name}.")
+            elif param < 1 or param != int(param) or param > MAX_PERIOD:
+                raise InvalidIndicator(f"Invalid parameters for {name}, periods are 1 to {MAX_PERIOD} bars.")
+        specs.append(IndicatorSpec(name, parsed))
+    if not specs:
+        raise InvalidIndicator("No indicator requested.")
+    return specs
+
+
+def sma(values: np.ndarray, period: int) -> np.ndarray:
+    """Kernels work along the last axis: one series, or a (symbol x bar) matrix."""
+    out = np.full(values.shape, np.nan)
+    if values.shape[-1] < period:
+        return out
+    cumulative = np.cumsum(np.concatenate([np.zeros(values.shape[:-1] + (1,)), values], axis=-1), axis=-1)
+    out[..., period - 1:] = (cumulative[..., period:] - cumulative[..., :-period]) / period
+    return out
+
+
+def _smooth(values: np.ndarray, period: int, alpha: float) -> np.ndarray:
+    """Exponential smoothing seeded with the mean of the first ``period`` values, NaN before."""
+    out = np.full(values.shape, np.nan)
+    if values.shape[-1] < period:
+        return out
+    out[..., period - 1] = values[..., :period].mean(axis=-1)
+    decay = 1.0 - alpha
+    for index in range(period, values.shape[-1]):
+        out[..., index] = alpha * values[..., index] + decay * out[..., index - 1]
+    return out
+
+
+def ema(values: np.ndarray, period: int) -> np.ndarray:
+    return _smooth(values, period, 2.0 / (period + 1))
+
+
+def rsi(values: np.ndarray, period: int) -> np.ndarray:
+    """Wilder's RSI."""
+    out = np.full(values.shape, np.nan)
+    if values.shape[-1] <= period:
+        return out
+    delta = np.diff(values, axis=-1)
+    average_gain = _smooth(np.clip(delta, 0, None), period, 1.0 / period)
+    average_loss = _smooth(np.clip(-delta, 0, None), period, 1.0 / period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        relative_strength = average_gain / average_loss
+        out[..., 1:] = np.where(average_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + relative_strength))
+    out[..., 1:][np.isnan(average_gain)] = np.nan
+    return out
+
+
+def macd(values: np.ndarray, fast: int, slow: int, signal: int) -> dict:
+    line = ema(values, fast) - ema(values, slow)
+    signal_line = np.full(values.shape, np.nan)
+    # The line is NaN for the same leading bars of every row, the signal starts after them.
+    first = max(fast, slow) - 1
+    if values.shape[-1] > first:
+        signal_line[..., first:] = ema(line[..., first:], signal)
+    return {"macd": line, "signal": signal_line, "hist": line - signal_line}
+
+
+def bollinger(values: np.ndarray, period: int, width: float) -> dict:
+    middle = sma(values, period)
+    deviation = np.full(values.shape, np.nan)
+    if values.shape[-1] >= period:
+        deviation[..., period - 1:] = sliding_window_view(values, period, axis=-1).std(axis=-1)
+    return {"upper": middle + width * deviation, "middle": middle, "lower": middle - width * deviation}
+
+
+def compute(spec: IndicatorSpec, close: np.ndarray):
+    """The series of ``spec`` over ``close``: one array, or a dict of arrays for multi-line indicators."""
+    params = spec.params
+    if spec.name == "sma":
+        return sma(close, int(params[0]))
+    if spec.name == "ema":
+        return ema(close, int(params[0]))
+    if spec.name == "rsi":
+        return rsi(close, int(params[0]))
+    if spec.name == "macd":
+        return macd(close, int(params[0]), int(params[1]), int(params[2]))
+    return bollinger(close, int(params[0]), params[1])
+
+
+def to_json(series) -> list | dict:
+    """NaN (not enough bars yet) is not valid JSON, it is returned as null."""
+    if isinstance(series, dict):
+        return {name: to_json(values) for name, values in series.items()}
+    return np.where(np.isnan(series), None, series).tolist()
+
+
+def take(series, index):
+    if isinstance(series, dict):
+        return {name: values[index] for name, values in series.items()}
+    return series[index]
+
+
+def nbytes(series) -> int:
+    if isinstance(series, dict):
+        return sum(values.nbytes for values in series.values())
+    return series.nbytes
@@ -0,0 +1,33 @@
+from sqlalchemy import text
+
+LOAD_MANIFEST_SQL = text("SELECT key, etag FROM ingest_manifest WHERE bucket = :bucket;")
+
+RECORD_OBJECT_SQL = text("""
+    INSERT INTO ingest_manifest(bucket, key, etag, last_modified, rows, loaded_at)
+    VALUES (:bucket, :key, :etag, :last_modified, :rows, now())
+    ON CONFLICT (bucket, key) DO UPDATE SET
+        etag = EXCLUDED.etag,
+        last_modified = EXCLUDED.last_modified,
+        rows = EXCLUDED.rows,
+        loaded_at = EXCLUDED.loaded_at,
+        updated_at = current_timestamp(0);
+""")
+
+
+def load_manifest(session, bucket: str) -> dict:
+    """ETag of every object of ``bucket`` loaded completely so far, by key."""
+    return dict(session.execute(LOAD_MANIFEST_SQL, params={"bucket": bucket}).all())
+
+
+def record_object(session, bucket: str, s3_object: dict, rows: int):
+    """
+    Mark ``s3_object`` (a ``list_objects_v2`` entry or a ``get_object`` response with its ``Key``) as
+    loaded. Runs in the caller's transaction, only once every row of the object is committed.
+    """
+    session.execute(RECORD_OBJECT_SQL, params={
+        "bucket": bucket,
+        "key": s3_object["Key"],
+        "etag": s3_object["ETag"],
+        "last_modified": s3_object["LastModified"],
+        "rows": rows,
+    })
@@ -0,0 +1,112 @@
+import os
+from typing import Iterable, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Shared with the notebooks, see scripts/export_price_archive.py for the nightly export.
+ARCHIVE_DIR = os.environ.get("PRICE_ARCHIVE_DIR", "/home/finsc/media/price_archive")
+
+# Archived relation and its time column, the continuous aggregates name it "ts".
+ARCHIVE_TABLES = {"stockprice": "time", "one_day_candle": "ts"}
+
+ARCHIVE_SCHEMA = pa.schema([
+    ("time", pa.timestamp("us", tz="UTC")),
+    ("open", pa.float64()),
+    ("high", pa.float64()),
+    ("low", pa.float64()),
+    ("close", pa.float64()),
+    ("volume", pa.int64()),
+])
+
+PARTITION_FILE = "part.parquet"
+
+
+def partition_path(root: str, table: str, year: int, symbol: str) -> str:
+    """Hive layout, ``<table>/year=<year>/symbol=<symbol>/part.parquet``, so pyarrow.dataset reads it too."""
+    return os.path.join(root, table, f"year={year}", f"symbol={symbol}", PARTITION_FILE)
+
+
+def write_partition(path: str, epochs: np.ndarray, opens: np.ndarray, highs: np.ndarray, lows: np.ndarray,
+                    closes: np.ndarray, volumes: np.ndarray):
+    """
+    Write the bars of one (year, symbol) partition, ``epochs`` in UTC microseconds and sorted. The file is
+    replaced atomically, a notebook reading the archive meanwhile sees the old or the new partition.
+    """
+    table = pa.Table.from_arrays([
+        pa.array(epochs, type=pa.int64()).cast(ARCHIVE_SCHEMA.field("time").type),
+        pa.array(opens, type=pa.float64()),
+        pa.array(highs, type=pa.float64()),
+        pa.array(lows, type=pa.float64()),
+        pa.array(closes, type=pa.float64()),
+        pa.array(volumes, type=pa.int64()),
+    ], schema=ARCHIVE_SCHEMA)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pending = f"{path}.tmp"
+    pq.write_table(table, pending, compression="zstd")
+    os.replace(pending, path)
+
+
+def remove_partition(path: str):
+    """Drop a partition whose rows are gone from the database, and its directory once empty."""
+    if os.path.exists(path):
+        os.remove(path)
+    directory = os.path.dirname(path)
+    if os.path.isdir(directory) and not os.listdir(directory):
+        os.rmdir(directory)
+
+
+def archive_files(table: str, symbols: Optional[Iterable[str]] = None, years: Optional[Iterable[int]] = None,
+                  root: str = ARCHIVE_DIR) -> list:
+    """Partition files of ``table`` for the given symbols and years (all when None), by year then symbol."""
+    table_dir = os.path.join(root, table)
+    if not os.path.isdir(table_dir):
+        return []
+    symbols = None if symbols is None else set(symbols)
+    years = None if years is None else {int(year) for year in years}
+    files = []
+    for year_dir in sorted(os.listdir(table_dir)):
+        if not year_dir.startswith("year=") or (years is not None and int(year_dir[5:]) not in years):
+            continue
+        for symbol_dir in sorted(os.listdir(os.path.join(table_dir, year_dir))):
+            if not symbol_dir.startswith("symbol=") or (symbols is not None and symbol_dir[7:] not in symbols):
+                continue
+            path = os.path.join(table_dir, year_dir, symbol_dir, PARTITION_FILE)
+            if os.path.exists(path):
+                files.append((symbol_dir[7:], path))
+    return files
+
+
+def load_archive(table: str = "one_day_candle", symbols: Optional[Iterable[str]] = None,
+                 years: Optional[Iterable[int]] = None, root: str = ARCHIVE_DIR) -> pa.Table:
+    """
+    The archived bars of ``table`` as one Arrow table with a ``symbol`` column, read without the API.
+    Files are memory-mapped, the zstd pages are decoded straight from the page cache instead of being
+    read into Python buffers first.
+    """
+    parts = []
+    for symbol, path in archive_files(table, symbols, years, root):
+        part = pq.read_table(path, memory_map=True)
+        parts.append(part.append_column("symbol", pa.array(np.full(part.num_rows, symbol, dtype=object),
+                                                           type=pa.string()).dictionary_encode()))
+    if not parts:
+        return ARCHIVE_SCHEMA.empty_table().append_column(
+            "symbol", pa.array([], type=pa.dictionary(pa.int32(), pa.string())))
+    return pa.concat_tables(parts)
+
+
+def load_archive_columns(table: str = "one_day_candle", symbols: Optional[Iterable[str]] = None,
+                         years: Optional[Iterable[int]] = None, root: str = ARCHIVE_DIR) -> dict:
+    """The archived bars as NumPy columns, ``time`` as ``datetime64[us]`` (UTC) and ``symbol`` as strings."""
+    archived = load_archive(table, symbols, years, root)
+    columns = {name: archived.column(name).to_numpy() for name in ARCHIVE_SCHEMA.names}
+    columns["time"] = columns["time"].astype("datetime64[us]")
+    columns["symbol"] = archived.column("symbol").cast(pa.string()).to_numpy(zero_copy_only=False)
+    return columns
+
+
+def load_archive_frame(table: str = "one_day_candle", symbols: Optional[Iterable[str]] = None,
+                       years: Optional[Iterable[int]] = None, root: str = ARCHIVE_DIR):
+    """The archived bars as a pandas DataFrame (pandas is only needed by this helper)."""
+    return load_archive(table, symbols, years, root).to_pandas(split_blocks=True, self_destruct=True)
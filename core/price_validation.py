@@ -0,0 +1,209 @@
+import logging
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Daily price limits of the Vietnamese exchanges. The floor of a stock is not stored, the widest band
+# (UPCoM) is the default so a limit move of an ordinary session is never rejected.
+PRICE_BANDS = {"HOSE": 0.07, "HNX": 0.10, "UPCOM": 0.15}
+DEFAULT_PRICE_BAND = PRICE_BANDS["UPCOM"]
+# The first session of a listing, and the first one after a suspension longer than
+# SUSPENSION_SESSIONS, trade within a wider band.
+FIRST_SESSION_PRICE_BANDS = {"HOSE": 0.20, "HNX": 0.30, "UPCOM": 0.40}
+DEFAULT_FIRST_SESSION_PRICE_BAND = FIRST_SESSION_PRICE_BANDS["UPCOM"]
+SUSPENSION_SESSIONS = 25
+
+# Reason of each rejected bar, by code. 0 is a valid bar.
+REJECT_REASONS = ("", "bad_price", "bad_time", "ohlc", "outlier_range", "duplicate_time", "out_of_order",
+                  "outlier_return")
+BAD_PRICE, BAD_TIME, OHLC, OUTLIER_RANGE, DUPLICATE_TIME, OUT_OF_ORDER, OUTLIER_RETURN = range(1, len(REJECT_REASONS))
+
+QUARANTINE_SQL = """
+    INSERT INTO price_quarantine(source, symbol, "time", "open", high, low, "close", volume, reason)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s);
+"""
+
+
+def _runs(keys: np.ndarray) -> np.ndarray:
+    """Run number of every element of ``keys``, a run being consecutive equal keys."""
+    return np.cumsum(np.r_[True, keys[1:] != keys[:-1]]) - 1
+
+
+def _first_sessions(symbols: np.ndarray, times: np.ndarray) -> np.ndarray:
+    """
+    Whether each bar, in time order within each symbol, opens the symbol or resumes it after more than
+    :data:`SUSPENSION_SESSIONS` weekdays without a bar.
+    """
+    first = np.ones(symbols.shape[0], dtype=bool)
+    if symbols.shape[0] > 1:
+        days = times.astype("datetime64[D]")
+        skipped = np.busday_count(days[:-1] + 1, days[1:])
+        first[1:] = (symbols[1:] != symbols[:-1]) | (skipped > SUSPENSION_SESSIONS)
+    return first
+
+
+def validate_bars(symbols: np.ndarray, times: np.ndarray, opens: np.ndarray, highs: np.ndarray,
+                  lows: np.ndarray, closes: np.ndarray, volumes: np.ndarray,
+                  band: float = DEFAULT_PRICE_BAND,
+                  first_session_band: float = DEFAULT_FIRST_SESSION_PRICE_BAND) -> np.ndarray:
+    """
+    Reason code of every bar (:data:`REJECT_REASONS`), 0 when it is valid. Takes the columns
+    :func:`core.copy_loader.encode_stockprice` takes, in the order of the file. A bar is rejected for:
+
+    - ``bad_price``: a price missing, not finite or not positive, or a negative volume.
+    - ``bad_time``: no time, or one which did not parse.
+    - ``ohlc``: a high below the low, the open or the close, or a low above the open or the close.
+    - ``duplicate_time``: a later bar of the file has the same symbol and time, the last one is kept.
+    - ``out_of_order``: the time goes against the order of the other bars of the symbol, a file may be
+      sorted either way.
+    - ``outlier_range``: a high/low range wider than a move from the floor to the ceiling of the band of
+      the session.
+    - ``outlier_return``: the close jumps out of the band of the session and back on the next bar, e.g. a
+      price with its decimal point shifted. A lasting jump (split, stock dividend) is kept.
+
+    The band of a session is ``band``, or ``first_session_band`` for the first bar of a symbol and a bar
+    after a suspension (see :func:`_first_sessions`): a new listing or a resumed stock is not bound by
+    the close before it. Each check only sees the bars which passed the previous ones. Bars are only
+    compared within the columns given, the first and last bar of a symbol have no neighbour on one side.
+    """
+    reasons = np.zeros(symbols.shape[0], dtype=np.uint8)
+    if not reasons.shape[0]:
+        return reasons
+    prices = np.stack([opens, highs, lows, closes]).astype(np.float64)
+    with np.errstate(invalid="ignore"):
+        bad_price = ~np.isfinite(prices).all(axis=0) | (prices <= 0).any(axis=0) | (volumes < 0)
+    reasons[bad_price] = BAD_PRICE
+    reasons[(reasons == 0) & np.isnat(times)] = BAD_TIME
+    ohlc = (highs < lows) | (highs < np.maximum(opens, closes)) | (lows > np.minimum(opens, closes))
+    reasons[(reasons == 0) & ohlc] = OHLC
+    # No bar can move further than from the floor to the ceiling of its band, log of that ratio. A range
+    # wider than the first session band is out for any bar, the narrower band is checked in time order.
+    span = np.log((1 + band) / (1 - band))
+    first_span = np.log((1 + first_session_band) / (1 - first_session_band))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ranges = np.log(highs / lows)
+    reasons[(reasons == 0) & (ranges > first_span)] = OUTLIER_RANGE
+
+    # The remaining bars grouped by symbol, in file order within a symbol.
+    order = np.flatnonzero(reasons == 0)
+    order = order[np.argsort(symbols[order], kind="stable")]
+    epochs = times[order].astype("datetime64[us]").astype(np.int64)
+
+    # Duplicates: sort by (symbol, time, position), every bar but the last of a run of equal times.
+    by_time = np.lexsort((order, epochs, symbols[order]))
+    same_bar = (symbols[order][by_time][1:] == symbols[order][by_time][:-1]) & \
+               (epochs[by_time][1:] == epochs[by_time][:-1])
+    reasons[order[by_time][:-1][same_bar]] = DUPLICATE_TIME
+    keep = reasons[order] == 0
+    order, epochs = order[keep], epochs[keep]
+
+    # Out of order: a step against the direction most steps of the symbol take.
+    if order.shape[0] > 1:
+        group = _runs(symbols[order])
+        same_symbol = group[1:] == group[:-1]
+        steps = np.sign(np.diff(epochs)) * same_symbol
+        direction = np.sign(np.bincount(group[1:], weights=steps, minlength=group[-1] + 1))
+        direction[direction == 0] = 1
+        backwards = same_symbol & (steps == -direction[group[1:]])
+        reasons[order[1:][backwards]] = OUT_OF_ORDER
+        keep = reasons[order] == 0
+        order, epochs = order[keep], epochs[keep]
+
+    # Ranges in time order, against the band of each session.
+    chronological = order[np.lexsort((epochs, symbols[order]))]
+    spans = np.where(_first_sessions(symbols[chronological], times[chronological]), first_span, span)
+    wide = ranges[chronological] > spans
+    reasons[chronological[wide]] = OUTLIER_RANGE
+    chronological = chronological[~wide]
+
+    # Outlier returns, close to close in time order: a spike out of the band and straight back, the
+    # return into a bar is bound by the band of its session.
+    if chronological.shape[0] > 2:
+        first = _first_sessions(symbols[chronological], times[chronological])
+        spans = np.where(first, first_span, span)
+        returns = np.diff(np.log(closes[chronological].astype(np.float64)))
+        jump = (symbols[chronological][1:] == symbols[chronological][:-1]) & (np.abs(returns) > spans[1:])
+        spike = jump[:-1] & jump[1:] & (np.sign(returns[:-1]) != np.sign(returns[1:]))
+        reasons[chronological[1:-1][spike]] = OUTLIER_RETURN
+    return reasons
+
+
+def reason_counts(reasons: np.ndarray) -> dict:
+    """Rejected bars by reason name."""
+    codes, counts = np.unique(reasons[reasons > 0], return_counts=True)
+    return {REJECT_REASONS[code]: int(count) for code, count in zip(codes, counts)}
+
+
+class Quarantine:
+    """
+    Validates columnar bars before they are encoded, keeping the rejected ones until they are written
+    into ``price_quarantine`` in the transaction of the accepted ones. Rejected bars are few, they are
+    held as plain tuples.
+
+    A source screened in chunks (``final`` off until its last one) is validated across the chunks: the
+    last two valid bars of each symbol are carried into the next chunk. The last one is only accepted
+    once its next bar is known, the one before is context and is not returned again.
+    """
+
+    def __init__(self, band: float = DEFAULT_PRICE_BAND,
+                 first_session_band: float = DEFAULT_FIRST_SESSION_PRICE_BAND):
+        self.band = band
+        self.first_session_band = first_session_band
+        self.rows = []
+        # Rejected bars per source (file, symbol) and reason, since the last write.
+        self.counts = {}
+        # Bars carried into the next chunk of a source and whether each one was returned already.
+        self._carried = {}
+
+    def screen(self, source: str, columns: dict, final: bool = True) -> dict:
+        """The columns of the valid bars, the others are kept for :meth:`write`."""
+        carried, returned = self._carried.pop(source, (None, None))
+        if carried is None:
+            returned = np.zeros(columns["symbols"].shape[0], dtype=bool)
+        else:
+            columns = {name: np.concatenate([carried[name], values]) for name, values in columns.items()}
+            returned = np.r_[returned, np.zeros(columns["symbols"].shape[0] - returned.shape[0], dtype=bool)]
+        reasons = validate_bars(**columns, band=self.band, first_session_band=self.first_session_band)
+
+        held = np.zeros(reasons.shape[0], dtype=bool)
+        if not final:
+            # The last two valid bars of each symbol, in file order.
+            valid = np.flatnonzero(reasons == 0)
+            valid = valid[np.argsort(columns["symbols"][valid], kind="stable")]
+            same_next = np.r_[columns["symbols"][valid][1:] == columns["symbols"][valid][:-1], False]
+            last = ~same_next
+            carry = np.zeros(reasons.shape[0], dtype=bool)
+            carry[valid[last | (same_next & np.r_[last[1:], False])]] = True
+            held[valid[last]] = ~returned[valid[last]]
+            self._carried[source] = ({name: values[carry] for name, values in columns.items()}, ~held[carry])
+
+        # A context bar was returned with an earlier chunk, what this chunk makes of it is not recorded.
+        reasons[returned] = 0
+        rejected = np.flatnonzero(reasons)
+        accepted = (reasons == 0) & ~returned & ~held
+        if not rejected.shape[0]:
+            return {name: values[accepted] for name, values in columns.items()}
+        counts = self.counts.setdefault(source, {})
+        for reason, count in reason_counts(reasons).items():
+            counts[reason] = counts.get(reason, 0) + count
+        times = columns["times"][rejected].astype("datetime64[us]").tolist()
+        for index, moment in zip(rejected.tolist(), times):
+            self.rows.append((
+                source, columns["symbols"][index].decode(), moment and f"{moment.isoformat()}+00:00",
+                float(columns["opens"][index]), float(columns["highs"][index]), float(columns["lows"][index]),
+                float(columns["closes"][index]), int(columns["volumes"][index]), REJECT_REASONS[reasons[index]],
+            ))
+        return {name: values[accepted] for name, values in columns.items()}
+
+    def write(self, cursor) -> Optional[dict]:
+        """Insert the rejected bars on ``cursor``, the caller commits. Returns and resets the counts."""
+        if not self.rows:
+            return None
+        cursor.executemany(QUARANTINE_SQL, self.rows)
+        counts = self.counts
+        for source, reasons in counts.items():
+            logger.warning(f"Quarantined {sum(reasons.values())} bars of {source}: {reasons}")
+        self.rows, self.counts = [], {}
+        return counts
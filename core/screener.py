@@ -0,0 +1,347 @@
+import asyncio
+import re
+from typing import Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlalchemy import text
+
+from core import indicators
+from core.candle_cache import LRUStorage
+
+DAY = 24 * 60 * 60
+
+# Calendar days of one_day_candle kept in memory, a bit more than 400 sessions.
+MATRIX_DAYS = 600
+
+# A symbol without a bar in the last sessions of the matrix is not screened (suspended, delisted).
+STALE_SESSIONS = 5
+
+MATRIX_SQL = text("""
+    SELECT symbol, EXTRACT(EPOCH FROM ts)::BIGINT, close, volume
+    FROM one_day_candle
+    WHERE ts >= now() - CAST(:days || ' days' AS INTERVAL)
+    ORDER BY symbol, ts;
+""")
+
+
+class InvalidExpression(ValueError):
+    pass
+
+
+class MarketMatrix:
+    """
+    Daily closes and volumes of every symbol aligned on the same trading days, one row per symbol.
+    A day without a bar repeats the previous close with a zero volume.
+    """
+    __slots__ = ("symbols", "days", "close", "volume", "bars", "last_bar")
+
+    def __init__(self, symbols: np.ndarray, days: np.ndarray, close: np.ndarray, volume: np.ndarray,
+                 bars: np.ndarray, last_bar: np.ndarray):
+        self.symbols = symbols
+        self.days = days
+        self.close = close
+        self.volume = volume
+        # Bars seen up to each day, indicators need enough of them to be settled.
+        self.bars = bars
+        # Column of the last real bar of each symbol, -1 when none.
+        self.last_bar = last_bar
+
+    @classmethod
+    def from_records(cls, records: list) -> "MarketMatrix":
+        """Build the matrix from ``(symbol, epoch, close, volume)`` rows."""
+        if not records:
+            empty = np.empty((0, 0))
+            return cls(np.empty(0, dtype=object), np.empty(0, dtype=np.int64), empty, empty,
+                       np.empty((0, 0), dtype=np.int64), np.empty(0, dtype=np.int64))
+        symbol_column = np.array([record[0] for record in records], dtype=object)
+        values = np.array([record[1:] for record in records], dtype=np.float64)
+        symbols, rows = np.unique(symbol_column, return_inverse=True)
+        days, columns = np.unique(values[:, 0].astype(np.int64), return_inverse=True)
+
+        close = np.full((symbols.shape[0], days.shape[0]), np.nan)
+        volume = np.zeros((symbols.shape[0], days.shape[0]))
+        close[rows, columns] = values[:, 1]
+        volume[rows, columns] = np.nan_to_num(values[:, 2])
+
+        present = ~np.isnan(close)
+        # Forward fill the closes along the days.
+        source = np.where(present, np.arange(days.shape[0]), 0)
+        np.maximum.accumulate(source, axis=1, out=source)
+        close = np.take_along_axis(close, source, axis=1)
+        bars = np.cumsum(present, axis=1)
+        last_bar = np.where(present.any(axis=1), days.shape[0] - 1 - np.argmax(present[:, ::-1], axis=1), -1)
+        # Not listed yet: the zeros are never used, ``bars`` masks every indicator reading them.
+        close = np.nan_to_num(close)
+        return cls(symbols, days, close, volume, bars, last_bar)
+
+    def __len__(self) -> int:
+        return self.symbols.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.close.nbytes + self.volume.nbytes + self.bars.nbytes
+
+
+# Expression language -------------------------------------------------------------------------------
+#
+#   close > sma(close, 50) and volume > 2 * sma(volume, 20) and rsi(close, 14) < 30
+#
+# Series are ``close`` and ``volume``, numbers are constants. Functions take a series and a bar count:
+# sma, ema, rsi, highest, lowest and change (percent over n bars). Arithmetic, comparisons,
+# ``and``/``or``/``not`` and parentheses are supported, a filter must evaluate to a condition.
+
+SERIES = ("close", "volume")
+
+FUNCTIONS = ("sma", "ema", "rsi", "highest", "lowest", "change")
+
+COMPARISONS = (">=", "<=", "==", "!=", ">", "<")
+
+TOKEN_PATTERN = re.compile(r"\s*(?:(\d+(?:\.\d*)?|\.\d+)|([A-Za-z_]\w*)|(>=|<=|==|!=|[-+*/()<>,]))")
+
+MAX_EXPRESSION_LENGTH = 500
+
+
+def tokenize(expression: str) -> list:
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise InvalidExpression("Filter is too long.")
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = TOKEN_PATTERN.match(expression, position)
+        if not match:
+            raise InvalidExpression(f"Unexpected character at {position}.")
+        number, name, operator = match.groups()
+        if number is not None:
+            tokens.append(("number", float(number)))
+        elif name is not None:
+            tokens.append(("name", name.lower()))
+        else:
+            tokens.append(("op", operator))
+        position = match.end()
+    return tokens
+
+
+class Parser:
+    """Recursive descent parser turning a filter into nested tuples, checked before anything is computed."""
+
+    def __init__(self, tokens: list):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self) -> Optional[tuple]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def accept(self, kind: str, *values) -> Optional[tuple]:
+        token = self.peek()
+        if token and token[0] == kind and (not values or token[1] in values):
+            self.position += 1
+            return token
+        return None
+
+    def expect(self, kind: str, *values) -> tuple:
+        token = self.accept(kind, *values)
+        if token is None:
+            raise InvalidExpression(f"Expected {' or '.join(values) or kind} at token {self.position + 1}.")
+        return token
+
+    def parse(self) -> tuple:
+        node = self.disjunction()
+        if self.peek() is not None:
+            raise InvalidExpression(f"Unexpected token at {self.position + 1}.")
+        return node
+
+    def disjunction(self) -> tuple:
+        node = self.conjunction()
+        while self.accept("name", "or"):
+            node = ("or", node, self.conjunction())
+        return node
+
+    def conjunction(self) -> tuple:
+        node = self.negation()
+        while self.accept("name", "and"):
+            node = ("and", node, self.negation())
+        return node
+
+    def negation(self) -> tuple:
+        if self.accept("name", "not"):
+            return ("not", self.negation())
+        return self.comparison()
+
+    def comparison(self) -> tuple:
+        node = self.sum()
+        operator = self.accept("op", *COMPARISONS)
+        if operator:
+            node = (operator[1], node, self.sum())
+        return node
+
+    def sum(self) -> tuple:
+        node = self.product()
+        while True:
+            operator = self.accept("op", "+", "-")
+            if not operator:
+                return node
+            node = (operator[1], node, self.product())
+
+    def product(self) -> tuple:
+        node = self.unary()
+        while True:
+            operator = self.accept("op", "*", "/")
+            if not operator:
+                return node
+            node = (operator[1], node, self.unary())
+
+    def unary(self) -> tuple:
+        if self.accept("op", "-"):
+            return ("neg", self.unary())
+        return self.atom()
+
+    def atom(self) -> tuple:
+        token = self.accept("number")
+        if token:
+            return ("number", token[1])
+        if self.accept("op", "("):
+            node = self.disjunction()
+            self.expect("op", ")")
+            return node
+        name = self.expect("name")[1]
+        if name in SERIES:
+            return ("series", name)
+        if name not in FUNCTIONS:
+            raise InvalidExpression(f"Unknown name {name}.")
+        self.expect("op", "(")
+        argument = self.sum()
+        self.expect("op", ",")
+        period = self.expect("number")[1]
+        self.expect("op", ")")
+        if period < 1 or period != int(period) or period > indicators.MAX_PERIOD:
+            raise InvalidExpression(f"Invalid period for {name}, periods are 1 to {indicators.MAX_PERIOD} bars.")
+        return ("call", name, argument, int(period))
+
+
+LOGICAL = ("and", "or", "not") + COMPARISONS
+
+
+def parse_expression(expression: str) -> tuple:
+    node = Parser(tokenize(expression)).parse()
+    if node[0] not in LOGICAL:
+        raise InvalidExpression("The filter must be a condition, e.g. close > sma(close, 50).")
+    return node
+
+
+def _rolling(values: np.ndarray, period: int, reduce) -> np.ndarray:
+    out = np.full(values.shape, np.nan)
+    if values.shape[-1] >= period:
+        out[..., period - 1:] = reduce(sliding_window_view(values, period, axis=-1), axis=-1)
+    return out
+
+
+def _call(name: str, values: np.ndarray, period: int) -> tuple:
+    """Series of a function and the bars it needs before being settled."""
+    if name == "sma":
+        return indicators.sma(values, period), period - 1
+    if name == "ema":
+        return indicators.ema(values, period), 3 * period
+    if name == "rsi":
+        return indicators.rsi(values, period), 3 * period
+    if name == "highest":
+        return _rolling(values, period, np.max), period - 1
+    if name == "lowest":
+        return _rolling(values, period, np.min), period - 1
+    out = np.full(values.shape, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[..., period:] = (values[..., period:] / values[..., :-period] - 1.0) * 100
+    return out, period
+
+
+def evaluate(node: tuple, matrix: MarketMatrix) -> tuple:
+    """``(values, warmup)``: a (symbol x day) matrix or a scalar, and the bars needed before it is valid."""
+    kind = node[0]
+    if kind == "number":
+        return node[1], 0
+    if kind == "series":
+        return getattr(matrix, node[1]), 0
+    if kind == "call":
+        values, warmup = evaluate(node[2], matrix)
+        values = np.broadcast_to(values, matrix.close.shape).astype(np.float64)
+        series, needed = _call(node[1], values, node[3])
+        return series, warmup + needed
+    if kind in ("neg", "not"):
+        values, warmup = evaluate(node[1], matrix)
+        return (np.negative(values) if kind == "neg" else np.logical_not(values)), warmup
+
+    left, left_warmup = evaluate(node[1], matrix)
+    right, right_warmup = evaluate(node[2], matrix)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if kind == "+":
+            values = np.add(left, right)
+        elif kind == "-":
+            values = np.subtract(left, right)
+        elif kind == "*":
+            values = np.multiply(left, right)
+        elif kind == "/":
+            values = np.divide(left, right)
+        elif kind == "and":
+            values = np.logical_and(left, right)
+        elif kind == "or":
+            values = np.logical_or(left, right)
+        elif kind == ">":
+            values = np.greater(left, right)
+        elif kind == ">=":
+            values = np.greater_equal(left, right)
+        elif kind == "<":
+            values = np.less(left, right)
+        elif kind == "<=":
+            values = np.less_equal(left, right)
+        elif kind == "==":
+            values = np.equal(left, right)
+        else:
+            values = np.not_equal(left, right)
+    return values, max(left_warmup, right_warmup)
+
+
+def screen(matrix: MarketMatrix, node: tuple) -> np.ndarray:
+    """Indexes of the symbols matching ``node`` on the last day of the matrix."""
+    if not len(matrix) or not matrix.days.shape[0]:
+        return np.empty(0, dtype=np.int64)
+    values, warmup = evaluate(node, matrix)
+    matched = np.broadcast_to(values, matrix.close.shape)[:, -1].astype(bool)
+    settled = matrix.bars[:, -1] > warmup
+    fresh = matrix.last_bar >= matrix.days.shape[0] - STALE_SESSIONS
+    return np.flatnonzero(matched & settled & fresh)
+
+
+class Screener:
+    """The in-memory market matrix, rebuilt from one_day_candle whenever the view's data version moves."""
+
+    def __init__(self):
+        self.matrix: Optional[MarketMatrix] = None
+        self.version: Optional[str] = None
+        # Matching rows per filter, for the current matrix only.
+        self.results = LRUStorage(max_entries=1_000, max_bytes=4 * 1024 * 1024)
+        self._lock = asyncio.Lock()
+
+    async def get_matrix(self, session, version: str) -> MarketMatrix:
+        if self.matrix is not None and self.version == version:
+            return self.matrix
+        async with self._lock:
+            if self.matrix is None or self.version != version:
+                queryset = await session.execute(MATRIX_SQL, params={"days": str(MATRIX_DAYS)})
+                self.matrix = MarketMatrix.from_records(queryset.all())
+                self.results.clear()
+                self.version = version
+        return self.matrix
+
+    async def run(self, session, version: str, node: tuple) -> tuple:
+        """The matrix and the indexes of the symbols matching the parsed filter ``node``."""
+        matrix = await self.get_matrix(session, version)
+        matched = self.results.get(node)
+        if matched is None:
+            # Evaluated over the whole market, off the event loop.
+            matched = await asyncio.to_thread(screen, matrix, node)
+            self.results.set(node, matched, matched.nbytes)
+        return matrix, matched
+
+
+screener = Screener()
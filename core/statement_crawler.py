@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from typing import Callable, Iterable, NamedTuple, Optional
+
+import httpx
+
+from core.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Point the crawl at a local stand-in instead of TCBS, e.g. http://localhost:8080.
+TCBS_BASE_URL = os.environ.get("TCBS_BASE_URL", "https://apipubaws.tcbs.com.vn")
+STATEMENT_PATH = "/tcanalysis/v1/finance/{symbol}/{statement}"
+
+# TCBS statement -> table and JSON column it is stored in, the table is also its data version scope.
+STATEMENT_TABLES = {
+    "balancesheet": ("balancesheet", "balance_sheet"),
+    "cashflow": ("cashflow", "cashflow"),
+    "incomestatement": ("incomestatement", "income_statement"),
+    "financialratio": ("financialratio", "financial_ratio"),
+}
+
+# Statements written to the database at once.
+BATCH_SIZE = 200
+
+# Attempts per statement, a 429 or 5xx answer is retried after 1s, 2s...
+MAX_ATTEMPTS = 3
+
+
+class StatementJob(NamedTuple):
+    symbol: str
+    statement: str
+    yearly: bool
+
+
+def statement_jobs(symbols: Iterable[str], statements: Iterable[str] = STATEMENT_TABLES) -> list:
+    """One job per symbol, statement and period (yearly then quarterly)."""
+    symbols = list(symbols)
+    return [StatementJob(symbol, statement, yearly)
+            for statement in statements for symbol in symbols for yearly in (True, False)]
+
+
+def statement_hash(statement) -> str:
+    """SHA-256 of the canonical JSON of a statement, the same content always gives the same hash."""
+    canonical = json.dumps(statement, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+async def fetch_statement(client: httpx.AsyncClient, limiter: TokenBucket, job: StatementJob) -> Optional[object]:
+    """The decoded statement of ``job``, ``None`` when TCBS has none or keeps failing."""
+    path = STATEMENT_PATH.format(symbol=job.symbol, statement=job.statement)
+    params = {"yearly": int(job.yearly), "isAll": "true"}
+    for attempt in range(MAX_ATTEMPTS):
+        await limiter.acquire()
+        try:
+            response = await client.get(path, params=params)
+        except httpx.HTTPError as e:
+            logger.warning(f"Download error with {job}: {e!r}")
+        else:
+            if response.status_code == 200:
+                try:
+                    statement = response.json()
+                except ValueError as e:
+                    logger.error(f"JSON decode error with {job}: {e}")
+                    return None
+                if not statement:
+                    logger.info(f"No statement for {job}: {statement}")
+                    return None
+                return statement
+            if response.status_code != 429 and response.status_code < 500:
+                logger.error(f"Download error with {job}: {response.status_code} {response.text}")
+                return None
+            logger.warning(f"Download error with {job}: {response.status_code}, retrying.")
+        await asyncio.sleep(2 ** attempt)
+    logger.error(f"Giving up on {job} after {MAX_ATTEMPTS} attempts.")
+    return None
+
+
+async def crawl_statements(jobs: Iterable[StatementJob], write: Callable[[list], object], concurrency: int = 8,
+                           rate: float = 5, batch_size: int = BATCH_SIZE, base_url: str = TCBS_BASE_URL) -> int:
+    """
+    Fetch every job from a work queue with ``concurrency`` workers sharing one pooled client to the host,
+    at most ``rate`` requests per second. ``write(batch)`` receives ``(job, statement)`` pairs, ``batch_size``
+    at a time, on a worker thread and one batch at a time while the downloads go on. Returns the statements
+    fetched.
+    """
+    queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+    limiter = TokenBucket(rate)
+    batch = []
+    fetched = 0
+    write_lock = asyncio.Lock()
+
+    async def flush():
+        nonlocal batch
+        async with write_lock:
+            if batch:
+                taken, batch = batch, []
+                await asyncio.to_thread(write, taken)
+
+    async def work():
+        nonlocal fetched
+        while not queue.empty():
+            job = queue.get_nowait()
+            statement = await fetch_statement(client, limiter, job)
+            if statement is None:
+                continue
+            batch.append((job, statement))
+            fetched += 1
+            if len(batch) >= batch_size:
+                await flush()
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        await asyncio.gather(*(work() for _ in range(concurrency)))
+    await flush()
+    return fetched
@@ -5,6 +5,8 @@ from datetime import datetime
 
 import pytz
 import requests
+from sqlalchemy import text
+from sqlmodel import Session, create_engine
 
 from config import get_settings
 from db import collection
@@ -12,6 +14,21 @@ from db import collection
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG if get_settings().debug_logs else logging.INFO)
 logger = logging.getLogger(__name__)
 
+db_engine = create_engine(get_settings().database_psycopg_url, echo=True)
+
+# Same upsert as core/data_version.py, the API drops the ETags of /scfa/dividend when the version moves.
+BUMP_DATA_VERSION_SQL = text("""
+    INSERT INTO dataversion(scope, symbol, version)
+    VALUES (:scope, :symbol, 1)
+    ON CONFLICT (scope, symbol) DO UPDATE
+        SET version = dataversion.version + 1, updated_at = current_timestamp(0);
+""")
+
+
+def bump_data_version(session, scope: str, symbols=None):
+    symbols = ["*"] if symbols is None else sorted(set(symbols))
+    if symbols:
+        session.execute(BUMP_DATA_VERSION_SQL, [{"scope": scope, "symbol": symbol} for symbol in symbols])
 
 
 def convert_timestamp_in_datetime_utc(timestamp_received):
@@ -63,6 +80,10 @@ def download_dividend_event_data():
 
         page += 1
 
+    with Session(db_engine) as session:
+        bump_data_version(session, "dividend_events")
+        session.commit()
+
 
 if __name__ == "__main__":
     print("Downloading Dividend event Data...")
@@ -1,7 +1,13 @@
+import asyncio
+import json
 import logging
+import re
 import sys
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from typing import Any
 
+import asyncpg
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
 from sqlalchemy.ext.asyncio import (
@@ -66,6 +72,113 @@ session_manager = DatabaseSessionManager(
 )
 
 
+# Raw asyncpg access for the hot read paths, rows come back as asyncpg records without any ORM mapping.
+
+BIND_PATTERN = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+
+
+@lru_cache(maxsize=512)
+def to_positional(sql: str) -> tuple[str, tuple]:
+    """Rewrite the ``:name`` binds used with ``text()`` into asyncpg's ``$n``, with the names in order."""
+    names = []
+
+    def replace(match):
+        name = match.group(1)
+        if name not in names:
+            names.append(name)
+        return f"${names.index(name) + 1}"
+
+    return BIND_PATTERN.sub(replace, sql), tuple(names)
+
+
+class RawResult:
+    """Rows of :meth:`RawConnection.execute`, so helpers written for ``AsyncSession`` accept both."""
+    __slots__ = ("rows",)
+
+    def __init__(self, rows: list):
+        self.rows = rows
+
+    def all(self) -> list:
+        return self.rows
+
+
+class RawConnection:
+    """
+    A pooled asyncpg connection taking the same queries as ``AsyncSession.execute`` (``text()`` or
+    a string with ``:name`` binds). asyncpg prepares each statement on its first use and keeps it in
+    the connection's statement cache, later calls only send the parameters.
+    """
+    __slots__ = ("connection",)
+
+    def __init__(self, connection: asyncpg.Connection):
+        self.connection = connection
+
+    async def fetch(self, query, params: dict = None) -> list:
+        sql, names = to_positional(getattr(query, "text", query))
+        params = params or {}
+        return await self.connection.fetch(sql, *(params[name] for name in names))
+
+    async def execute(self, query, params: dict = None) -> RawResult:
+        return RawResult(await self.fetch(query, params))
+
+
+class RawConnectionPool:
+    def __init__(self, dsn: str, min_size: int, max_size: int, statement_cache_size: int):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_cache_size = statement_cache_size
+        self._pool = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    async def _init_connection(connection: asyncpg.Connection):
+        # json columns come back decoded, like with the ORM.
+        for json_type in ("json", "jsonb"):
+            await connection.set_type_codec(json_type, encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+    async def pool(self) -> asyncpg.Pool:
+        if self._pool is None:
+            async with self._lock:
+                if self._pool is None:
+                    self._pool = await asyncpg.create_pool(
+                        self.dsn,
+                        min_size=self.min_size,
+                        max_size=self.max_size,
+                        statement_cache_size=self.statement_cache_size,
+                        init=self._init_connection,
+                    )
+        return self._pool
+
+    @asynccontextmanager
+    async def acquire(self) -> RawConnection:
+        pool = await self.pool()
+        async with pool.acquire() as connection:
+            yield RawConnection(connection)
+
+    async def connection(self) -> RawConnection:
+        async with self.acquire() as connection:
+            yield connection
+
+    async def execute(self, query, params: dict = None) -> RawResult:
+        """Run one query on a connection held only for it, so a caller which rarely queries holds none."""
+        async with self.acquire() as connection:
+            return await connection.execute(query, params)
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+
+raw_pool = RawConnectionPool(
+    get_settings().asyncpg_dsn,
+    min_size=get_settings().raw_pool_min_size,
+    max_size=get_settings().raw_pool_max_size,
+    statement_cache_size=get_settings().raw_statement_cache_size,
+)
+
+
 # Create a new client and connect to the server
 client = MongoClient(get_settings().mongodb_url, server_api=ServerApi('1'))
 # Send a ping to confirm a successful connection
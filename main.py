@@ -16,12 +16,13 @@ from fastapi.staticfiles import StaticFiles
 
 from config import get_settings
 from core.models import HealthCheck
-from db import session_manager
+from db import raw_pool, session_manager
 # Import routes
 # from routers import chart_config
 from routers import dividend_events
 from routers import scfa
 from routers import scta
+from routers import screener
 from routers import stock_price
 from routers import financial_analytics
 from scripts.refresh_materialized_view import refresh_materialized_view
@@ -56,6 +57,7 @@ async def lifespan(app: FastAPI):
     if session_manager.engine is not None:
         # Close the DB connection
         await session_manager.close()
+    await raw_pool.close()
     scheduler.shutdown()
 
 
@@ -84,6 +86,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 # Include routes
 API_V1 = "/api/v1"
 app.include_router(stock_price.router, prefix=API_V1)
+app.include_router(screener.router, prefix=API_V1)
 app.include_router(dividend_events.router, prefix=API_V1)
 app.include_router(scfa.router, prefix=API_V1)
 app.include_router(financial_analytics.router)
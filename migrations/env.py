@@ -35,6 +35,11 @@ from models.income_statement import IncomeStatement
 from models.balancesheet import BalanceSheet
 from models.cashflow import Cashflow
 from models.financial_ratio import FinancialRatio
+from models.price_adjustment import PriceAdjustment
+from models.data_version import DataVersion
+from models.symbol_snapshot import SymbolSnapshot
+from models.ingest_manifest import IngestManifest
+from models.price_quarantine import PriceQuarantine
 target_metadata = SQLModel.metadata
 
 # other values from the config, defined by the needs of env.py,
@@ -0,0 +1,68 @@
+"""Add a (symbol, time) unique index on stockprice
+
+Revision ID: b81f4c6e2d17
+Revises: 3e7b5d2a9c41
+Create Date: 2026-10-18 10:48:02.517336
+
+"""
+import re
+
+from alembic import op
+from sqlalchemy import text
+
+
+# revision identifiers, used by Alembic.
+revision = 'b81f4c6e2d17'
+down_revision = '3e7b5d2a9c41'
+branch_labels = None
+depends_on = None
+
+# First TimescaleDB release which can DELETE from compressed chunks.
+DML_ON_COMPRESSED_CHUNKS = (2, 11)
+
+COMPRESSED_CHUNKS_SQL = """
+    SELECT format('%I.%I', chunk_schema, chunk_name)
+    FROM timescaledb_information.chunks
+    WHERE hypertable_name = 'stockprice' AND is_compressed;
+"""
+
+
+def timescaledb_version(connection) -> tuple:
+    version = connection.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'timescaledb';")).scalar()
+    if version is None:
+        raise RuntimeError("The timescaledb extension is not installed, stockprice has to be a hypertable.")
+    return tuple(int(part) for part in re.findall(r"\d+", version)[:2])
+
+
+def upgrade():
+    connection = op.get_bind()
+    # Before TimescaleDB 2.11 the DELETE below fails on compressed chunks, they are decompressed for the
+    # migration and compressed again once the index exists.
+    compressed = []
+    if timescaledb_version(connection) < DML_ON_COMPRESSED_CHUNKS:
+        compressed = connection.execute(text(COMPRESSED_CHUNKS_SQL)).scalars().all()
+        for chunk in compressed:
+            connection.execute(text("SELECT decompress_chunk(CAST(:chunk AS regclass));"), {"chunk": chunk})
+
+    # Overlapping imports left duplicate bars, keep the last one written of each (symbol, time). Both
+    # copies of a bar live in the same chunk, the time decides it.
+    op.execute("""
+        DELETE FROM stockprice older
+        USING stockprice newer
+        WHERE older.symbol = newer.symbol
+          AND older."time" = newer."time"
+          AND older.tableoid = newer.tableoid
+          AND older.ctid < newer.ctid;
+    """)
+    # A unique index on a hypertable has to contain the partitioning column, "time" is part of it.
+    # It replaces ix_ticker_time, which had the same columns.
+    op.create_index('ux_stockprice_symbol_time', 'stockprice', ['symbol', text("time DESC")], unique=True)
+    op.drop_index('ix_ticker_time', table_name='stockprice')
+
+    for chunk in compressed:
+        connection.execute(text("SELECT compress_chunk(CAST(:chunk AS regclass));"), {"chunk": chunk})
+
+
+def downgrade():
+    op.create_index('ix_ticker_time', 'stockprice', ['symbol', text("time DESC")])
+    op.drop_index('ux_stockprice_symbol_time', table_name='stockprice')
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from sqlalchemy import Column, BigInteger, UniqueConstraint
 from sqlmodel import Field, JSON
 
@@ -21,3 +23,5 @@ class Cashflow(models.TimestampModel, table=True):
             nullable=False
         )
     )
+    # SHA-256 of the statement's canonical JSON, the downloaders skip the write while it is unchanged.
+    content_hash: Optional[str] = Field(default=None, nullable=True, max_length=64)
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, BigInteger, UniqueConstraint
+from sqlmodel import Field
+
+from core import models
+
+
+class DataVersion(models.TimestampModel, table=True):
+    """Version of a table/view/collection per symbol ("*" for all), bumped by the ingest and refresh jobs."""
+    __table_args__ = (
+        UniqueConstraint(
+            "scope",
+            "symbol",
+            name="scope_symbol_data_version",
+        ),
+    )
+    id: int = Field(sa_column=Column(BigInteger, primary_key=True))
+    scope: str = Field(nullable=False)
+    symbol: str = Field(nullable=False)
+    version: int = Field(sa_column=Column(BigInteger, nullable=False, server_default="1"))
@@ -0,0 +1,19 @@
+from datetime import datetime
+
+from sqlalchemy import Column, BigInteger, DateTime
+from sqlmodel import Field
+
+from core import models
+
+
+class IngestManifest(models.TimestampModel, table=True):
+    """One S3 object fully loaded by scripts/import_stockprice_data.py, an unchanged ETag is not loaded again."""
+    __tablename__ = "ingest_manifest"
+
+    bucket: str = Field(primary_key=True)
+    key: str = Field(primary_key=True)
+    etag: str = Field(nullable=False)
+    last_modified: datetime = Field(sa_column=Column(DateTime(timezone=True), nullable=False))
+    # Rows copied from the object on its last load, 0 when every row was already loaded.
+    rows: int = Field(sa_column=Column(BigInteger, nullable=False, server_default="0"))
+    loaded_at: datetime = Field(sa_column=Column(DateTime(timezone=True), nullable=False))
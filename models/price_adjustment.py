@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from sqlalchemy import Column, BigInteger, DateTime, UniqueConstraint
+from sqlmodel import Field
+
+from core import models
+
+
+class PriceAdjustment(models.TimestampModel, table=True):
+    """Dividend/split adjustment of one symbol at one ex-right date, derived from the dividend events."""
+    __table_args__ = (
+        UniqueConstraint(
+            "symbol",
+            "ex_date",
+            name="symbol_ex_date_price_adjustment",
+        ),
+    )
+    id: int = Field(sa_column=Column(BigInteger, primary_key=True))
+    symbol: str = Field(nullable=False, index=True)
+    ex_date: datetime = Field(sa_column=Column(DateTime(timezone=True), nullable=False))
+    # Price multiplier of this event alone.
+    factor: float = Field(nullable=False)
+    # Product of the factors of this event and every later one, applied to the bars before ex_date.
+    cumulative_factor: float = Field(nullable=False)
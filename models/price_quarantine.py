@@ -0,0 +1,25 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Column, BigInteger, DateTime
+from sqlmodel import Field
+
+from core import models
+
+
+class PriceQuarantine(models.TimestampModel, table=True):
+    """A bar rejected by core/price_validation.py at ingest, kept out of stockprice for review."""
+    __tablename__ = "price_quarantine"
+
+    id: int = Field(sa_column=Column(BigInteger, primary_key=True))
+    # The S3 key or "dnse:<symbol>" the bar was read from.
+    source: str = Field(nullable=False, index=True)
+    symbol: str = Field(nullable=False, index=True)
+    time: Optional[datetime] = Field(sa_column=Column(DateTime(timezone=True), nullable=True))
+    open: float = Field(nullable=False)
+    high: float = Field(nullable=False)
+    low: float = Field(nullable=False)
+    close: float = Field(nullable=False)
+    volume: int = Field(sa_column=Column(BigInteger, nullable=False))
+    # One of core.price_validation.REJECT_REASONS.
+    reason: str = Field(nullable=False, index=True)
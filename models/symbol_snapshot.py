@@ -0,0 +1,25 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Column, BigInteger, DateTime
+from sqlmodel import Field
+
+from core import models
+
+
+class SymbolSnapshot(models.TimestampModel, table=True):
+    """Latest daily figures of one symbol, recomputed by scripts/refresh_symbol_snapshot.py when its prices change."""
+    __tablename__ = "symbol_snapshot"
+
+    symbol: str = Field(primary_key=True)
+    last_time: datetime = Field(sa_column=Column(DateTime(timezone=True), nullable=False))
+    last_close: float = Field(nullable=False)
+    previous_close: Optional[float] = Field(default=None, nullable=True)
+    change: Optional[float] = Field(default=None, nullable=True)
+    change_percent: Optional[float] = Field(default=None, nullable=True)
+    high_52w: float = Field(nullable=False)
+    low_52w: float = Field(nullable=False)
+    # Average daily volume over the last 20 sessions.
+    average_volume: float = Field(nullable=False)
+    # Sum of the "stockprice" data versions ("*" and the symbol) the row was computed from.
+    source_version: int = Field(sa_column=Column(BigInteger, nullable=False, server_default="0"))
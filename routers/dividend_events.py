@@ -2,10 +2,12 @@ import json
 
 import pymongo
 from bson import ObjectId
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Request, Response
 from datetime import datetime
+from sqlalchemy.ext.asyncio.session import AsyncSession
 
-from db import collection
+from core.data_version import data_versions, not_modified, scopes_for
+from db import collection, session_manager
 from schemas.dividend_events import DividendEventsResponseModel
 
 router = APIRouter()
@@ -22,8 +24,16 @@ class JSONEncoder(json.JSONEncoder):
             response_description="Dividend events",
             response_model=DividendEventsResponseModel)
 async def get_dividend_events(
-        symbol: str | None = None
+        request: Request,
+        response: Response,
+        symbol: str | None = None,
+        session: AsyncSession = Depends(session_manager.session),
 ):
+    etag = await data_versions.etag(session, request, scopes_for("dividend_events", [symbol] if symbol else None))
+    if not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
     if symbol:
         dividend_events = collection.find({"symbol": symbol}).sort("published_date", pymongo.DESCENDING)
     else:
@@ -1,15 +1,9 @@
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.exc import NoResultFound
-from sqlalchemy.ext.asyncio.session import AsyncSession
-from sqlmodel import select
-
-from db import session_manager
-from models.balancesheet import BalanceSheet
-from models.cashflow import Cashflow
-from models.income_statement import IncomeStatement
-from models.financial_ratio import FinancialRatio
+from fastapi import APIRouter, Query, Request, Response
+
+from core.data_version import data_versions, not_modified, scopes_for
+from db import RawConnection, raw_pool
 from schemas.tc_analysis import (
     BalanceSheetResponseModel,
     CashflowResponseModel,
@@ -22,34 +16,36 @@ router = APIRouter(
 )
 
 
+async def fetch_statements(connection: RawConnection, table: str, column: str, symbols: list, yearly: bool) -> list:
+    """Rows holding the ``column`` JSON document of ``table`` for ``symbols``, every symbol when empty."""
+    symbol_filter = "AND symbol = ANY(:symbols)" if symbols else ""
+    return await connection.fetch(
+        f"SELECT {column} FROM {table} WHERE yearly = :yearly {symbol_filter};",
+        {"yearly": yearly, "symbols": symbols},
+    )
+
+
 @router.get("/balancesheet",
             tags=["scfa"],
             response_description="Data will be list of Json objects containing balance sheet data",
             # response_model=BalanceSheetResponseModel
             )
 async def get_balance_sheet(
+        request: Request,
+        response: Response,
         symbols: list[str] = Query(default=[]),
         yearly: bool = Query(...),
-        session: AsyncSession = Depends(session_manager.session),
 ):
     if len(symbols) == 1:
         symbols = [item.strip() for item in symbols[0].split(',')]
 
-    if not symbols:
-        stmt = select(BalanceSheet).where(BalanceSheet.yearly == yearly)
-    else:
-        stmt = select(BalanceSheet).where(BalanceSheet.symbol.in_(symbols)).where(BalanceSheet.yearly == yearly)
+    etag = await data_versions.etag(raw_pool, request, scopes_for("balancesheet", symbols))
+    if not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
 
-    queryset = await session.execute(stmt)
-
-    try:
-        balance_sheet = queryset.fetchall()
-    except NoResultFound:
-        return {
-            "status": False,
-            "msg": "No balance sheet found with symbol {}".format(symbols),
-            "data": [],
-        }
+    async with raw_pool.acquire() as connection:
+        balance_sheet = await fetch_statements(connection, "balancesheet", "balance_sheet", symbols, yearly)
 
     if not balance_sheet:
         return {
@@ -60,7 +56,7 @@ async def get_balance_sheet(
     keys = ['cash', 'asset', 'debt', 'equity', 'payable']
     financial_data = {}
     for row in balance_sheet:
-        item = row[0].__dict__
+        item = row
 
         for row in item["balance_sheet"]:
             dict_key = row["year"]
@@ -102,9 +98,10 @@ async def get_balance_sheet(
             # response_model=CashflowResponseModel
             )
 async def get_cashflow(
+        request: Request,
+        response: Response,
         symbols: list[str] = Query(default=[]),
         yearly: bool = Query(...),
-        session: AsyncSession = Depends(session_manager.session),
 ):
     # if len(symbols) == 1:
     #     symbols = [item.strip() for item in symbols[0].split(',')]
@@ -148,21 +145,13 @@ async def get_cashflow(
     if len(symbols) == 1:
         symbols = [item.strip() for item in symbols[0].split(',')]
 
-    if not symbols:
-        stmt = select(Cashflow).where(Cashflow.yearly == yearly)
-    else:
-        stmt = select(Cashflow).where(Cashflow.symbol.in_(symbols)).where(Cashflow.yearly == yearly)
+    etag = await data_versions.etag(raw_pool, request, scopes_for("cashflow", symbols))
+    if not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
 
-    queryset = await session.execute(stmt)
-
-    try:
-        cashflow = queryset.fetchall()
-    except NoResultFound:
-        return {
-            "status": False,
-            "msg": "No balance sheet found with symbol {}".format(symbols),
-            "data": [],
-        }
+    async with raw_pool.acquire() as connection:
+        cashflow = await fetch_statements(connection, "cashflow", "cashflow", symbols, yearly)
 
     if not cashflow:
         return {
@@ -173,7 +162,7 @@ async def get_cashflow(
     keys = ['investCost', 'fromInvest', 'fromFinancial', 'fromSale', 'freeCashFlow']
     financial_data = {}
     for row in cashflow:
-        item = row[0].__dict__
+        item = row
 
         for row in item["cashflow"]:
             for key in keys:
@@ -197,9 +186,10 @@ async def get_cashflow(
             # response_model=IncomeStatementResponseModel
             )
 async def get_income_statement(
+        request: Request,
+        response: Response,
         symbols: list[str] = Query(default=[]),
         yearly: bool = Query(...),
-        session: AsyncSession = Depends(session_manager.session),
 ):
     # if len(symbols) == 1:
     #     symbols = [item.strip() for item in symbols[0].split(',')]
@@ -243,21 +233,13 @@ async def get_income_statement(
     if len(symbols) == 1:
         symbols = [item.strip() for item in symbols[0].split(',')]
 
-    if not symbols:
-        stmt = select(IncomeStatement).where(IncomeStatement.yearly == yearly)
-    else:
-        stmt = select(IncomeStatement).where(IncomeStatement.symbol.in_(symbols)).where(IncomeStatement.yearly == yearly)
-
-    queryset = await session.execute(stmt)
+    etag = await data_versions.etag(raw_pool, request, scopes_for("incomestatement", symbols))
+    if not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
 
-    try:
-        income_statement = queryset.fetchall()
-    except NoResultFound:
-        return {
-            "status": False,
-            "msg": "No balance sheet found with symbol {}".format(symbols),
-            "data": [],
-        }
+    async with raw_pool.acquire() as connection:
+        income_statement = await fetch_statements(connection, "incomestatement", "income_statement", symbols, yearly)
 
     if not income_statement:
         return {
@@ -268,7 +250,7 @@ async def get_income_statement(
     keys = ['revenue', 'preTaxProfit', 'postTaxProfit', 'grossProfit', 'investProfit', 'operationIncome']
     financial_data = {}
     for row in income_statement:
-        item = row[0].__dict__
+        item = row
 
         for row in item["income_statement"]:
             for key in keys:
@@ -291,32 +273,27 @@ async def get_income_statement(
             response_description="Data will be list of Json objects containing income statement data",
             response_model=FinancialRatioResponseModel)
 async def get_financial_ratio(
+        request: Request,
+        response: Response,
         symbols: list[str] = Query(default=[]),
         yearly: bool = Query(...),
-        session: AsyncSession = Depends(session_manager.session),
 ):
     if len(symbols) == 1:
         symbols = [item.strip() for item in symbols[0].split(',')]
 
+    etag = await data_versions.etag(raw_pool, request, scopes_for("financialratio", symbols))
+    if not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
     if not symbols:
         return {
             "status": False,
             "msg": "Invalid symbol",
         }
 
-    stmt = (select(FinancialRatio)
-            .where(FinancialRatio.symbol.in_(symbols))
-            .where(FinancialRatio.yearly == yearly))
-    queryset = await session.execute(stmt)
-
-    try:
-        financial_ratio = queryset.fetchall()
-    except NoResultFound:
-        return {
-            "status": False,
-            "msg": "No financial ratio found with symbol {}".format(symbols),
-            "data": [],
-        }
+    async with raw_pool.acquire() as connection:
+        financial_ratio = await fetch_statements(connection, "financialratio", "financial_ratio", symbols, yearly)
     if not financial_ratio:
         return {
             "data": [],
@@ -326,7 +303,7 @@ async def get_financial_ratio(
     data = []
 
     for row in financial_ratio:
-        item = row[0].__dict__
+        item = row
         data.extend(item["financial_ratio"])
 
     return {
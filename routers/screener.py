@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.data_version import data_versions, not_modified
+from core.screener import InvalidExpression, parse_expression, screener
+from db import session_manager
+
+router = APIRouter()
+
+
+@router.get("/stock/screener", tags=["stock"])
+async def read_screener(
+        request: Request,
+        response: Response,
+        session: AsyncSession = Depends(session_manager.session),
+        expression: str = Query(..., alias="filter",
+                                description="e.g. close > sma(close, 50) and volume > 2 * sma(volume, 20) and rsi(close, 14) < 30"),
+):
+    """
+    Symbols matching the filter on the latest daily candle, evaluated over the whole market at once.
+    Series: close, volume. Functions: sma, ema, rsi, highest, lowest, change(series, bars).
+    """
+    try:
+        node = parse_expression(expression)
+    except InvalidExpression as e:
+        raise HTTPException(status_code=400, detail={"msg": str(e), "field": "filter"})
+
+    etag = await data_versions.etag(session, request, [("one_day_candle", None)])
+    if not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    matrix, matched = await screener.run(session, data_versions.token("one_day_candle"), node)
+    if not matched.shape[0]:
+        return {"s": "no_data", "t": int(matrix.days[-1]) if matrix.days.shape[0] else None, "data": []}
+    return {
+        "s": "ok",
+        "t": int(matrix.days[-1]),
+        "data": [
+            {"symbol": symbol, "c": close, "v": volume}
+            for symbol, close, volume in zip(
+                matrix.symbols[matched].tolist(),
+                matrix.close[matched, -1].tolist(),
+                matrix.volume[matched, -1].tolist(),
+            )
+        ],
+    }
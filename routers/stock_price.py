@@ -1,105 +1,409 @@
+import json
 from datetime import datetime, timezone
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+import numpy as np
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy import text
+from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from db import session_manager
-
-STOCK_PRICE_TABLE = "stockprice"
-
-
-RESOLUTION_DICT = {
-    # "1": "one_minute_candle",
-    # "3": "three_minutes_candle",
-    # "5": "fifteen_minutes_candle",
-    # "15": "fifteen_minutes_candle",
-    # "30": "thirty_minutes_candle",
-    # "45": "forty_five_minutes_candle",
-    # "1H": "one_hour_candle",
-    # "2H": "two_hours_candle",
-    # "4H": "four_hours_candle",
-    "1D": "one_day_candle",
-    "1W": "one_week_candle",
-    "1M": "one_month_candle",
-    "3M": "three_months_candle",
-    "6M": "six_months_candle",
-    "1Y": "one_year_candle"
+from core.adjustments import apply_adjustments
+from core.candle_cache import BLOCK_SECONDS, adjustment_cache, candle_cache, downsample_cache, indicator_cache
+from core.candle_query import (
+    DAY,
+    RESOLUTIONS,
+    QueryPlan,
+    Resolution,
+    align_start,
+    candle_sql,
+    existing_views,
+    plan_query,
+)
+from core.candles import CandleFrame
+from core.correlation import MAX_SYMBOLS, MAX_WINDOW, correlation_engine
+from core.data_version import data_versions, not_modified, scopes_for
+from core.downsampling import DOWNSAMPLE_METHODS, downsample
+from core.screener import screener
+from core import indicators
+from db import RawConnection, raw_pool, session_manager
+from models.symbol_snapshot import SymbolSnapshot
+
+BINARY_MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "npy": "application/x-npy",
 }
 
+# Calendar time searched per bar on the first countback attempt, sessions only cover part of the day.
+COUNTBACK_WINDOW_FACTOR = 8
+MAX_COUNTBACK_WINDOW = 30 * 365 * DAY
+
 
 router = APIRouter()
 
 
+def negotiate_format(format: Optional[str], accept: Optional[str]) -> str:
+    """
+    Pick the response encoding, an explicit ``format`` query param wins over the ``Accept`` header.
+    JSON stays the default so the TradingView client keeps working unchanged.
+    """
+    if format:
+        if format != "json" and format not in BINARY_MEDIA_TYPES:
+            raise HTTPException(status_code=400, detail={"msg": "Invalid format.", "field": "format"})
+        return format
+
+    for media_range in (accept or "").split(","):
+        media_type = media_range.split(";")[0].strip()
+        for name, binary_media_type in BINARY_MEDIA_TYPES.items():
+            if media_type == binary_media_type:
+                return name
+    return "json"
+
+
+def candle_response(frame: CandleFrame, symbol: str, response_format: str, etag: Optional[str] = None):
+    headers = {"ETag": etag} if etag else None
+    if response_format == "arrow":
+        return Response(content=frame.to_arrow(symbol), media_type=BINARY_MEDIA_TYPES["arrow"], headers=headers)
+    if response_format == "npy":
+        return Response(content=frame.to_npy(), media_type=BINARY_MEDIA_TYPES["npy"], headers=headers)
+    return frame.to_ohlc_response(symbol)
+
+
+async def fetch_candles(session: AsyncSession | RawConnection, plan: QueryPlan, symbol: str, start: int,
+                        end: int) -> CandleFrame:
+    """Read the candles of ``symbol`` planned by ``plan`` between two epochs (inclusive)."""
+    queryset = await session.execute(
+        candle_sql(plan),
+        params={
+            "symbol": symbol,
+            "start_datetime": datetime.fromtimestamp(start, tz=timezone.utc),
+            "end_datetime": datetime.fromtimestamp(end, tz=timezone.utc),
+        }
+    )
+    return CandleFrame.from_records(queryset.all())
+
+
+async def fetch_countback(session: AsyncSession | RawConnection, resolution: Resolution, symbol: str, end: int,
+                          countback: int) -> CandleFrame:
+    """
+    The last ``countback`` bars of ``symbol`` ending at ``end``.
+
+    The rows are read newest first with ``ORDER BY ... DESC LIMIT`` so the index is walked
+    backwards from ``end`` and only ``countback`` bars are touched, then reversed in memory.
+    Bars read from their own continuous aggregate need no lower bound, bars built with
+    ``time_bucket`` are searched in a window which grows until enough bars are found.
+    """
+    views = await existing_views(session)
+    window = countback * resolution.seconds * COUNTBACK_WINDOW_FACTOR
+    while True:
+        start = align_start(resolution, max(end - window, 0))
+        plan = plan_query(resolution, start, end, views)
+        if plan.is_view:
+            start = 0
+        queryset = await session.execute(
+            candle_sql(plan, order="DESC", limit=True),
+            params={
+                "symbol": symbol,
+                "start_datetime": datetime.fromtimestamp(start, tz=timezone.utc),
+                "end_datetime": datetime.fromtimestamp(end, tz=timezone.utc),
+                "limit": countback,
+            }
+        )
+        frame = CandleFrame.from_records(queryset.all())
+        if len(frame) >= countback or start == 0 or window >= MAX_COUNTBACK_WINDOW:
+            return frame.take(slice(None, None, -1))
+        window *= 2
+
+
+async def load_frame(session: AsyncSession | RawConnection, resolution: Resolution, symbol: str, start: int,
+                     end: int) -> tuple[CandleFrame, QueryPlan]:
+    """Candles of ``symbol`` between two epochs, served from the candle cache when read from a view."""
+    start = align_start(resolution, start)
+    plan = plan_query(resolution, start, end, await existing_views(session))
+    if not plan.is_view or plan.relation not in BLOCK_SECONDS:
+        return await fetch_candles(session, plan, symbol, start, end), plan
+
+    async def fetch_range(range_start: int, range_end: int) -> CandleFrame:
+        return await fetch_candles(session, plan, symbol, range_start, range_end)
+
+    return await candle_cache.get_frame(symbol, plan.relation, start, end, fetch_range), plan
+
+
+async def adjust(session: AsyncSession | RawConnection, symbol: str, frame: CandleFrame) -> CandleFrame:
+    """Back-adjust ``frame`` for dividends and splits with the factors stored in ``priceadjustment``."""
+    adjustments = adjustment_cache.get(symbol)
+    if adjustments is None:
+        queryset = await session.execute(
+            text("""
+                SELECT EXTRACT(EPOCH FROM ex_date)::BIGINT, cumulative_factor FROM priceadjustment
+                WHERE symbol = :symbol
+                ORDER BY ex_date ASC;
+            """),
+            params={"symbol": symbol}
+        )
+        rows = np.array(queryset.all(), dtype=np.float64).reshape(-1, 2)
+        adjustments = (rows[:, 0].astype(np.int64), rows[:, 1])
+        adjustment_cache.set(symbol, adjustments, rows.nbytes)
+    return apply_adjustments(frame, *adjustments)
+
+
 @router.get("/stock", tags=["stock"])
 async def read_history(
-        session: AsyncSession = Depends(session_manager.session),
+        request: Request,
+        response: Response,
         start: int = Query(..., alias="from"),
         to: int = Query(...),
         resolution: str = Query(...),
         symbol: str = Query(...),
-        countback: Optional[int] = 0
+        countback: Optional[int] = 0,
+        format: Optional[str] = Query(None),
+        accept: Optional[str] = Header(None),
+        max_points: Optional[int] = Query(None, ge=3),
+        downsample_method: str = Query("lttb", alias="downsample"),
+        adjusted: bool = Query(False),
 ):
+    response_format = negotiate_format(format, accept)
+    if downsample_method not in DOWNSAMPLE_METHODS:
+        raise HTTPException(status_code=400, detail={"msg": "Invalid downsample method.", "field": "downsample"})
     if start > to:
         raise HTTPException(status_code=400, detail={"msg": "start cannot be greater end.", "field": "start"})
-    start_datetime = datetime.fromtimestamp(int(start), tz=timezone.utc)
-    end_datetime = datetime.fromtimestamp(int(to), tz=timezone.utc)
+    if resolution not in RESOLUTIONS.keys():
+        raise HTTPException(status_code=400, detail={"msg": "Invalid resolution.", "field": "resolution"})
+    if countback < 0:
+        raise HTTPException(status_code=400, detail={"msg": "Invalid countback.", "field": "countback"})
+
+    resolution = RESOLUTIONS[resolution]
+    scopes = [("stockprice", symbol)]
+    if resolution.view:
+        scopes.append((resolution.view, symbol))
+    if adjusted:
+        scopes.append(("priceadjustment", symbol))
+    # No connection is held to answer a revalidation, the pool lends one only when the versions reload.
+    etag = await data_versions.etag(raw_pool, request, scopes)
+    if not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    async with raw_pool.acquire() as connection:
+        if countback > 0:
+            # TradingView gives countback priority over from.
+            frame, plan = await fetch_countback(connection, resolution, symbol, to, countback), None
+        else:
+            frame, plan = await load_frame(connection, resolution, symbol, start, to)
+        if adjusted:
+            frame = await adjust(connection, symbol, frame)
 
-    if resolution not in RESOLUTION_DICT.keys():
+    if plan is None:
+        if max_points:
+            frame = downsample(frame, max_points, downsample_method)
+        return candle_response(frame, symbol, response_format, etag)
+
+    if max_points and len(frame) > max_points:
+        if not plan.is_view:
+            frame = downsample(frame, max_points, downsample_method)
+        else:
+            # Keyed on the bars actually returned, so a sliding "to" still hits the cache.
+            key = ("downsample", int(frame.t[0]), int(frame.t[-1]), len(frame), max_points, downsample_method,
+                   adjusted)
+            reduced = downsample_cache.get(symbol, plan.relation, key)
+            if reduced is None:
+                reduced = downsample(frame, max_points, downsample_method)
+                downsample_cache.set(symbol, plan.relation, key, reduced, reduced.nbytes)
+            frame = reduced
+    return candle_response(frame, symbol, response_format, etag)
+
+
+@router.get("/stock/batch", tags=["stock"])
+async def read_history_batch(
+        start: int = Query(..., alias="from"),
+        to: int = Query(...),
+        resolution: str = Query(...),
+        symbols: list[str] = Query(...),
+):
+    """
+    OHLCV arrays of several symbols sharing the same range and resolution, read with a single query.
+    The JSON object is streamed one symbol at a time as soon as its rows are complete.
+    """
+    if len(symbols) == 1:
+        symbols = [item.strip() for item in symbols[0].split(',')]
+    symbols = list(dict.fromkeys(symbol for symbol in symbols if symbol))
+    if not symbols:
+        raise HTTPException(status_code=400, detail={"msg": "Invalid symbols.", "field": "symbols"})
+    if start > to:
+        raise HTTPException(status_code=400, detail={"msg": "start cannot be greater end.", "field": "start"})
+    if resolution not in RESOLUTIONS.keys():
         raise HTTPException(status_code=400, detail={"msg": "Invalid resolution.", "field": "resolution"})
 
-    mat_view = RESOLUTION_DICT.get(resolution)
-    if countback > 0:
-        countback = f"{countback} days" if countback > 1 else "1 day"
-        sql = text(f"""
-            SELECT * FROM {mat_view}
-            WHERE ts BETWEEN :start_datetime AND :end_datetime 
-                AND symbol=:symbol 
-                AND ts >= CAST(:end_datetime AS TIMESTAMP) - INTERVAL '{countback}'
-            ORDER BY ts ASC;
-        """)
-    else:
-        if countback < 0:
-            raise HTTPException(status_code=400, detail={"msg": "Invalid countback.", "field": "countback"})
-        sql = text(f"""
-            SELECT * FROM {mat_view}
-            WHERE ts BETWEEN :start_datetime AND :end_datetime 
-                AND symbol=:symbol
-            ORDER BY ts ASC;
-        """)
+    resolution = RESOLUTIONS[resolution]
+    start = align_start(resolution, start)
+    params = {
+        "symbols": symbols,
+        "start_datetime": datetime.fromtimestamp(int(start), tz=timezone.utc),
+        "end_datetime": datetime.fromtimestamp(int(to), tz=timezone.utc),
+    }
 
-    queryset = await session.execute(
-        sql,
-        params={
-            "symbol": symbol,
-            "start_datetime": start_datetime,
-            "end_datetime": end_datetime,
-        }
-    )
+    async def stream_symbols():
+        # The request scoped session is already closed while the body streams, use a dedicated connection.
+        async with session_manager.engine.connect() as connection:
+            plan = plan_query(resolution, start, to, await existing_views(connection))
+            result = await connection.stream(candle_sql(plan, multi_symbol=True), params)
+            yield '{"s":"ok","data":{'
+            separator = ""
+            current_symbol = None
+            rows = []
+            seen = set()
+            async for row in result:
+                if row[0] != current_symbol:
+                    seen.add(row[0])
+                    if rows:
+                        yield separator + _batch_entry(current_symbol, rows)
+                        separator = ","
+                    current_symbol = row[0]
+                    rows = []
+                rows.append(row[1:])
+            if rows:
+                yield separator + _batch_entry(current_symbol, rows)
+                separator = ","
+            for symbol in symbols:
+                if symbol not in seen:
+                    yield separator + _batch_entry(symbol, [])
+                    separator = ","
+            yield "}}"
+
+    return StreamingResponse(stream_symbols(), media_type="application/json")
+
+
+def _batch_entry(symbol: str, rows: list) -> str:
+    frame = CandleFrame.from_records(rows)
+    return f"{json.dumps(symbol)}:{json.dumps(frame.to_ohlc_response(symbol))}"
+
+
+@router.get("/stock/snapshot", tags=["stock"])
+async def read_snapshot(
+        request: Request,
+        response: Response,
+        session: AsyncSession = Depends(session_manager.session),
+        symbols: list[str] = Query(default=[]),
+):
+    """
+    Last close, daily change, 52-week range and 20-session average volume per symbol,
+    read from the precomputed symbol_snapshot table. Every symbol is returned when none is given.
+    """
+    if len(symbols) == 1:
+        symbols = [item.strip() for item in symbols[0].split(',')]
+    symbols = list(dict.fromkeys(symbol for symbol in symbols if symbol))
+
+    etag = await data_versions.etag(session, request, scopes_for("symbol_snapshot", symbols))
+    if not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    stmt = select(SymbolSnapshot)
+    if symbols:
+        stmt = stmt.where(SymbolSnapshot.symbol.in_(symbols))
+    queryset = await session.execute(stmt)
+    snapshots = queryset.scalars().all()
+    if not snapshots:
+        return {"s": "no_data", "data": {}}
+
+    return {
+        "s": "ok",
+        "data": {
+            snapshot.symbol: {
+                "t": int(snapshot.last_time.timestamp()),
+                "c": snapshot.last_close,
+                "pc": snapshot.previous_close,
+                "ch": snapshot.change,
+                "chp": snapshot.change_percent,
+                "h52w": snapshot.high_52w,
+                "l52w": snapshot.low_52w,
+                "adv": snapshot.average_volume,
+            }
+            for snapshot in snapshots
+        },
+    }
+
+
+@router.get("/stock/correlation", tags=["stock"])
+async def read_correlation(
+        request: Request,
+        response: Response,
+        session: AsyncSession = Depends(session_manager.session),
+        symbols: list[str] = Query(...),
+        window: int = Query(60, ge=2, le=MAX_WINDOW, description="Number of daily log returns"),
+):
+    """
+    Covariance and correlation matrices of the daily log returns of the symbols over the last window
+    sessions, computed from the date-aligned market matrix shared with the screener.
+    """
+    if len(symbols) == 1:
+        symbols = [item.strip() for item in symbols[0].split(',')]
+    symbols = list(dict.fromkeys(symbol for symbol in symbols if symbol))
+    if not symbols or len(symbols) > MAX_SYMBOLS:
+        raise HTTPException(status_code=400, detail={"msg": "Invalid symbols.", "field": "symbols"})
 
-    queryset_as_dict = queryset.mappings().all()
-    ohlc_response = {
-        "t": [],
-        "o": [],
-        "h": [],
-        "l": [],
-        "c": [],
-        "v": [],
-        "symbol": symbol,
-        "s": "ok"
+    etag = await data_versions.etag(session, request, [("one_day_candle", None)])
+    if not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    matrix = await screener.get_matrix(session, data_versions.token("one_day_candle"))
+    result = correlation_engine.compute(matrix, symbols, window)
+    if result is None or not result["symbols"]:
+        return {"s": "no_data", "missing": symbols}
+    return {
+        "s": "ok",
+        "t": result["t"],
+        "window": window,
+        "symbols": result["symbols"],
+        "missing": result["missing"],
+        "covariance": result["covariance"].tolist(),
+        "correlation": result["correlation"].tolist(),
     }
 
-    if not queryset_as_dict:
-        ohlc_response["s"] = "no_data"
-        return ohlc_response
 
-    for row in queryset_as_dict:
-        ohlc_response["t"].append(int(datetime.timestamp(row["ts"])))
-        ohlc_response["o"].append(row["open"])
-        ohlc_response["h"].append(row["high"])
-        ohlc_response["l"].append(row["low"])
-        ohlc_response["c"].append(row["close"])
-        ohlc_response["v"].append(row["volume"])
+@router.get("/stock/indicators", tags=["stock"])
+async def read_indicators(
+        session: AsyncSession = Depends(session_manager.session),
+        start: int = Query(..., alias="from"),
+        to: int = Query(...),
+        resolution: str = Query(...),
+        symbol: str = Query(...),
+        requested: str = Query(..., alias="indicators", description="e.g. sma:20,ema:50,rsi:14,macd:12:26:9,bb:20:2"),
+):
+    """
+    Technical indicators computed on the closes of the candles between from and to.
+    Enough bars before from are read for every indicator to be settled on the first returned bar.
+    """
+    if start > to:
+        raise HTTPException(status_code=400, detail={"msg": "start cannot be greater end.", "field": "start"})
+    if resolution not in RESOLUTIONS.keys():
+        raise HTTPException(status_code=400, detail={"msg": "Invalid resolution.", "field": "resolution"})
+    try:
+        specs = indicators.parse_indicators(requested)
+    except indicators.InvalidIndicator as e:
+        raise HTTPException(status_code=400, detail={"msg": str(e), "field": "indicators"})
+
+    resolution = RESOLUTIONS[resolution]
+    frame, plan = await load_frame(session, resolution, symbol, start, to)
+    response = {"t": frame.t.tolist(), "indicators": {}, "symbol": symbol, "s": "ok" if len(frame) else "no_data"}
+    if not len(frame):
+        return response
+
+    warmup = max(spec.warmup for spec in specs)
+    history = CandleFrame.empty()
+    if warmup:
+        history = await fetch_countback(session, resolution, symbol, int(frame.t[0]) - 1, warmup)
+    close = np.concatenate([history.c, frame.c])
+    returned = slice(len(history), None)
 
-    return ohlc_response
+    for spec in specs:
+        key = ("indicator", spec.key, int(frame.t[0]), int(frame.t[-1]), len(frame), len(history))
+        series = indicator_cache.get(symbol, plan.relation, key) if plan.is_view else None
+        if series is None:
+            series = indicators.take(indicators.compute(spec, close), returned)
+            if plan.is_view:
+                indicator_cache.set(symbol, plan.relation, key, series, indicators.nbytes(series))
+        response["indicators"][spec.key] = indicators.to_json(series)
+    return response
@@ -0,0 +1,86 @@
+import argparse
+import io
+import logging
+import sys
+import time
+
+import numpy as np
+from sqlmodel import Session, create_engine
+
+from config import get_settings
+from core.copy_loader import COPY_HEADER, COPY_TRAILER, STOCKPRICE_COPY_SQL, encode_stockprice, stage_and_merge
+
+logging.basicConfig(stream=sys.stdout, level=logging.DEBUG if get_settings().debug_logs else logging.INFO)
+logger = logging.getLogger(__name__)
+
+# A plain table with the same columns and unique index as stockprice, dropped with the connection.
+TARGET_TABLE = "stockprice_benchmark"
+
+
+def synthetic_bars(symbols: int, days: int, seed: int = 0) -> dict:
+    """Daily bars of ``symbols`` made up symbols over ``days`` days, as the columns encode_stockprice takes."""
+    rng = np.random.default_rng(seed)
+    names = np.array([f"S{index:04d}".encode() for index in range(symbols)], dtype=bytes)
+    start = np.datetime64("2015-01-01T07:00:00", "us")
+    times = start + np.arange(days) * np.timedelta64(1, "D")
+    close = np.abs(rng.normal(50, 10, (symbols, days))) + 1
+    return {
+        "symbols": np.repeat(names, days),
+        "times": np.tile(times, symbols),
+        "opens": close.ravel() * 0.99,
+        "highs": close.ravel() * 1.02,
+        "lows": close.ravel() * 0.98,
+        "closes": close.ravel(),
+        "volumes": rng.integers(1_000, 1_000_000, symbols * days),
+    }
+
+
+def payload(bars: dict) -> bytes:
+    return COPY_HEADER + encode_stockprice(**bars) + COPY_TRAILER
+
+
+def timed(label: str, rows: int, run) -> float:
+    started = time.perf_counter()
+    written = run()
+    elapsed = time.perf_counter() - started
+    logger.info(f"{label:<32} {elapsed:8.2f}s | {rows:>9} rows | {written:>9} written | {rows / elapsed:12.0f} rows/s")
+    return elapsed
+
+
+def benchmark(symbols: int, days: int):
+    """Compare a plain COPY with the staging + ON CONFLICT merge the loaders use, on fresh and reloaded bars."""
+    bars = synthetic_bars(symbols, days)
+    rows = symbols * days
+    fresh = payload(bars)
+    changed = payload({**bars, "closes": bars["closes"] * 1.01})
+    logger.info(f"Benchmarking {rows} bars ({symbols} symbols x {days} days) into {TARGET_TABLE}.")
+
+    db_engine = create_engine(get_settings().database_psycopg_url)
+    with Session(db_engine) as session:
+        cursor = session.connection().connection.cursor()
+        cursor.execute(f"CREATE TEMP TABLE {TARGET_TABLE} (LIKE stockprice INCLUDING DEFAULTS INCLUDING INDEXES);")
+
+        def plain_copy():
+            cursor.copy_expert(STOCKPRICE_COPY_SQL.replace("COPY stockprice(", f"COPY {TARGET_TABLE}("),
+                               io.BytesIO(fresh), size=1024 * 1024)
+            return cursor.rowcount
+
+        def merge(data: bytes):
+            return lambda: stage_and_merge(cursor, io.BytesIO(data), table=TARGET_TABLE).count
+
+        copy_seconds = timed("COPY, empty table", rows, plain_copy)
+        cursor.execute(f"TRUNCATE {TARGET_TABLE};")
+        merge_seconds = timed("merge, new bars", rows, merge(fresh))
+        timed("merge, same bars again", rows, merge(fresh))
+        timed("merge, every bar changed", rows, merge(changed))
+        logger.info(f"Merging new bars costs {merge_seconds / copy_seconds:.2f}x a plain COPY.")
+        session.rollback()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the stockprice merge against a plain COPY.")
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--days", type=int, default=1_000)
+    args = parser.parse_args()
+
+    benchmark(args.symbols, args.days)
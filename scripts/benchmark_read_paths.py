@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from datetime import datetime, timezone
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from config import get_settings
+from core.candle_query import RESOLUTIONS, candle_sql, existing_views, plan_query
+from core.candles import CandleFrame
+from db import RawConnection, raw_pool, session_manager
+from models.balancesheet import BalanceSheet
+
+logging.basicConfig(stream=sys.stdout, level=logging.DEBUG if get_settings().debug_logs else logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def timed(label: str, iterations: int, run) -> float:
+    """Run ``run()`` once to warm up, then ``iterations`` times, log and return the mean latency in ms."""
+    rows = await run()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await run()
+    elapsed = (time.perf_counter() - started) / iterations * 1000
+    logger.info(f"{label:<32} {elapsed:9.2f} ms/call | {rows:>7} rows | {rows / elapsed * 1000:12.0f} rows/s")
+    return elapsed
+
+
+async def benchmark(symbol: str, resolution: str, start: int, end: int, iterations: int):
+    """Compare the SQLAlchemy session path with the raw asyncpg path on the candle and SCFA reads."""
+    resolution = RESOLUTIONS[resolution]
+    params = {
+        "symbol": symbol,
+        "start_datetime": datetime.fromtimestamp(start, tz=timezone.utc),
+        "end_datetime": datetime.fromtimestamp(end, tz=timezone.utc),
+    }
+
+    async with AsyncSession(session_manager.engine) as session:
+        plan = plan_query(resolution, start, end, await existing_views(session))
+        query = candle_sql(plan)
+        logger.info(f"Reading {symbol} {resolution.name} from {plan.relation}, {iterations} iterations.")
+
+        async def session_candles():
+            queryset = await session.execute(query, params=params)
+            return len(CandleFrame.from_records(queryset.all()))
+
+        async def session_balance_sheet():
+            queryset = await session.execute(select(BalanceSheet).where(BalanceSheet.symbol == symbol))
+            return len([row[0].__dict__ for row in queryset.fetchall()])
+
+        orm_candles = await timed("candles / AsyncSession", iterations, session_candles)
+        orm_balance_sheet = await timed("balancesheet / AsyncSession ORM", iterations, session_balance_sheet)
+
+    pool = await raw_pool.pool()
+    async with pool.acquire() as connection:
+        raw = RawConnection(connection)
+
+        async def raw_candles():
+            return len(CandleFrame.from_records(await raw.fetch(query, params)))
+
+        async def raw_balance_sheet():
+            rows = await raw.fetch("SELECT balance_sheet FROM balancesheet WHERE symbol = :symbol;", {"symbol": symbol})
+            return len(rows)
+
+        asyncpg_candles = await timed("candles / asyncpg", iterations, raw_candles)
+        asyncpg_balance_sheet = await timed("balancesheet / asyncpg", iterations, raw_balance_sheet)
+
+    logger.info(f"Speed-up candles: {orm_candles / asyncpg_candles:.2f}x, "
+                f"balancesheet: {orm_balance_sheet / asyncpg_balance_sheet:.2f}x")
+    await raw_pool.close()
+    await session_manager.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the AsyncSession and raw asyncpg read paths.")
+    parser.add_argument("--symbol", default="FPT")
+    parser.add_argument("--resolution", default="1D", choices=list(RESOLUTIONS.keys()))
+    parser.add_argument("--from", dest="start", type=int, default=0)
+    parser.add_argument("--to", dest="end", type=int, default=int(time.time()))
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    asyncio.run(benchmark(args.symbol, args.resolution, args.start, args.end, args.iterations))
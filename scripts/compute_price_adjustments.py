@@ -0,0 +1,96 @@
+import datetime
+import logging
+import sys
+from collections import defaultdict
+
+import numpy as np
+from sqlalchemy import text
+from sqlmodel import Session, create_engine
+
+from config import get_settings
+from core.adjustments import cumulative_factors, event_factor, ex_date_epoch, parse_ratio
+from core.data_version import bump_data_version
+from db import collection
+
+db_engine = create_engine(get_settings().database_psycopg_url, echo=True)
+
+logging.basicConfig(stream=sys.stdout, level=logging.DEBUG if get_settings().debug_logs else logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def compute_price_adjustments():
+    """
+    Derive the dividend/split adjustment factors of every symbol from the dividend events collection
+    and store them in ``priceadjustment``, so ``/api/v1/stock?adjusted=true`` only has to multiply.
+    Run it after the dividend events and the daily candles are up to date.
+    """
+    events = defaultdict(list)
+    for dividend in collection.find(
+            {"symbol": {"$ne": None}, "exright_date": {"$ne": None}, "type": {"$in": ["cash", "stock"]}},
+            {"symbol": 1, "type": 1, "title": 1, "exright_date": 1},
+    ):
+        ratio = parse_ratio(dividend.get("title"))
+        if ratio:
+            events[(dividend["symbol"], ex_date_epoch(dividend["exright_date"]))].append((dividend["type"], ratio))
+    logger.info(f"Computing price adjustments for {len(events)} ex-right dates.")
+    if not events:
+        return
+
+    keys = list(events.keys())
+    with Session(db_engine) as session:
+        # Last close before every ex-right date, in one round trip.
+        previous_closes = session.execute(
+            text("""
+                SELECT e.symbol, EXTRACT(EPOCH FROM e.ex_date)::BIGINT, (
+                    SELECT close FROM one_day_candle c
+                    WHERE c.symbol = e.symbol AND c.ts < e.ex_date
+                    ORDER BY c.ts DESC
+                    LIMIT 1
+                )
+                FROM unnest(CAST(:symbols AS TEXT[]), CAST(:ex_dates AS TIMESTAMPTZ[])) AS e(symbol, ex_date);
+            """),
+            params={
+                "symbols": [symbol for symbol, _ in keys],
+                "ex_dates": [datetime.datetime.fromtimestamp(ex_date, tz=datetime.timezone.utc) for _, ex_date in keys],
+            }
+        ).all()
+
+        factors_by_symbol = defaultdict(list)
+        for symbol, ex_date, previous_close in previous_closes:
+            factor = 1.0
+            for event_type, ratio in events[(symbol, ex_date)]:
+                factor *= event_factor(event_type, ratio, previous_close) or 1.0
+            if factor != 1.0:
+                factors_by_symbol[symbol].append((ex_date, factor))
+
+        rows = []
+        for symbol, symbol_factors in factors_by_symbol.items():
+            symbol_factors.sort()
+            factors = np.array([factor for _, factor in symbol_factors])
+            for (ex_date, factor), cumulative in zip(symbol_factors, cumulative_factors(factors)):
+                rows.append({
+                    "symbol": symbol,
+                    "ex_date": datetime.datetime.fromtimestamp(ex_date, tz=datetime.timezone.utc),
+                    "factor": float(factor),
+                    "cumulative_factor": float(cumulative),
+                })
+
+        # Rebuilt as a whole in one transaction, readers never see a partial set.
+        session.execute(text("DELETE FROM priceadjustment;"))
+        if rows:
+            session.execute(
+                text("""
+                    INSERT INTO priceadjustment(symbol, ex_date, factor, cumulative_factor)
+                    VALUES (:symbol, :ex_date, :factor, :cumulative_factor);
+                """),
+                rows,
+            )
+        bump_data_version(session, "priceadjustment")
+        session.commit()
+    logger.info(f"Stored {len(rows)} price adjustments for {len(factors_by_symbol)} symbols.")
+
+
+if __name__ == "__main__":
+    compute_price_adjustments()
+
+    logger.info("Finished computing price adjustments...")
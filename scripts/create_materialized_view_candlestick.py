@@ -13,6 +13,37 @@ if __name__ == "__main__":
     conn.autocommit = True
     cursor = conn.cursor()
     cursor.execute(f"SELECT add_compression_policy('stockprice', INTERVAL '7 days', true);")
+
+    # Intraday candles, every level is a hierarchical continuous aggregate on top of the previous one.
+    # The other intraday resolutions are re-bucketed from these at query time (see core/candle_query.py).
+    intraday_resolution_list = [
+        {"one_minute_candle": ("1 minute", "stockprice", '"time"')},
+        {"fifteen_minutes_candle": ("15 minutes", "one_minute_candle", "ts")},
+        {"one_hour_candle": ("1 hour", "fifteen_minutes_candle", "ts")},
+    ]
+    for resolution in intraday_resolution_list:
+        print(f"Processing candlestick for {resolution=}")
+        key, (value, source, time_column) = next(iter(resolution.items()))
+        try:
+            cursor.execute(f"""
+                CREATE MATERIALIZED VIEW IF NOT EXISTS {key}
+                WITH (timescaledb.continuous) AS
+                    SELECT
+                        time_bucket('{value}'::interval, {time_column}) AS ts,
+                        symbol,
+                        first(open, {time_column}) AS open,
+                        max(high) AS high,
+                        min(low) AS low,
+                        last(close, {time_column}) AS close,
+                        sum(volume) AS volume
+                    FROM {source}
+                    GROUP BY time_bucket('{value}'::interval, {time_column}), symbol;
+            """)
+            print(f"Created materialized view candlestick for {key=}")
+        except Exception as e:
+            print(f"Failed to create materialized view candlestick for {key=}: {e}! Continue to next resolution.")
+            continue
+
     resolution_list = [
         {"one_day_candle": "1 day"},
         {"one_week_candle": "1 week"},
@@ -55,6 +86,21 @@ if __name__ == "__main__":
             continue
 
     continuous_aggregate_policy = {
+        "one_minute_candle": {
+            "start_offset": "1 day",
+            "end_offset": "1 minute",
+            "schedule_interval": "1 hour"
+        },
+        "fifteen_minutes_candle": {
+            "start_offset": "2 days",
+            "end_offset": "15 minutes",
+            "schedule_interval": "1 hour"
+        },
+        "one_hour_candle": {
+            "start_offset": "3 days",
+            "end_offset": "1 hour",
+            "schedule_interval": "1 hour"
+        },
         "one_day_candle": {
             "start_offset": "3 days",
             "end_offset": "1 day",
@@ -5,13 +5,18 @@ from datetime import datetime
 
 import pytz
 import requests
+from sqlmodel import Session, create_engine
 
 from config import get_settings
+from core.data_version import bump_data_version
 from db import collection
+from scripts.compute_price_adjustments import compute_price_adjustments
 
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG if get_settings().debug_logs else logging.INFO)
 logger = logging.getLogger(__name__)
 
+db_engine = create_engine(get_settings().database_psycopg_url, echo=True)
+
 
 
 
@@ -64,10 +69,15 @@ def download_dividend_event_data():
 
         page += 1
 
+    with Session(db_engine) as session:
+        bump_data_version(session, "dividend_events")
+        session.commit()
+
 
 if __name__ == "__main__":
     print("Downloading Dividend event Data...")
 
     download_dividend_event_data()
+    compute_price_adjustments()
 
     print("Downloaded Dividend event!")
@@ -1,332 +1,124 @@
+import argparse
+import asyncio
+import functools
 import json
 import logging
 import sys
 import time
 
-import requests
 from sqlalchemy import text
 from sqlmodel import Session, create_engine
 
 from config import get_settings
+from core.data_version import bump_data_version
+from core.statement_crawler import STATEMENT_TABLES, crawl_statements, statement_hash, statement_jobs
 
 db_engine = create_engine(get_settings().database_psycopg_url, echo=True)
-session = Session(db_engine)
 
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG if get_settings().debug_logs else logging.INFO)
 logger = logging.getLogger(__name__)
 
+# A statement whose content hash did not move is not rewritten, the WHERE guards against a concurrent run.
+UPSERT_STATEMENT_SQL = """
+    INSERT INTO {table}(symbol, yearly, {column}, content_hash)
+    VALUES (:symbol, :yearly, :statement, :content_hash)
+    ON CONFLICT (symbol, yearly) DO UPDATE SET
+        {column} = EXCLUDED.{column},
+        content_hash = EXCLUDED.content_hash,
+        updated_at = current_timestamp(0)
+    WHERE {table}.content_hash IS DISTINCT FROM EXCLUDED.content_hash;
+"""
+
+STORED_HASHES_SQL = "SELECT symbol, yearly, content_hash FROM {table} WHERE symbol = ANY(:symbols);"
+
+
+def write_statements(batch: list, changed: dict):
+    """
+    Upsert the statements of a batch of ``(job, statement)`` whose content hash moved and bump the data
+    version of their symbols, in one transaction. The symbols written are added to ``changed`` by table.
+    """
+    started = time.perf_counter()
+    by_statement = {}
+    for job, statement in batch:
+        by_statement.setdefault(job.statement, []).append({
+            "symbol": job.symbol,
+            "yearly": job.yearly,
+            "statement": json.dumps(statement),
+            "content_hash": statement_hash(statement),
+        })
+    written = 0
+    with Session(db_engine) as writer_session:
+        for statement, rows in by_statement.items():
+            table, column = STATEMENT_TABLES[statement]
+            stored = writer_session.execute(text(STORED_HASHES_SQL.format(table=table)),
+                                            {"symbols": sorted({row["symbol"] for row in rows})})
+            hashes = {(symbol, yearly): content_hash for symbol, yearly, content_hash in stored.all()}
+            rows = [row for row in rows if hashes.get((row["symbol"], row["yearly"])) != row["content_hash"]]
+            if not rows:
+                continue
+            writer_session.execute(text(UPSERT_STATEMENT_SQL.format(table=table, column=column)), rows)
+            symbols = {row["symbol"] for row in rows}
+            bump_data_version(writer_session, table, symbols)
+            changed.setdefault(table, set()).update(symbols)
+            written += len(rows)
+        writer_session.commit()
+    logger.info(f"Wrote {written} of {len(batch)} statements, the others are unchanged, "
+                f"in {time.perf_counter() - started:.2f}s")
+
+
+def download_statements_from_tcbs(statements=tuple(STATEMENT_TABLES), concurrency: int = 8, rate: float = 5) -> dict:
+    """
+    Download the yearly and quarterly ``statements`` of every listed stock from TCBS. Returns the symbols
+    whose statements changed by table, for the caches and jobs computed from them.
+    """
+    with Session(db_engine) as session:
+        stocks = text("select symbol from stock where symbol is not null and is_listed = true")
+        symbols = [stock._mapping["symbol"] for stock in session.exec(stocks)]
+
+    jobs = statement_jobs(symbols, statements)
+    logger.info(f"Start downloading {len(jobs)} statements ({', '.join(statements)}) of {len(symbols)} symbols")
+    started = time.perf_counter()
+    changed = {}
+    write = functools.partial(write_statements, changed=changed)
+    fetched = asyncio.run(crawl_statements(jobs, write, concurrency, rate))
+    logger.info(f"Downloaded {fetched} of {len(jobs)} statements in {time.perf_counter() - started:.2f}s")
+    changed = {table: sorted(symbols) for table, symbols in changed.items()}
+    for table, table_symbols in changed.items():
+        logger.info(f"Changed {table} of {len(table_symbols)} symbols: {', '.join(table_symbols)}")
+    return changed
 
-def download_balancesheet_from_tcbs():
-    stocks = text("select symbol from stock where symbol is not null and is_listed = true")
-    results = session.exec(stocks)
-
-    for stock in results:
-        symbol = stock._mapping["symbol"]
-        logger.info(f"Start downloading Balance Sheet with Stock yearly: {symbol}")
-        # Download TCA data from TCBS yearly
-        download_url = (f"https://apipubaws.tcbs.com.vn/tcanalysis/v1/finance/"
-                        f"{symbol}/balancesheet?yearly=1&isAll=true")
-        response = requests.get(download_url)
-        logger.debug(f"Download URL: {download_url}")
-        try:
-            json_resp = response.json()
-        except requests.exceptions.JSONDecodeError as e:
-            logger.error(f"JSON decode error: {e} with status code {response.status_code}")
-        logger.debug(f"Balance Sheet Symbol {stock} {json_resp=}")
-        time.sleep(1)
-        if response.status_code != 200:
-            logger.info(f"Download error with symbol {symbol}: {json_resp}")
-            continue
-        logger.debug(f"{json_resp=}")
-        if not json_resp:
-            print(f"Download error with symbol {symbol}: {json_resp}")
-            continue
-        try:
-            income_statement = json.dumps(json_resp)
-        except json.encoder.JSONEncoder as e:
-            logger.error(e)
-            continue
-        finally:
-            tuple_data = (
-                symbol,
-                True,
-                income_statement
-            )
-            stmt = text(f"""
-                INSERT INTO balancesheet(symbol, yearly, balance_sheet) 
-                VALUES {tuple_data}
-                ON CONFLICT (symbol, yearly) DO UPDATE SET balance_sheet = EXCLUDED.balance_sheet;
-            """)
-            session.execute(stmt)
-            session.commit()
 
-        # Download TCA data from TCBS quarterly
-        logger.info(f"Start downloading Balance Sheet with Stock quarterly: {symbol}")
-        download_url = (f"https://apipubaws.tcbs.com.vn/tcanalysis/v1/finance/"
-                        f"{symbol}/balancesheet?yearly=0&isAll=true")
-        response = requests.get(download_url)
-        json_resp = response.json()
-        logger.debug(f"Balance Sheet Symbol {stock} {json_resp=}")
-        time.sleep(1)
-        if response.status_code != 200:
-            logger.info(f"Download error with symbol {symbol}: {json_resp}")
-            continue
-        logger.debug(f"{json_resp=}")
-        if not json_resp:
-            print(f"Download error with symbol {symbol}: {json_resp}")
-            continue
-        try:
-            income_statement = json.dumps(json_resp)
-        except json.encoder.JSONEncoder as e:
-            logger.error(e)
-            continue
-        finally:
-            tuple_data = (
-                symbol,
-                False,
-                income_statement
-            )
-            stmt = text(f"""
-                INSERT INTO balancesheet(symbol, yearly, balance_sheet) 
-                VALUES {tuple_data}
-                ON CONFLICT (symbol, yearly) DO UPDATE SET balance_sheet = EXCLUDED.balance_sheet;
-            """)
-            session.execute(stmt)
-            session.commit()
+def download_balancesheet_from_tcbs():
+    download_statements_from_tcbs(["balancesheet"])
 
 
 def download_cashflow_from_tcbs():
-    stocks = text("select symbol from stock where symbol is not null and is_listed = true")
-    results = session.exec(stocks)
-
-    for stock in results:
-        symbol = stock._mapping["symbol"]
-        logger.info(f"Start downloading Cashflow with Stock yearly: {symbol}")
-        # Download TCA data from TCBS yearly
-        download_url = (f"https://apipubaws.tcbs.com.vn/tcanalysis/v1/finance/"
-                        f"{symbol}/cashflow?yearly=1&isAll=true")
-        response = requests.get(download_url)
-        json_resp = response.json()
-        logger.debug(f"Cashflow Symbol {stock} {json_resp=}")
-        time.sleep(1)
-        if response.status_code != 200:
-            logger.info(f"Download error with symbol {symbol}: {json_resp}")
-            continue
-        logger.debug(f"{json_resp=}")
-        if not json_resp:
-            print(f"Download error with symbol {symbol}: {json_resp}")
-            continue
-        try:
-            income_statement = json.dumps(json_resp)
-        except json.encoder.JSONEncoder as e:
-            logger.error(e)
-            continue
-        finally:
-            tuple_data = (
-                symbol,
-                True,
-                income_statement
-            )
-            stmt = text(f"""
-                INSERT INTO cashflow(symbol, yearly, cashflow) 
-                VALUES {tuple_data}
-                ON CONFLICT (symbol, yearly) DO UPDATE SET cashflow = EXCLUDED.cashflow;
-            """)
-            session.execute(stmt)
-            session.commit()
-
-        # Download TCA data from TCBS quarterly
-        logger.info(f"Start downloading Cashflow with Stock quarterly: {symbol}")
-        download_url = (f"https://apipubaws.tcbs.com.vn/tcanalysis/v1/finance/"
-                        f"{symbol}/cashflow?yearly=0&isAll=true")
-        response = requests.get(download_url)
-        json_resp = response.json()
-        logger.debug(f"Cashflow Symbol {stock} {json_resp=}")
-        time.sleep(1)
-        if response.status_code != 200:
-            logger.info(f"Download error with symbol {symbol}: {json_resp}")
-            continue
-        logger.debug(f"{json_resp=}")
-        if not json_resp:
-            print(f"Download error with symbol {symbol}: {json_resp}")
-            continue
-        try:
-            income_statement = json.dumps(json_resp)
-        except json.encoder.JSONEncoder as e:
-            logger.error(e)
-            continue
-        finally:
-            tuple_data = (
-                symbol,
-                False,
-                income_statement
-            )
-            stmt = text(f"""
-                INSERT INTO cashflow(symbol, yearly, cashflow) 
-                VALUES {tuple_data}
-                ON CONFLICT (symbol, yearly) DO UPDATE SET cashflow = EXCLUDED.cashflow;
-            """)
-            session.execute(stmt)
-            session.commit()
+    download_statements_from_tcbs(["cashflow"])
 
 
 def download_incomestatement_from_tcbs():
-    stocks = text("select symbol from stock where symbol is not null and is_listed = true")
-    results = session.exec(stocks)
-
-    for stock in results:
-        symbol = stock._mapping["symbol"]
-        logger.info(f"Start downloading income statement with Stock yearly: {symbol}")
-        # Download TCA data from TCBS yearly
-        download_url = (f"https://apipubaws.tcbs.com.vn/tcanalysis/v1/finance/"
-                        f"{symbol}/incomestatement?yearly=1&isAll=true")
-        response = requests.get(download_url)
-        json_resp = response.json()
-        logger.debug(f"Income statement Symbol {stock} {json_resp=}")
-        time.sleep(1)
-        if response.status_code != 200:
-            logger.info(f"Download error with symbol {symbol}: {json_resp}")
-            continue
-        logger.debug(f"{json_resp=}")
-        if not json_resp:
-            print(f"Download error with symbol {symbol}: {json_resp}")
-            continue
-        try:
-            income_statement = json.dumps(json_resp)
-        except json.encoder.JSONEncoder as e:
-            logger.error(e)
-            continue
-        finally:
-            tuple_data = (
-                symbol,
-                True,
-                income_statement
-            )
-            stmt = text(f"""
-                INSERT INTO incomestatement(symbol, yearly, income_statement) 
-                VALUES {tuple_data}
-                ON CONFLICT (symbol, yearly) DO UPDATE SET income_statement = EXCLUDED.income_statement;
-            """)
-            session.execute(stmt)
-            session.commit()
-
-        # Download TCA data from TCBS quarterly
-        logger.info(f"Start downloading income statement with Stock quarterly: {symbol}")
-        download_url = (f"https://apipubaws.tcbs.com.vn/tcanalysis/v1/finance/"
-                        f"{symbol}/incomestatement?yearly=0&isAll=true")
-        response = requests.get(download_url)
-        json_resp = response.json()
-        logger.debug(f"Income statement Symbol {stock} {json_resp=}")
-        time.sleep(1)
-        if response.status_code != 200:
-            logger.info(f"Download error with symbol {symbol}: {json_resp}")
-            continue
-        logger.debug(f"{json_resp=}")
-        if not json_resp:
-            print(f"Download error with symbol {symbol}: {json_resp}")
-            continue
-        try:
-            income_statement = json.dumps(json_resp)
-        except json.encoder.JSONEncoder as e:
-            logger.error(e)
-            continue
-        finally:
-            tuple_data = (
-                symbol,
-                False,
-                income_statement
-            )
-            stmt = text(f"""
-                INSERT INTO incomestatement(symbol, yearly, income_statement) 
-                VALUES {tuple_data}
-                ON CONFLICT (symbol, yearly) DO UPDATE SET income_statement = EXCLUDED.income_statement;
-            """)
-            session.execute(stmt)
-            session.commit()
+    download_statements_from_tcbs(["incomestatement"])
 
 
 def download_financial_ratio_from_tcbs():
-    stocks = text("select symbol from stock where symbol is not null and is_listed = true")
-    results = session.exec(stocks)
-
-    for stock in results:
-        symbol = stock._mapping["symbol"]
-        logger.info(f"Start downloading financial ratio with Stock yearly: {symbol}")
-        # Download TCA data from TCBS yearly
-        download_url = (f"https://apipubaws.tcbs.com.vn/tcanalysis/v1/finance/"
-                        f"{symbol}/financialratio?yearly=1&isAll=true")
-        response = requests.get(download_url)
-        json_resp = response.json()
-        logger.debug(f"Financial Ratio Symbol {stock} {json_resp=}")
-        time.sleep(1)
-        if response.status_code != 200:
-            logger.info(f"Download error with symbol {symbol}: {json_resp}")
-            continue
-        logger.debug(f"{json_resp=}")
-        if not json_resp:
-            print(f"Download error with symbol {symbol}: {json_resp}")
-            continue
-        try:
-            financial_ratio = json.dumps(json_resp)
-        except json.encoder.JSONEncoder as e:
-            logger.error(e)
-            continue
-        finally:
-            tuple_data = (
-                symbol,
-                True,
-                financial_ratio
-            )
-            stmt = text(f"""
-                INSERT INTO financialratio(symbol, yearly, financial_ratio) 
-                VALUES {tuple_data}
-                ON CONFLICT (symbol, yearly) DO UPDATE SET financial_ratio = EXCLUDED.financial_ratio;
-            """)
-            session.execute(stmt)
-            session.commit()
-
-        # Download TCA data from TCBS quarterly
-        logger.info(f"Start downloading income statement with Stock quarterly: {symbol}")
-        download_url = (f"https://apipubaws.tcbs.com.vn/tcanalysis/v1/finance/"
-                        f"{symbol}/financialratio?yearly=0&isAll=true")
-        response = requests.get(download_url)
-        json_resp = response.json()
-        logger.debug(f"Financial Ratio Symbol {stock} {json_resp=}")
-        time.sleep(1)
-        if response.status_code != 200:
-            logger.info(f"Download error with symbol {symbol}: {json_resp}")
-            continue
-        logger.debug(f"{json_resp=}")
-        if not json_resp:
-            print(f"Download error with symbol {symbol}: {json_resp}")
-            continue
-        try:
-            financial_ratio = json.dumps(json_resp)
-        except json.encoder.JSONEncoder as e:
-            logger.error(e)
-            continue
-        finally:
-            tuple_data = (
-                symbol,
-                False,
-                financial_ratio
-            )
-            stmt = text(f"""
-                INSERT INTO financialratio(symbol, yearly, financial_ratio) 
-                VALUES {tuple_data}
-                ON CONFLICT (symbol, yearly) DO UPDATE SET financial_ratio = EXCLUDED.financial_ratio;
-            """)
-            session.execute(stmt)
-            session.commit()
+    download_statements_from_tcbs(["financialratio"])
 
 
 if __name__ == "__main__":
-    print("Downloading SCFA Data from TCBS...")
-
-    download_balancesheet_from_tcbs()
-    download_cashflow_from_tcbs()
-    download_incomestatement_from_tcbs()
-    download_financial_ratio_from_tcbs()
-    session.close()
-
-    print("Downloaded SCFA from TCBS")
+    parser = argparse.ArgumentParser(description="Download the financial statements of every stock from TCBS.")
+    parser.add_argument("--statement", dest="statements", action="append", choices=list(STATEMENT_TABLES),
+                        help="Statement to download, repeat for several. Every statement by default.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once.")
+    parser.add_argument("--rate", type=float, default=5, help="Requests per second.")
+    parser.add_argument("--changed-output", help="Write the changed symbols by table to this JSON file.")
+    args = parser.parse_args()
+
+    logger.info("Downloading SCFA Data from TCBS...")
+
+    changed_symbols = download_statements_from_tcbs(args.statements or list(STATEMENT_TABLES), args.concurrency,
+                                                    args.rate)
+    if args.changed_output:
+        with open(args.changed_output, "w") as changed_file:
+            json.dump(changed_symbols, changed_file)
+
+    logger.info("Downloaded SCFA from TCBS")
@@ -1,122 +1,207 @@
+import argparse
+import asyncio
 import datetime
+import logging
 import os
+import sys
 import time
+from typing import Optional
 
-import psycopg2
+import httpx
+import numpy as np
 import pytz
-import requests
 from sqlalchemy import text
 from sqlmodel import Session, create_engine
 
 from config import get_settings
+from core.copy_loader import copy_encoded, encode_stockprice
+from core.data_version import bump_data_version
+from core.price_validation import Quarantine
+from core.rate_limit import TokenBucket
+from scripts.refresh_materialized_view import CANDLE_VIEWS, refresh_candle_views
+from scripts.refresh_symbol_snapshot import refresh_symbol_snapshots
+
+# Point the downloader at a local stand-in instead of EntradeX, e.g. http://localhost:8080.
+DNSE_BASE_URL = os.environ.get("DNSE_BASE_URL", "https://services.entrade.com.vn")
+OHLC_PATH = "/chart-api/v2/ohlcs/stock"
+
+# Bars collected before they are copied into stockprice at once.
+BATCH_ROWS = 50_000
+
+# Attempts per symbol, a 429 or 5xx answer is retried after 1s, 2s...
+MAX_ATTEMPTS = 3
 
 db_engine = create_engine(get_settings().database_psycopg_url, echo=True)
-session = Session(db_engine)
-
-
-def download_stockprice_from_dnse():
-    start_datetime = datetime.datetime(
-        2024,
-        10,
-        2,
-        8,
-        0,
-        0,
-        0,
-        pytz.timezone("Asia/Ho_Chi_Minh")
-    )
-    utc_now = datetime.datetime.now(pytz.utc)
+
+logging.basicConfig(stream=sys.stdout, level=logging.DEBUG if get_settings().debug_logs else logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class PriceBatch:
+    """
+    Bars of the symbols downloaded since the last COPY, already validated and encoded, and the time range
+    of the run. Rejected bars wait in ``quarantine`` to be written with the batch.
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.symbols = set()
+        self.rows = 0
+        self.quarantine = Quarantine()
+        self.earliest: Optional[int] = None
+        self.latest: Optional[int] = None
+
+    def add(self, symbol: str, bars: dict):
+        times = np.asarray(bars["t"], dtype=np.int64)
+        columns = self.quarantine.screen(f"dnse:{symbol}", {
+            "symbols": np.full(times.shape[0], symbol.encode(), dtype=bytes),
+            "times": times.astype("datetime64[s]"),
+            "opens": np.asarray(bars["o"], dtype=np.float64),
+            "highs": np.asarray(bars["h"], dtype=np.float64),
+            "lows": np.asarray(bars["l"], dtype=np.float64),
+            "closes": np.asarray(bars["c"], dtype=np.float64),
+            # A missing volume is no trade, NaN would cast to the smallest int64.
+            "volumes": np.nan_to_num(np.asarray(bars["v"], dtype=np.float64), nan=0).astype(np.int64),
+        })
+        times = columns["times"].astype(np.int64)
+        if not times.shape[0]:
+            return
+        self.parts.append(encode_stockprice(**columns))
+        self.symbols.add(symbol)
+        self.rows += times.shape[0]
+        self.earliest = int(times.min()) if self.earliest is None else min(self.earliest, int(times.min()))
+        self.latest = int(times.max()) if self.latest is None else max(self.latest, int(times.max()))
+
+    def take(self) -> tuple:
+        """
+        The encoded tuples, their symbols, row count and the rejected bars. The batch starts over, the time
+        range is kept.
+        """
+        taken = (b"".join(self.parts), self.symbols, self.rows, self.quarantine)
+        self.parts, self.symbols, self.rows, self.quarantine = [], set(), 0, Quarantine()
+        return taken
+
+
+def copy_batch(tuples: bytes, symbols: set, rows: int, quarantine: Quarantine):
+    """
+    COPY one batch, quarantine its rejected bars and bump the symbols' data version in the same
+    transaction, runs on a worker thread.
+    """
+    started = time.perf_counter()
+    with Session(db_engine) as writer_session:
+        cursor = writer_session.connection().connection.cursor()
+        if rows:
+            copy_encoded(cursor, tuples)
+            bump_data_version(writer_session, "stockprice", symbols)
+        quarantine.write(cursor)
+        writer_session.commit()
+    logger.info(f"Copied {rows} bars of {len(symbols)} symbols in {time.perf_counter() - started:.2f}s")
+
+
+async def fetch_bars(client: httpx.AsyncClient, limiter: TokenBucket, symbol: str, start: int,
+                     end: int) -> Optional[dict]:
+    """Daily bars of ``symbol`` between the two epochs, ``None`` when DNSE has none or keeps failing."""
+    params = {"from": start, "to": end, "symbol": symbol, "resolution": "1D"}
+    for attempt in range(MAX_ATTEMPTS):
+        await limiter.acquire()
+        try:
+            response = await client.get(OHLC_PATH, params=params)
+        except httpx.HTTPError as e:
+            logger.warning(f"Download error with symbol {symbol}: {e!r}")
+        else:
+            if response.status_code == 200:
+                try:
+                    bars = response.json()
+                except ValueError as e:
+                    logger.error(f"JSON decode error with symbol {symbol}: {e}")
+                    return None
+                if not bars.get("t"):
+                    logger.info(f"No bar for symbol {symbol}: {bars}")
+                    return None
+                return bars
+            if response.status_code != 429 and response.status_code < 500:
+                logger.error(f"Download error with symbol {symbol}: {response.status_code} {response.text}")
+                return None
+            logger.warning(f"Download error with symbol {symbol}: {response.status_code}, retrying.")
+        await asyncio.sleep(2 ** attempt)
+    logger.error(f"Giving up on symbol {symbol} after {MAX_ATTEMPTS} attempts.")
+    return None
+
+
+async def download_stockprice(symbols: list, start: int, end: int, concurrency: int = 8, rate: float = 10,
+                              batch_rows: int = BATCH_ROWS) -> tuple:
+    """
+    Download the daily bars of ``symbols`` with at most ``concurrency`` requests in flight and ``rate``
+    requests per second, COPY them in batches of ``batch_rows``. Returns the time range written (epochs).
+    """
+    limiter = TokenBucket(rate)
+    semaphore = asyncio.Semaphore(concurrency)
+    batch = PriceBatch()
+    # One COPY at a time, the downloads go on while it runs.
+    copy_lock = asyncio.Lock()
+
+    async def flush():
+        async with copy_lock:
+            if batch.rows or batch.quarantine.rows:
+                await asyncio.to_thread(copy_batch, *batch.take())
+
+    async def load(symbol: str):
+        async with semaphore:
+            bars = await fetch_bars(client, limiter, symbol, start, end)
+        if bars is None:
+            return
+        batch.add(symbol, bars)
+        if batch.rows >= batch_rows:
+            await flush()
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=DNSE_BASE_URL, limits=limits, timeout=30) as client:
+        await asyncio.gather(*(load(symbol) for symbol in symbols))
+    await flush()
+    return batch.earliest, batch.latest
+
+
+def download_stockprice_from_dnse(start_datetime: Optional[datetime.datetime] = None, concurrency: int = 8,
+                                  rate: float = 10):
+    if start_datetime is None:
+        start_datetime = pytz.timezone("Asia/Ho_Chi_Minh").localize(datetime.datetime(2024, 10, 2, 8))
     today = datetime.datetime.now(pytz.timezone("Asia/Ho_Chi_Minh"))
     delta = (today - start_datetime).days
-    stocks = text("select symbol from stock where symbol is not null")
-    results = session.exec(stocks)
-
     end_datetime = (start_datetime + datetime.timedelta(days=delta))
 
-    start_time = start_datetime.timestamp()
-    end_time = end_datetime.timestamp()
-    for stock in results:
-        symbol = stock._mapping["symbol"]
-        print(f"Start downloading data with Stock: {symbol}"
-              f" start at {start_datetime.strftime('%Y-%m-%d %H:%M:%S+00')}"
-              f" end at {end_datetime.strftime('%Y-%m-%d %H:%M:%S+00')}")
-        download_url = (f"https://services.entrade.com.vn/chart-api/v2/ohlcs/stock?from="
-                        f"{int(start_time)}&to={int(end_time)}&symbol={symbol}&resolution=1D")
-        response = requests.get(download_url)
-        json_resp = response.json()
-        if response.status_code != 200:
-            print(f"Download error with symbol {symbol}: {json_resp}")
-            continue
-        if not json_resp["t"]:
-            print(f"Download error with symbol {symbol}: {json_resp}")
-            continue
-        data_lst = []
-        for i in range(len(json_resp["t"])):
-            dt = datetime.datetime.fromtimestamp(
-                json_resp["t"][i],
-                tz=pytz.UTC
-            )
-            data = (
-                symbol,
-                dt.strftime('%Y-%m-%d %H:%M:%S+00'),
-                json_resp["o"][i],
-                json_resp["h"][i],
-                json_resp["l"][i],
-                json_resp["c"][i],
-                json_resp["v"][i],
-            ).__repr__()
-            data_lst.append(data)
-            print(data)
-        print(f"Import stock price data with symbl {symbol} to database")
-        values = ",".join(tuple(data_lst))
-        stmt = text(f"""
-            INSERT INTO
-            stockprice(symbol, "time", "open", high, low, "close", volume)
-            VALUES {values};
-        """)
-        session.execute(stmt)
-        session.commit()
-        print(f"Imported stock price data with symbl {symbol} to database")
-        time.sleep(0.5)
-
-        print(f"Refresh candle stick views.")
-        candle_sticks = [
-            "one_minute_candle",
-            "three_minutes_candle",
-            "five_minutes_candle",
-            "fifteen_minutes_candle",
-            "thirty_minutes_candle",
-            "forty_five_minutes_candle",
-            "one_hour_candle",
-            "two_hours_candle",
-            "four_hours_candle",
-            "one_day_candle",
-            "one_week_candle",
-            "one_month_candle",
-            "three_months_candle",
-            "six_months_candle",
-            "one_year_candle",
-        ]
-        conn = psycopg2.connect(database=os.environ["DB_NAME"],
-                                user=os.environ["DB_USER"],
-                                password=os.environ["DB_PASSWORD"],
-                                host=os.environ["DB_HOST"],
-                                port=os.environ["DB_PORT"],
-                                )
-        conn.autocommit = True
-        cursor = conn.cursor()
-        for candle in candle_sticks:
-            cursor.execute(f"""CALL refresh_continuous_aggregate('{candle}', NULL,
-             '{utc_now.strftime('%Y-%m-%d')}');""")
-
-        cursor.close()
-        conn.close()
+    with Session(db_engine) as session:
+        stocks = text("select symbol from stock where symbol is not null")
+        symbols = [stock._mapping["symbol"] for stock in session.exec(stocks)]
+
+    logger.info(f"Start downloading {len(symbols)} symbols"
+                f" start at {start_datetime.strftime('%Y-%m-%d %H:%M:%S%z')}"
+                f" end at {end_datetime.strftime('%Y-%m-%d %H:%M:%S%z')}")
+    earliest, latest = asyncio.run(download_stockprice(
+        symbols, int(start_datetime.timestamp()), int(end_datetime.timestamp()), concurrency, rate,
+    ))
+
+    if earliest is None:
+        logger.info("No price downloaded, the candle stick views are up to date.")
+        return
+    # One refresh for the whole run, over the time range actually written.
+    since = datetime.datetime.fromtimestamp(earliest, tz=pytz.UTC)
+    until = datetime.datetime.fromtimestamp(latest, tz=pytz.UTC)
+    logger.info(f"Refresh candle stick views from {since} to {until}.")
+    refresh_candle_views(CANDLE_VIEWS, since=since, until=until)
 
 
 if __name__ == "__main__":
-    print("Downloading stock price data from EntradeX...")
+    parser = argparse.ArgumentParser(description="Download the daily bars of every symbol from EntradeX.")
+    parser.add_argument("--from", dest="start", type=datetime.datetime.fromisoformat,
+                        help="First day to download (Asia/Ho_Chi_Minh), 2024-10-02 by default.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once.")
+    parser.add_argument("--rate", type=float, default=10, help="Requests per second.")
+    args = parser.parse_args()
+    start = pytz.timezone("Asia/Ho_Chi_Minh").localize(args.start) if args.start else None
+
+    logger.info("Downloading stock price data from EntradeX...")
 
-    download_stockprice_from_dnse()
-    session.close()
+    download_stockprice_from_dnse(start, args.concurrency, args.rate)
+    refresh_symbol_snapshots()
 
-    print("Downloaded stock price data from EntradeX")
+    logger.info("Downloaded stock price data from EntradeX")
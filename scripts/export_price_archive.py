@@ -0,0 +1,146 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+from sqlalchemy import text
+from sqlmodel import Session, create_engine
+
+from config import get_settings
+from core.data_version import ALL_SYMBOLS
+from core.parquet_archive import ARCHIVE_DIR, ARCHIVE_TABLES, partition_path, remove_partition, write_partition
+
+db_engine = create_engine(get_settings().database_psycopg_url, echo=True)
+
+logging.basicConfig(stream=sys.stdout, level=logging.DEBUG if get_settings().debug_logs else logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Versions and partition fingerprints of the last export, next to the partitions.
+STATE_FILE = "_export_state.json"
+
+# Rows and content hash of every year of one symbol. The hash is a sum, no row is held in memory by it.
+FINGERPRINT_SQL = """
+    SELECT extract(year FROM {time} AT TIME ZONE 'UTC')::int AS year,
+           count(*)::text || ':' || sum(hashtextextended(
+               concat_ws(',', extract(epoch FROM {time}), "open", high, low, "close", volume), 0))::text
+    FROM {table}
+    WHERE symbol = %(symbol)s
+    GROUP BY 1;
+"""
+
+PARTITION_SQL = """
+    SELECT (extract(epoch FROM {time}) * 1000000)::bigint, "open", high, low, "close", coalesce(volume, 0)::bigint
+    FROM {table}
+    WHERE symbol = %(symbol)s AND {time} >= %(start)s AND {time} < %(end)s
+    ORDER BY {time};
+"""
+
+
+def read_state(root: str) -> dict:
+    path = os.path.join(root, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as state_file:
+        return json.load(state_file)
+
+
+def write_state(root: str, state: dict):
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, STATE_FILE)
+    with open(f"{path}.tmp", "w") as state_file:
+        json.dump(state, state_file)
+    os.replace(f"{path}.tmp", path)
+
+
+def scope_versions(session, scope: str) -> dict:
+    versions = session.execute(text("SELECT symbol, version FROM dataversion WHERE scope = :scope;"),
+                               {"scope": scope})
+    return {symbol: version for symbol, version in versions.all()}
+
+
+def changed_symbols(symbols: set, versions: dict, exported_versions: dict) -> list:
+    """The symbols whose version moved since the export, all of them when the version of every symbol did."""
+    if versions.get(ALL_SYMBOLS) != exported_versions.get(ALL_SYMBOLS):
+        return sorted(symbols)
+    return sorted(symbol for symbol in symbols if versions.get(symbol) != exported_versions.get(symbol))
+
+
+def export_symbol(cursor, table: str, time_column: str, symbol: str, fingerprints: dict, root: str) -> int:
+    """
+    Rewrite the year partitions of ``symbol`` whose fingerprint differs from ``fingerprints`` (updated in
+    place) and drop the years which are gone. Returns the partitions written.
+    """
+    cursor.execute(FINGERPRINT_SQL.format(table=table, time=time_column), {"symbol": symbol})
+    current = {str(year): fingerprint for year, fingerprint in cursor.fetchall()}
+    for year in set(fingerprints) - set(current):
+        remove_partition(partition_path(root, table, int(year), symbol))
+        del fingerprints[year]
+
+    written = 0
+    for year, fingerprint in sorted(current.items()):
+        if fingerprints.get(year) == fingerprint:
+            continue
+        cursor.execute(PARTITION_SQL.format(table=table, time=time_column), {
+            "symbol": symbol, "start": f"{year}-01-01 00:00:00+00", "end": f"{int(year) + 1}-01-01 00:00:00+00",
+        })
+        rows = cursor.fetchall()
+        epochs, opens, highs, lows, closes, volumes = (np.array(column) for column in zip(*rows))
+        write_partition(partition_path(root, table, int(year), symbol),
+                        epochs.astype(np.int64), opens, highs, lows, closes, volumes.astype(np.int64))
+        fingerprints[year] = fingerprint
+        written += 1
+    return written
+
+
+def export_price_archive(full: bool = False, root: str = ARCHIVE_DIR):
+    """
+    Export ``stockprice`` and ``one_day_candle`` to Parquet (zstd), one file per year and symbol under
+    ``root``. Only the symbols whose version of the relation moved since the last export are looked at,
+    and of those only the years whose content changed are rewritten. ``full`` rewrites every partition.
+
+    The versions are read before the rows, a view refreshed while the export runs moves its version
+    again and the next export looks at it.
+    """
+    started = time.perf_counter()
+    state = {} if full else read_state(root)
+    exported_versions = state.get("versions", {})
+    fingerprints = state.get("fingerprints", {})
+
+    with Session(db_engine) as session:
+        # The relations are their data version scopes: the ingest jobs bump stockprice per symbol, the
+        # refresh bumps one_day_candle for every symbol once the view holds the new bars.
+        versions = {table: scope_versions(session, table) for table in ARCHIVE_TABLES}
+        stocks = text("select symbol from stock where symbol is not null")
+        symbols = {stock._mapping["symbol"] for stock in session.exec(stocks)}
+        # Symbols archived before but no longer listed are checked too, their partitions may be gone.
+        symbols |= {symbol for table_prints in fingerprints.values() for symbol in table_prints}
+
+        cursor = session.connection().connection.cursor()
+        for table, time_column in ARCHIVE_TABLES.items():
+            changed = sorted(symbols) if full else \
+                changed_symbols(symbols, versions[table], exported_versions.get(table, {}))
+            logger.info(f"Export {len(changed)} of {len(symbols)} symbols of {table} to the price archive at {root}.")
+            table_prints = fingerprints.setdefault(table, {})
+            written = 0
+            for symbol in changed:
+                written += export_symbol(cursor, table, time_column, symbol, table_prints.setdefault(symbol, {}),
+                                         root)
+                if not table_prints[symbol]:
+                    del table_prints[symbol]
+            logger.info(f"Wrote {written} partitions of {table}.")
+        session.rollback()
+
+    write_state(root, {"versions": versions, "fingerprints": fingerprints})
+    logger.info(f"Exported the price archive in {time.perf_counter() - started:.2f}s.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the price history to a Parquet archive.")
+    parser.add_argument("--full", action="store_true", help="Rewrite every partition instead of the changed ones.")
+    parser.add_argument("--root", default=ARCHIVE_DIR, help=f"Archive directory, {ARCHIVE_DIR} by default.")
+    args = parser.parse_args()
+
+    export_price_archive(full=args.full, root=args.root)
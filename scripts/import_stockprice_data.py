@@ -1,24 +1,32 @@
-import csv
-import datetime
+import argparse
+import functools
+import itertools
 import logging
 import os
 import sys
 
 import boto3
-import psycopg2
-import pytz
 from botocore.config import Config
 from botocore.exceptions import ClientError
 from sqlalchemy import text
 from sqlmodel import Session, create_engine
 
 from config import get_settings
+from core.copy_loader import (batched, copy_stockprice, read_chunks, rows_after,
+                               stockprice_high_water_mark, stream_csv_rows)
+from core.data_version import bump_data_version
+from core.import_pipeline import ImportPipeline, StageTimer
+from core.ingest_manifest import load_manifest, record_object
+from scripts.refresh_materialized_view import CANDLE_VIEWS, refresh_candle_views
+from scripts.refresh_symbol_snapshot import refresh_symbol_snapshots
 
 _S3_RESOURCE = None  # Global, see _get_s3_resource()
 _S3_CLIENT = None  # Global, see _get_s3_client()
 DATAFEED_BUCKET_NAME = os.environ['DATAFEED_BUCKET_NAME']
 AWS_ACCESS_KEY_ID = os.environ['AWS_ACCESS_KEY_ID']
 AWS_SECRET_ACCESS_KEY = os.environ['AWS_SECRET_ACCESS_KEY']
+# Point the import at MinIO or moto instead of AWS, e.g. http://localhost:9000.
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')
 
 db_engine = create_engine(get_settings().database_psycopg_url, echo=True)
 session = Session(db_engine)
@@ -40,6 +48,7 @@ def get_s3_client():
         _S3_CLIENT = boto3.client(
             's3',
             config=Config(signature_version='s3v4'),
+            endpoint_url=S3_ENDPOINT_URL,
             aws_access_key_id=AWS_ACCESS_KEY_ID,
             aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
         )
@@ -47,10 +56,16 @@ def get_s3_client():
     return _S3_CLIENT
 
 
-def import_price_data_from_s3():
-    delete_sql_insert = text("TRUNCATE TABLE stockprice;")
-    session.execute(delete_sql_insert)
-    session.commit()
+def import_price_data_from_s3(full: bool = False):
+    """Load the price files of every stock changed since they were loaded, every file when ``full``."""
+    if full:
+        delete_sql_insert = text("TRUNCATE TABLE stockprice;")
+        session.execute(delete_sql_insert)
+        bump_data_version(session, "stockprice")
+        session.commit()
+    # Time range of the bars this run inserted or changed, the views are refreshed over it.
+    earliest = latest = None
+    manifest = {} if full else load_manifest(session, DATAFEED_BUCKET_NAME)
 
     stocks = text("select symbol from stock where symbol is not null")
     results = session.exec(stocks)
@@ -60,165 +75,170 @@ def import_price_data_from_s3():
         logger.info(f"Start downloading income statement with Stock yearly: {symbol}")
         s3_client = get_s3_client()
         filename = f"{symbol}.csv"
+        # S3 answers 304 when the object still has the ETag it had when it was loaded.
+        conditions = {"IfNoneMatch": manifest[filename]} if filename in manifest else {}
         try:
-            response = s3_client.get_object(Bucket=DATAFEED_BUCKET_NAME, Key=filename)
+            response = s3_client.get_object(Bucket=DATAFEED_BUCKET_NAME, Key=filename, **conditions)
         except ClientError as e:
+            if e.response['Error']['Code'] in ("304", "NotModified"):
+                logger.info(f"Skip {filename}, unchanged since it was loaded.")
+                continue
             logger.error(f"{e.response['Error']}. Does not found {filename=}!")
             continue
-        csv_reader = csv.DictReader(response['Body'].read().decode('utf-8').splitlines())
-        data_list = []
-        for row in csv_reader:
-            data = (
-                row["Ticker"],
-                row['Date'],
-                float(row["Open"]),
-                float(row["High"]),
-                float(row["Low"]),
-                float(row["Close"]),
-                int(row["Volume"]) if row["Volume"] else 0,
-            ).__repr__()
-            logger.debug(f"{data=}")
-            data_list.append(data)
-
-        values = ",".join(tuple(data_list))
-        if values:
-            sql_insert = text(f"""
-            INSERT INTO
-            stockprice(symbol, "time", "open", high, low, "close", volume)
-            VALUES {values};
-            """)
-            logger.info(sql_insert)
-        logger.info(f"Inserted data in {filename=} | {len(data_list)=}")
-        session.execute(sql_insert)
+        csv_reader = stream_csv_rows(read_chunks(response['Body']))
+        # A changed file is merged whole, the vendor may have corrected bars already loaded. Only a file
+        # the manifest never recorded (loaded before it existed) is cut at the high-water mark.
+        if not full and filename not in manifest:
+            csv_reader = rows_after(csv_reader, lambda ticker: stockprice_high_water_mark(db_engine, ticker),
+                                    filename)
+        # COPY runs on the session's own connection, the rows and the version bump commit together.
+        copied = copy_stockprice(session.connection().connection.cursor(), csv_reader, filename)
+        bump_data_version(session, "stockprice", copied.symbols)
+        loaded_object = {"Key": filename, "ETag": response["ETag"], "LastModified": response["LastModified"]}
+        record_object(session, DATAFEED_BUCKET_NAME, loaded_object, copied.count)
         session.commit()
+        merged = copied.merged
+        if merged.earliest is not None and (earliest is None or merged.earliest < earliest):
+            earliest = merged.earliest
+        if merged.latest is not None and (latest is None or merged.latest > latest):
+            latest = merged.latest
 
     session.close()
+    if not full and earliest is None:
+        logger.info("No new or changed rows, the candle stick views are up to date.")
+        return
+
+    logger.info(f"Refresh candle stick views from {'the start' if full else earliest}.")
+    if full:
+        refresh_candle_views(CANDLE_VIEWS)
+    else:
+        refresh_candle_views(CANDLE_VIEWS, since=earliest, until=latest)
+
+    refresh_symbol_snapshots()
 
-    utc_now = datetime.datetime.now(pytz.utc)
-    logger.info(f"Refresh candle stick views.")
-    candle_sticks = [
-        "one_minute_candle",
-        "three_minutes_candle",
-        "five_minutes_candle",
-        "fifteen_minutes_candle",
-        "thirty_minutes_candle",
-        "forty_five_minutes_candle",
-        "one_hour_candle",
-        "two_hours_candle",
-        "four_hours_candle",
-        "one_day_candle",
-        "one_week_candle",
-        "one_month_candle",
-        "three_months_candle",
-        "six_months_candle",
-        "one_year_candle",
-    ]
-    conn = psycopg2.connect(database=os.environ["DB_NAME"],
-                            user=os.environ["DB_USER"],
-                            password=os.environ["DB_PASSWORD"],
-                            host=os.environ["DB_HOST"],
-                            port=os.environ["DB_PORT"],
-                            )
-    conn.autocommit = True
-    cursor = conn.cursor()
-    for candle in candle_sticks:
-        logger.info(f"Start refreshing candle {candle}")
-        cursor.execute(f"""CALL refresh_continuous_aggregate('{candle}', NULL,
-         '{utc_now.strftime('%Y-%m-%d')}');""")
-        logger.info(f"Finished refreshing candle {candle}")
-
-    cursor.close()
-    conn.close()
-
-
-def import_price_data_from_s3_v2():
-    delete_sql_insert = text("TRUNCATE TABLE stockprice;")
-    session.execute(delete_sql_insert)
-    session.commit()
 
+def list_price_files(s3_client):
+    """Every object of the price bucket (``Key``, ``ETag``, ``LastModified``...), page by page."""
     continue_token = None
-    s3_client = get_s3_client()
     while True:
         if continue_token is None:
             result = s3_client.list_objects_v2(Bucket=DATAFEED_BUCKET_NAME)
         else:
             result = s3_client.list_objects_v2(Bucket=DATAFEED_BUCKET_NAME, ContinuationToken=continue_token)
 
-        if "Contents" in result:
-            for key in result["Contents"]:
-                keyString = key["Key"]
-                logger.info(f"Start downloading income statement with Stock yearly: {keyString}")
-                try:
-                    response = s3_client.get_object(Bucket=DATAFEED_BUCKET_NAME, Key=keyString)
-                except ClientError as e:
-                    logger.error(f"{e.response['Error']}. Does not found {keyString=}!")
-                    continue
-                csv_reader = csv.DictReader(response['Body'].read().decode('utf-8').splitlines())
-                data_list = []
-                for row in csv_reader:
-                    data = (
-                        row["Ticker"],
-                        row['Date'],
-                        float(row["Open"]),
-                        float(row["High"]),
-                        float(row["Low"]),
-                        float(row["Close"]),
-                        int(row["Volume"]) if row["Volume"] else 0,
-                    ).__repr__()
-                    logger.debug(f"{data=}")
-                    data_list.append(data)
-
-                values = ",".join(tuple(data_list))
-                if values:
-                    sql_insert = text(f"""
-                    INSERT INTO
-                    stockprice(symbol, "time", "open", high, low, "close", volume)
-                    VALUES {values};
-                    """)
-                    logger.info(sql_insert)
-                logger.info(f"Inserted data in {keyString=} | {len(data_list)=}")
-                session.execute(sql_insert)
-                session.commit()
+        yield from result.get("Contents", [])
 
         if not "NextContinuationToken" in result:
             break
 
         continue_token = result["NextContinuationToken"]
 
+
+def changed_price_files(s3_objects, manifest: dict):
+    """The objects whose ETag differs from the one recorded in the manifest when they were loaded."""
+    skipped = 0
+    for s3_object in s3_objects:
+        if manifest.get(s3_object["Key"]) == s3_object["ETag"]:
+            skipped += 1
+            continue
+        yield s3_object
+    logger.info(f"Skipped {skipped} price files unchanged since they were loaded.")
+
+
+def fetch_price_file(s3_object: dict, full: bool, manifest: dict, timer: StageTimer):
+    """
+    Download and parse one price file on a fetch thread. Yields the object as it was read, then batches
+    of rows as the body streams in. Nothing is yielded when the object is gone. Unless ``full``, a file
+    the ``manifest`` never recorded is cut at the high-water mark of its symbols, a changed file is
+    merged whole.
+    """
+    key = s3_object["Key"]
+    with timer.stage("s3"):
+        try:
+            response = get_s3_client().get_object(Bucket=DATAFEED_BUCKET_NAME, Key=key)
+        except ClientError as e:
+            logger.error(f"{e.response['Error']}. Does not found {key=}!")
+            return
+    # The ETag recorded is the one of the body actually read, the listing may be older.
+    yield {"Key": key, "ETag": response["ETag"], "LastModified": response["LastModified"]}
+    # The "fetch" stage is s3 + parsing, the body is read lazily while the rows are parsed.
+    rows = stream_csv_rows(timer.iterate("s3", read_chunks(response['Body'])))
+    if not full and key not in manifest:
+        rows = rows_after(rows, lambda ticker: stockprice_high_water_mark(db_engine, ticker), key)
+    yield from batched(rows)
+
+
+def write_price_file(s3_object: dict, items):
+    """
+    COPY one price file on a writer thread while it is parsed, with its own connection. The rows, the
+    version bump and the manifest entry commit in one transaction: a file is loaded whole or not at all,
+    a run stopped half way never leaves a high-water mark above rows it did not load.
+    """
+    items = iter(items)
+    loaded_object = next(items)
+    with Session(db_engine) as writer_session:
+        copied = copy_stockprice(writer_session.connection().connection.cursor(),
+                                 itertools.chain.from_iterable(items), loaded_object["Key"])
+        bump_data_version(writer_session, "stockprice", copied.symbols)
+        record_object(writer_session, DATAFEED_BUCKET_NAME, loaded_object, copied.count)
+        writer_session.commit()
+    return copied
+
+
+def import_price_data_from_s3_v2(full: bool = False, fetch_workers: int = 8, writers: int = 1):
+    """
+    Load every price file of the bucket changed since it was loaded, every file when ``full``.
+    ``fetch_workers`` threads download and parse the files while ``writers`` threads COPY them.
+    """
+    if full:
+        delete_sql_insert = text("TRUNCATE TABLE stockprice;")
+        session.execute(delete_sql_insert)
+        bump_data_version(session, "stockprice")
+        session.commit()
+
+    # Objects loaded completely by an earlier run are skipped while their ETag is unchanged, a run
+    # stopped half way resumes with the objects it did not finish.
+    manifest = {} if full else load_manifest(session, DATAFEED_BUCKET_NAME)
+    timer = StageTimer()
+    pipeline = ImportPipeline(
+        fetch=functools.partial(fetch_price_file, full=full, manifest=manifest, timer=timer),
+        write=write_price_file,
+        fetch_workers=fetch_workers,
+        writers=writers,
+        queue_size=2,
+        timer=timer,
+    )
+    copied_files = pipeline.run(changed_price_files(list_price_files(get_s3_client()), manifest))
+    # Time range of the bars this run inserted or changed, the views are refreshed over it. A file merged
+    # again after a bar was appended only widens it by that bar.
+    merged = [copied.merged for copied in copied_files if copied.merged.earliest is not None]
+    earliest = min(rows.earliest for rows in merged) if merged else None
+    latest = max(rows.latest for rows in merged) if merged else None
+
     session.close()
+    if not full and earliest is None:
+        logger.info("No new or changed rows, the candle stick views are up to date.")
+        return
+
+    logger.info(f"Refresh candle stick views from {'the start' if full else earliest}.")
+    if full:
+        refresh_candle_views(CANDLE_VIEWS)
+    else:
+        refresh_candle_views(CANDLE_VIEWS, since=earliest, until=latest)
 
-    utc_now = datetime.datetime.now(pytz.utc)
-    logger.info(f"Refresh candle stick views.")
-    candle_sticks = [
-        "one_day_candle",
-        "one_week_candle",
-        "one_month_candle",
-        "three_months_candle",
-        "six_months_candle",
-        "one_year_candle",
-    ]
-    conn = psycopg2.connect(database=os.environ["DB_NAME"],
-                            user=os.environ["DB_USER"],
-                            password=os.environ["DB_PASSWORD"],
-                            host=os.environ["DB_HOST"],
-                            port=os.environ["DB_PORT"],
-                            )
-    conn.autocommit = True
-    cursor = conn.cursor()
-    for candle in candle_sticks:
-        logger.info(f"Start refreshing candle {candle}")
-        cursor.execute(f"""CALL refresh_continuous_aggregate('{candle}', NULL,
-         '{utc_now.strftime('%Y-%m-%d')}');""")
-        logger.info(f"Finished refreshing candle {candle}")
-
-    cursor.close()
-    conn.close()
+    refresh_symbol_snapshots()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import the stock price files from S3.")
+    parser.add_argument("--full", action="store_true",
+                        help="Truncate stockprice and reload every file instead of only the new rows.")
+    parser.add_argument("--fetch-workers", type=int, default=8, help="Threads downloading and parsing the files.")
+    parser.add_argument("--writers", type=int, default=1, help="Threads loading the parsed files into Postgres.")
+    args = parser.parse_args()
     logger.info("Importing stock price data...")
 
-    # import_price_data_from_s3()
-    import_price_data_from_s3_v2()
+    # import_price_data_from_s3(full=args.full)
+    import_price_data_from_s3_v2(full=args.full, fetch_workers=args.fetch_workers, writers=args.writers)
 
     logger.info("Finished importing stock price data...")
@@ -1,7 +1,9 @@
+import argparse
 import datetime
 import logging
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 import psycopg2
 import pytz
@@ -9,39 +11,46 @@ from sqlalchemy import create_engine
 from sqlmodel import Session
 
 from config import get_settings
+from core.candle_cache import invalidate_view
+from core.candle_query import VIEW_INTERVALS
+from core.data_version import bump_data_version, data_versions
+from scripts.refresh_symbol_snapshot import refresh_symbol_snapshots
 
 db_engine = create_engine(get_settings().database_psycopg_url, echo=True)
-session = Session(db_engine)
 
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG if get_settings().debug_logs else logging.INFO)
 logger = logging.getLogger(__name__)
 
+CANDLE_VIEWS = [
+    "one_minute_candle",
+    "three_minutes_candle",
+    "five_minutes_candle",
+    "fifteen_minutes_candle",
+    "thirty_minutes_candle",
+    "forty_five_minutes_candle",
+    "one_hour_candle",
+    "two_hours_candle",
+    "four_hours_candle",
+    "one_day_candle",
+    "one_week_candle",
+    "one_month_candle",
+    "three_months_candle",
+    "six_months_candle",
+    "one_year_candle",
+]
 
-# Add scheduled tasks, refer to the official documentation: https://apscheduler.readthedocs.io/en/master/
-# use when you want to run the job periodically at certain time(s) of day
-def refresh_materialized_view():
-    """
-    Cron job to download data from DNSE on 02:00 every day following Asia/Ho_Chi_Minh timezone will be 19:00 UTC
-    """
-    utc_now = datetime.datetime.now(pytz.utc)
-    logger.info(f"Refresh candle stick views for data from {utc_now=}.")
-    candle_sticks = [
-        "one_minute_candle",
-        "three_minutes_candle",
-        "five_minutes_candle",
-        "fifteen_minutes_candle",
-        "thirty_minutes_candle",
-        "forty_five_minutes_candle",
-        "one_hour_candle",
-        "two_hours_candle",
-        "four_hours_candle",
-        "one_day_candle",
-        "one_week_candle",
-        "one_month_candle",
-        "three_months_candle",
-        "six_months_candle",
-        "one_year_candle",
-    ]
+# Hierarchical continuous aggregates (see create_materialized_view_candlestick.py): a view is refreshed
+# after the one it is aggregated from, every other view reads stockprice and can be refreshed in parallel.
+VIEW_SOURCES = {
+    "fifteen_minutes_candle": "one_minute_candle",
+    "one_hour_candle": "fifteen_minutes_candle",
+}
+
+# Window of the scheduled refresh, the importers refresh the range they loaded themselves.
+SCHEDULED_LOOKBACK = datetime.timedelta(days=3)
+
+
+def connect():
     conn = psycopg2.connect(database=os.environ["DB_NAME"],
                             user=os.environ["DB_USER"],
                             password=os.environ["DB_PASSWORD"],
@@ -49,18 +58,121 @@ def refresh_materialized_view():
                             port=os.environ["DB_PORT"],
                             )
     conn.autocommit = True
+    return conn
+
+
+def existing_continuous_aggregates(cursor) -> set:
+    """Names of the continuous aggregates which actually exist, refreshing any other view fails."""
+    cursor.execute("SELECT view_name FROM timescaledb_information.continuous_aggregates;")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def utc_literal(moment) -> str:
+    """SQL timestamptz of a ``datetime`` or ``numpy.datetime64``, naive values being UTC."""
+    if isinstance(moment, datetime.datetime) and moment.tzinfo is not None:
+        moment = moment.astimezone(pytz.utc).replace(tzinfo=None)
+    return f"TIMESTAMPTZ '{moment}+00'"
+
+
+def refresh_window(view: str, since=None, until=None) -> tuple:
+    """
+    SQL bounds of a refresh of ``view`` covering the rows from ``since`` to ``until``, widened to whole
+    buckets: buckets only partly inside the window would not be refreshed, and TimescaleDB rejects a
+    window shorter than one bucket. NULL refreshes the whole history, without ``until`` the window ends
+    after the bucket in progress so it is materialized too.
+    """
+    interval = VIEW_INTERVALS.get(view)
+    if interval is None:
+        return "NULL", f"'{datetime.datetime.now(pytz.utc).strftime('%Y-%m-%d')}'"
+    start = "NULL" if since is None else f"time_bucket(INTERVAL '{interval}', {utc_literal(since)})"
+    moment = "now()" if until is None else utc_literal(until)
+    end = f"time_bucket(INTERVAL '{interval}', {moment}) + INTERVAL '{interval}'"
+    return start, end
+
+
+def refresh_chains(views: list) -> list:
+    """Split ``views`` into chains: the views of a chain are refreshed in order, chains are independent."""
+    chains = []
+    chain_of = {}
+    for view in sorted(views, key=CANDLE_VIEWS.index):
+        chain = chain_of.get(VIEW_SOURCES.get(view))
+        if chain is None:
+            chain = []
+            chains.append(chain)
+        chain.append(view)
+        chain_of[view] = chain
+    return chains
+
+
+def refresh_chain(chain: list, since=None, until=None) -> list:
+    """Refresh the views of one chain on a connection of its own."""
+    conn = connect()
     cursor = conn.cursor()
-    for candle in candle_sticks:
-        print(f"""CALL refresh_continuous_aggregate('{candle}', NULL,
-         '{utc_now.strftime('%Y-%m-%d')}');""")
-        cursor.execute(f"""CALL refresh_continuous_aggregate('{candle}', NULL,
-         '{utc_now.strftime('%Y-%m-%d')}');""")
+    try:
+        for candle in chain:
+            start, end = refresh_window(candle, since, until)
+            logger.info(f"Start refreshing candle {candle} from {start} to {end}")
+            cursor.execute(f"CALL refresh_continuous_aggregate('{candle}', {start}, {end});")
+            logger.info(f"Finished refreshing candle {candle}")
+    finally:
+        cursor.close()
+        conn.close()
+    return chain
+
 
+def refresh_candle_views(views: list = CANDLE_VIEWS, since=None, until=None, workers: int = 4) -> list:
+    """
+    Refresh the continuous aggregates among ``views`` over the rows written from ``since`` to ``until``
+    (UTC), the whole history when ``since`` is None. Views which do not exist are skipped, independent
+    views are refreshed in parallel. The refreshed views get a new data version, returns them.
+    """
+    conn = connect()
+    cursor = conn.cursor()
+    existing_views = existing_continuous_aggregates(cursor)
     cursor.close()
     conn.close()
 
+    for candle in views:
+        if candle not in existing_views:
+            logger.info(f"Skip refreshing {candle}, the continuous aggregate does not exist.")
+    chains = refresh_chains([candle for candle in views if candle in existing_views])
+    refreshed = []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(chains)))) as executor:
+        for chain in executor.map(lambda chain: refresh_chain(chain, since, until), chains):
+            refreshed.extend(chain)
+
+    with Session(db_engine) as version_session:
+        for candle in refreshed:
+            invalidate_view(candle)
+            bump_data_version(version_session, candle)
+        version_session.commit()
+    return refreshed
+
+
+# Add scheduled tasks, refer to the official documentation: https://apscheduler.readthedocs.io/en/master/
+# use when you want to run the job periodically at certain time(s) of day
+def refresh_materialized_view(since=None, until=None, full: bool = False):
+    """
+    Cron job to download data from DNSE on 02:00 every day following Asia/Ho_Chi_Minh timezone will be 19:00 UTC
+    """
+    utc_now = datetime.datetime.now(pytz.utc)
+    if not full and since is None:
+        since = utc_now - SCHEDULED_LOOKBACK
+    logger.info(f"Refresh candle stick views for data from {'the start' if full else since} at {utc_now=}.")
+    refresh_candle_views(CANDLE_VIEWS, None if full else since, None if full else until)
+
+    refresh_symbol_snapshots()
+    data_versions.expire()
+
 
 if __name__ == "__main__":
-    refresh_materialized_view()
+    parser = argparse.ArgumentParser(description="Refresh the candle stick continuous aggregates.")
+    parser.add_argument("--since", type=datetime.datetime.fromisoformat,
+                        help=f"Start of the window (UTC), {SCHEDULED_LOOKBACK.days} days ago by default.")
+    parser.add_argument("--until", type=datetime.datetime.fromisoformat, help="End of the window (UTC).")
+    parser.add_argument("--full", action="store_true", help="Refresh the whole history.")
+    args = parser.parse_args()
+
+    refresh_materialized_view(args.since, args.until, args.full)
 
     logger.info("Finished refreshing materialized view price data...")
@@ -0,0 +1,98 @@
+import argparse
+import logging
+import sys
+
+from sqlalchemy import text
+from sqlmodel import Session, create_engine
+
+from config import get_settings
+from core.data_version import bump_data_version
+
+db_engine = create_engine(get_settings().database_psycopg_url, echo=True)
+
+logging.basicConfig(stream=sys.stdout, level=logging.DEBUG if get_settings().debug_logs else logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Symbols whose "stockprice" version moved since their snapshot was computed, with the version to store.
+PENDING_SYMBOLS_SQL = text("""
+    SELECT s.symbol, COALESCE(every.version, 0) + COALESCE(own.version, 0)
+    FROM (SELECT DISTINCT symbol FROM stock WHERE symbol IS NOT NULL) s
+    LEFT JOIN dataversion every ON every.scope = 'stockprice' AND every.symbol = '*'
+    LEFT JOIN dataversion own ON own.scope = 'stockprice' AND own.symbol = s.symbol
+    LEFT JOIN symbol_snapshot snapshot ON snapshot.symbol = s.symbol
+    WHERE :full OR snapshot.source_version IS DISTINCT FROM COALESCE(every.version, 0) + COALESCE(own.version, 0);
+""")
+
+UPSERT_SNAPSHOT_SQL = text("""
+    INSERT INTO symbol_snapshot(symbol, last_time, last_close, previous_close, change, change_percent,
+                                high_52w, low_52w, average_volume, source_version)
+    SELECT s.symbol, last.ts, last.close, previous.close,
+           last.close - previous.close,
+           (last.close - previous.close) / NULLIF(previous.close, 0) * 100,
+           year_range.high, year_range.low, average.volume, s.source_version
+    FROM unnest(CAST(:symbols AS TEXT[]), CAST(:versions AS BIGINT[])) AS s(symbol, source_version)
+    CROSS JOIN LATERAL (
+        SELECT ts, close FROM one_day_candle c
+        WHERE c.symbol = s.symbol
+        ORDER BY c.ts DESC
+        LIMIT 1
+    ) last
+    LEFT JOIN LATERAL (
+        SELECT close FROM one_day_candle c
+        WHERE c.symbol = s.symbol AND c.ts < last.ts
+        ORDER BY c.ts DESC
+        LIMIT 1
+    ) previous ON true
+    CROSS JOIN LATERAL (
+        SELECT max(high) AS high, min(low) AS low FROM one_day_candle c
+        WHERE c.symbol = s.symbol AND c.ts > last.ts - INTERVAL '52 weeks'
+    ) year_range
+    CROSS JOIN LATERAL (
+        SELECT COALESCE(avg(volume), 0) AS volume FROM (
+            SELECT volume FROM one_day_candle c
+            WHERE c.symbol = s.symbol
+            ORDER BY c.ts DESC
+            LIMIT 20
+        ) sessions
+    ) average
+    ON CONFLICT (symbol) DO UPDATE SET
+        last_time = EXCLUDED.last_time,
+        last_close = EXCLUDED.last_close,
+        previous_close = EXCLUDED.previous_close,
+        change = EXCLUDED.change,
+        change_percent = EXCLUDED.change_percent,
+        high_52w = EXCLUDED.high_52w,
+        low_52w = EXCLUDED.low_52w,
+        average_volume = EXCLUDED.average_volume,
+        source_version = EXCLUDED.source_version,
+        updated_at = current_timestamp(0);
+""")
+
+
+def refresh_symbol_snapshots(full: bool = False):
+    """
+    Recompute ``symbol_snapshot`` from ``one_day_candle`` for the symbols whose prices changed since
+    the last run, every symbol with ``full``. Run it after the daily candles have been refreshed.
+    """
+    with Session(db_engine) as session:
+        pending = session.execute(PENDING_SYMBOLS_SQL, params={"full": full}).all()
+        logger.info(f"Refreshing the snapshot of {len(pending)} symbols.")
+        if not pending:
+            return
+        symbols = [symbol for symbol, _ in pending]
+        session.execute(
+            UPSERT_SNAPSHOT_SQL,
+            params={"symbols": symbols, "versions": [version for _, version in pending]},
+        )
+        bump_data_version(session, "symbol_snapshot", symbols)
+        session.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute the per-symbol market snapshot.")
+    parser.add_argument("--full", action="store_true", help="Recompute every symbol, not only the changed ones.")
+    args = parser.parse_args()
+
+    refresh_symbol_snapshots(full=args.full)
+
+    logger.info("Finished refreshing symbol snapshots...")
@@ -0,0 +1,6 @@
+import os
+
+# config.Settings needs these to import the scripts, no test connects to the databases.
+for name in ("DB_HOST", "DB_USER", "DB_PASSWORD", "POSTGRES_HOST", "POSTGRES_USER", "POSTGRES_PASSWORD",
+             "MONGO_DB_HOST", "MONGO_DB_USER", "MONGO_DB_PASSWORD", "PROJECT_NAME", "VERSION", "DESCRIPTION"):
+    os.environ.setdefault(name, "test")
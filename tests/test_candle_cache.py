@@ -0,0 +1,107 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from core.candle_cache import DAY, CandleCache, LRUStorage, candle_cache
+from core.candles import CandleFrame
+from core.data_version import DataVersions
+
+VIEW = "one_day_candle"
+# One bar a day, the bar of day 999 is still open.
+NOW = 1000 * DAY
+BARS = CandleFrame(*(np.arange(1000) * DAY,) + (np.arange(1000, dtype=np.float64),) * 4 + (np.ones(1000),))
+
+
+class FakeFetch:
+    """Serves :data:`BARS` and records the days read, both ends included."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, start, end):
+        self.calls.append((start // DAY, end // DAY))
+        return BARS.between(start, end)
+
+
+def get_frame(cache, start, end, fetch):
+    return asyncio.run(cache.get_frame("AAA", VIEW, start * DAY, end * DAY, fetch, now=NOW))
+
+
+@pytest.fixture
+def cache():
+    return CandleCache(LRUStorage())
+
+
+def test_a_window_over_several_blocks_is_read_once(cache):
+    fetch = FakeFetch()
+
+    first = get_frame(cache, 10, 400, fetch)
+    second = get_frame(cache, 10, 400, fetch)
+
+    assert first.t.tolist() == second.t.tolist() == (np.arange(10, 401) * DAY).tolist()
+    # Blocks 0 to 3 in one range query, nothing read the second time.
+    assert fetch.calls == [(0, 511)]
+
+
+def test_only_the_missing_blocks_are_read(cache):
+    fetch = FakeFetch()
+    get_frame(cache, 200, 200, fetch)
+
+    frame = get_frame(cache, 10, 400, fetch)
+
+    assert frame.c.tolist() == list(range(10, 401))
+    assert fetch.calls == [(128, 255), (0, 127), (256, 511)]
+
+
+def test_a_partial_last_block_is_cached_whole(cache):
+    fetch = FakeFetch()
+    get_frame(cache, 10, 130, fetch)
+
+    frame = get_frame(cache, 131, 255, fetch)
+
+    assert frame.c.tolist() == list(range(131, 256))
+    assert fetch.calls == [(0, 255)]
+
+
+def test_the_open_block_is_always_read(cache):
+    fetch = FakeFetch()
+
+    first = get_frame(cache, 850, 999, fetch)
+    second = get_frame(cache, 850, 999, fetch)
+
+    assert first.c.tolist() == second.c.tolist() == list(range(850, 1000))
+    # Block 768 is closed and cached, block 896 holds the open bar and only its requested part is read.
+    assert fetch.calls == [(768, 895), (896, 999), (896, 999)]
+
+
+class FakeSession:
+    """Answers the dataversion query with ``rows``."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def execute(self, query):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+def test_a_version_bump_drops_the_cached_blocks_of_the_symbol():
+    candle_cache.clear()
+    versions = DataVersions(ttl=0)
+    asyncio.run(versions.load(FakeSession([(VIEW, "AAA", 1), (VIEW, "BBB", 1)])))
+    fetches = {symbol: FakeFetch() for symbol in ("AAA", "BBB")}
+
+    def read_all():
+        for symbol, fetch in fetches.items():
+            asyncio.run(candle_cache.get_frame(symbol, VIEW, 0, 100 * DAY, fetch, now=NOW))
+
+    read_all()
+    asyncio.run(versions.load(FakeSession([(VIEW, "AAA", 2), (VIEW, "BBB", 1)])))
+    read_all()
+
+    assert fetches["AAA"].calls == [(0, 127), (0, 127)]
+    assert fetches["BBB"].calls == [(0, 127)]
+    candle_cache.clear()
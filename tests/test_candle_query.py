@@ -0,0 +1,72 @@
+import pytest
+
+from core.candle_query import (DAY, HOUR, MINUTE, RESOLUTIONS, STOCK_PRICE_TABLE, VIEW_INTERVALS, align_start,
+                               plan_query)
+
+ALL_VIEWS = set(VIEW_INTERVALS)
+# Tuesday 2023-11-14 09:17:23 UTC, on no bucket boundary.
+END = 19_675 * DAY + 9 * HOUR + 17 * MINUTE + 23
+
+
+@pytest.mark.parametrize("name", [name for name, resolution in RESOLUTIONS.items() if resolution.view])
+def test_each_resolution_reads_its_own_view(name):
+    plan = plan_query(RESOLUTIONS[name], END - 30 * DAY, END, ALL_VIEWS)
+
+    assert (plan.relation, plan.rebucket, plan.is_view) == (RESOLUTIONS[name].view, False, True)
+
+
+@pytest.mark.parametrize("name, span, views, relation", [
+    # Daily and coarser views are read even over a short range.
+    ("1D", HOUR, ALL_VIEWS, "one_day_candle"),
+    ("1Y", HOUR, ALL_VIEWS, "one_year_candle"),
+    # Short intraday ranges bucket the raw rows, always fresh.
+    ("1", HOUR, ALL_VIEWS, STOCK_PRICE_TABLE),
+    ("1H", DAY, ALL_VIEWS, STOCK_PRICE_TABLE),
+    ("2H", DAY, ALL_VIEWS, STOCK_PRICE_TABLE),
+    # Intraday bars without a view re-bucket the coarsest view dividing them.
+    ("3", 30 * DAY, ALL_VIEWS, "one_minute_candle"),
+    ("30", 30 * DAY, ALL_VIEWS, "fifteen_minutes_candle"),
+    ("45", 30 * DAY, ALL_VIEWS, "fifteen_minutes_candle"),
+    ("4H", 30 * DAY, ALL_VIEWS, "one_hour_candle"),
+    # A view missing from the database falls back to the next source.
+    ("1D", 30 * DAY, ALL_VIEWS - {"one_day_candle"}, "one_hour_candle"),
+    ("4H", 30 * DAY, ALL_VIEWS - {"one_hour_candle"}, "fifteen_minutes_candle"),
+    ("1W", DAY, ALL_VIEWS - {"one_week_candle"}, STOCK_PRICE_TABLE),
+    ("1D", 30 * DAY, set(), STOCK_PRICE_TABLE),
+    ("1", 30 * DAY, set(), STOCK_PRICE_TABLE),
+])
+def test_plan_picks_the_cheapest_source(name, span, views, relation):
+    plan = plan_query(RESOLUTIONS[name], END - span, END, views)
+
+    assert plan.relation == relation
+    assert plan.rebucket == (relation != RESOLUTIONS[name].view)
+
+
+def test_rows_are_estimated_from_the_source_spacing():
+    assert plan_query(RESOLUTIONS["4H"], END - 30 * DAY, END, ALL_VIEWS).estimated_rows == 30 * 24 + 1
+    assert plan_query(RESOLUTIONS["1H"], END - DAY, END, ALL_VIEWS).estimated_rows == 24 * 60 + 1
+
+
+@pytest.mark.parametrize("name, aligned", [
+    ("1", END - 23),
+    ("15", END - 2 * MINUTE - 23),
+    ("1H", END - 17 * MINUTE - 23),
+    ("4H", END - HOUR - 17 * MINUTE - 23),
+    ("1D", END),
+    ("1M", END),
+])
+def test_align_start_moves_back_to_the_bucket(name, aligned):
+    assert align_start(RESOLUTIONS[name], END) == aligned
+
+
+@pytest.mark.parametrize("name", list(RESOLUTIONS))
+@pytest.mark.parametrize("countback", [1, 7, 300])
+def test_countback_windows_start_on_a_complete_bar(name, countback):
+    resolution = RESOLUTIONS[name]
+    wanted = END - countback * resolution.seconds
+
+    start = align_start(resolution, wanted)
+
+    assert start <= wanted and wanted - start < resolution.seconds
+    if resolution.seconds < DAY:
+        assert start % resolution.seconds == 0
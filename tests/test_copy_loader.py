@@ -0,0 +1,118 @@
+import functools
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from core.copy_loader import (COPY_HEADER, COPY_TRAILER, CountingRows, MergedRows, copy_chunks, copy_stockprice,
+                              csv_columns, rows_after, stream_csv_rows)
+from core.price_validation import Quarantine
+
+HEADER = b"Ticker,Date,Open,High,Low,Close,Volume\n"
+
+GOOD_ROWS = (
+    b"AAA,2024-01-02,10.0,10.5,9.8,10.2,1000\n",
+    b"AAA,2024-01-03,10.2,10.6,10.0,10.4,1200\n",
+    b"BBB,2024-01-02,20.0,20.4,19.8,20.1,\n",
+)
+
+BAD_ROWS = (
+    b"AAA,2024-01-04,,10.6,10.0,10.4,1200\n"
+    b"AAA,2024-01-05,10.2,abc,10.0,10.4,1200\n"
+    b"BBB,,20.0,20.4,19.8,20.1,500\n"
+    b"BBB,2024-13-45,20.0,20.4,19.8,20.1,500\n"
+    b"BBB,2024-01-03,20.0,20.4,19.8,20.1,many\n"
+)
+
+
+def rows_of(*chunks):
+    return list(stream_csv_rows([HEADER, *chunks]))
+
+
+class FakeCursor:
+    """Records the COPY payload and answers the merge with ``merged``, a row of (count, min, max)."""
+
+    def __init__(self, merged=(0, None, None)):
+        self.merged = merged
+        self.statements = []
+        self.payload = b""
+        self.quarantined = []
+        self.rowcount = -1
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+
+    def copy_expert(self, sql, stream, size=8192):
+        self.payload = stream.read()
+
+    def fetchone(self):
+        return self.merged
+
+    def executemany(self, sql, rows):
+        self.quarantined.extend(rows)
+
+
+def test_csv_columns_turn_bad_fields_into_nan_and_nat():
+    columns = csv_columns(rows_of(BAD_ROWS))
+
+    assert np.isnan(columns["opens"][0])
+    assert np.isnan(columns["highs"][1])
+    assert np.isnat(columns["times"][2]) and np.isnat(columns["times"][3])
+    assert columns["volumes"][4] == -1
+
+
+def test_bad_rows_are_quarantined_and_good_rows_loaded():
+    quarantine = Quarantine()
+    screen = functools.partial(quarantine.screen, "prices.csv")
+
+    mixed = b"".join(copy_chunks(rows_of(GOOD_ROWS[0], BAD_ROWS, *GOOD_ROWS[1:]), screen=screen))
+
+    assert mixed == b"".join(copy_chunks(rows_of(*GOOD_ROWS)))
+    assert [row[-1] for row in quarantine.rows] == ["bad_price", "bad_price", "bad_time", "bad_time", "bad_price"]
+    assert quarantine.counts == {"prices.csv": {"bad_price": 3, "bad_time": 2}}
+
+
+def test_counting_rows_skip_bad_dates():
+    counted = CountingRows(rows_of(BAD_ROWS, *GOOD_ROWS))
+
+    assert len(list(counted)) == 8
+    assert counted.symbols == {"AAA", "BBB"}
+    assert counted.earliest == np.datetime64("2024-01-02", "us")
+    assert counted.latest == np.datetime64("2024-01-05", "us")
+
+
+def test_rows_after_logs_the_rows_skipped(caplog):
+    marks = {"AAA": np.datetime64("2024-01-02", "us"), "BBB": None}
+
+    with caplog.at_level("INFO", logger="core.copy_loader"):
+        kept = list(rows_after(rows_of(*GOOD_ROWS), marks.get, "prices.csv"))
+
+    assert [(row["Ticker"], row["Date"]) for row in kept] == [("AAA", "2024-01-03"), ("BBB", "2024-01-02")]
+    assert "Skipped 1 rows of prices.csv" in caplog.text
+
+
+def test_copy_stockprice_reports_the_range_the_merge_wrote():
+    ict = timezone(timedelta(hours=7))
+    cursor = FakeCursor((1, datetime(2024, 1, 3, 7, tzinfo=ict), datetime(2024, 1, 3, 7, tzinfo=ict)))
+
+    copied = copy_stockprice(cursor, rows_of(*GOOD_ROWS), "prices.csv")
+
+    assert cursor.payload.startswith(COPY_HEADER) and cursor.payload.endswith(COPY_TRAILER)
+    assert (copied.count, copied.earliest) == (3, np.datetime64("2024-01-02", "us"))
+    assert copied.merged == MergedRows(1, np.datetime64("2024-01-03", "us"), np.datetime64("2024-01-03", "us"))
+
+
+def test_copy_stockprice_without_changes_has_no_range():
+    copied = copy_stockprice(FakeCursor(), rows_of(*GOOD_ROWS), "prices.csv")
+
+    assert copied.merged == MergedRows(0)
+
+
+def test_chunked_screening_matches_the_whole_file():
+    rows = rows_of(GOOD_ROWS[0], BAD_ROWS, *GOOD_ROWS[1:])
+    whole, chunked = Quarantine(), Quarantine()
+
+    payload = b"".join(copy_chunks(rows, screen=functools.partial(whole.screen, "prices.csv")))
+    chunked_payload = b"".join(copy_chunks(rows, chunk_rows=1, screen=functools.partial(chunked.screen, "prices.csv")))
+
+    assert chunked_payload == payload
+    assert [(row[2], row[-1]) for row in chunked.rows] == [(row[2], row[-1]) for row in whole.rows]
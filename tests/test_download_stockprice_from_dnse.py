@@ -0,0 +1,73 @@
+import asyncio
+
+import httpx
+import pytest
+
+from core.rate_limit import TokenBucket
+from scripts import download_stockprice_from_dnse as dnse
+
+BARS = {"t": [1704153600, 1704240000], "o": [10.0, 10.2], "h": [10.5, 10.6], "l": [9.8, 10.0],
+        "c": [10.2, 10.4], "v": [1000, 1200]}
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    async def sleep(seconds):
+        pass
+
+    monkeypatch.setattr(dnse.asyncio, "sleep", sleep)
+
+
+def fetch_bars(answers):
+    """Run fetch_bars against a DNSE answering ``answers`` in turn, an exception is raised by the transport."""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        answer = answers[len(requests) - 1]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    async def run():
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(transport=transport, base_url=dnse.DNSE_BASE_URL) as client:
+            return await dnse.fetch_bars(client, TokenBucket(1000), "AAA", 0, 1)
+
+    return asyncio.run(run()), requests
+
+
+def test_throttling_and_server_errors_are_retried():
+    bars, requests = fetch_bars([httpx.Response(429), httpx.ConnectError("reset"), httpx.Response(200, json=BARS)])
+
+    assert bars == BARS
+    assert len(requests) == 3
+    assert requests[0].url.params["symbol"] == "AAA" and requests[0].url.params["resolution"] == "1D"
+
+
+def test_gives_up_after_max_attempts():
+    bars, requests = fetch_bars([httpx.Response(503)] * dnse.MAX_ATTEMPTS)
+
+    assert bars is None
+    assert len(requests) == dnse.MAX_ATTEMPTS
+
+
+@pytest.mark.parametrize("answer", [
+    httpx.Response(404, text="Not found"),
+    httpx.Response(200, text="<html>maintenance</html>"),
+    httpx.Response(200, json={"t": []}),
+])
+def test_a_symbol_without_bars_is_skipped_at_once(answer):
+    bars, requests = fetch_bars([answer])
+
+    assert bars is None
+    assert len(requests) == 1
+
+
+def test_a_missing_volume_is_no_trade():
+    batch = dnse.PriceBatch()
+
+    batch.add("AAA", {**BARS, "v": [None, 1200]})
+
+    assert batch.rows == 2
+    assert not batch.quarantine.rows
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from core.downsampling import lttb_indices
+
+RANDOM = np.random.default_rng(7)
+
+
+def series(n):
+    x = np.arange(n, dtype=np.int64) * 86400
+    return x, 100 + np.cumsum(RANDOM.normal(size=n))
+
+
+@pytest.mark.parametrize("n, threshold", [(10, 3), (100, 7), (1000, 100), (1001, 999), (5000, 333)])
+def test_the_output_has_threshold_points_with_both_ends(n, threshold):
+    indices = lttb_indices(*series(n), threshold)
+
+    assert indices.shape[0] == threshold
+    assert indices[0] == 0 and indices[-1] == n - 1
+    assert (np.diff(indices) > 0).all()
+
+
+@pytest.mark.parametrize("n, threshold", [(10, 10), (10, 50), (10, 2), (10, 0), (1, 3), (0, 3)])
+def test_the_series_is_unchanged_at_or_above_the_threshold(n, threshold):
+    assert lttb_indices(*series(n), threshold).tolist() == list(range(n))
+
+
+def test_a_spike_is_kept():
+    x, y = np.arange(100), np.zeros(100)
+    y[37] = 50.0
+
+    assert 37 in lttb_indices(x, y, 10).tolist()
@@ -0,0 +1,114 @@
+import threading
+import time
+
+import pytest
+
+from core.import_pipeline import FetchFailed, ImportPipeline
+
+KEYS = ["a.csv", "b.csv", "c.csv", "d.csv"]
+
+
+def items_of(key, count=3):
+    return [f"{key}:{index}" for index in range(count)]
+
+
+def fetch(key):
+    yield from items_of(key)
+
+
+class Recorder:
+    """A ``write`` which takes every item of an object before recording it, like a committed transaction."""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.calls = []
+        self.recorded = []
+        self.failed_fetches = []
+
+    def __call__(self, key, items):
+        self.calls.append(key)
+        try:
+            items = list(items)
+        except FetchFailed:
+            self.failed_fetches.append(key)
+            raise
+        if key == self.fail_on:
+            raise RuntimeError(f"Could not write {key}")
+        self.recorded.append(key)
+        return key, items
+
+
+def test_each_object_is_written_whole_in_one_call():
+    write = Recorder()
+
+    results = ImportPipeline(fetch, write, fetch_workers=4, writers=2, queue_size=1).run(KEYS)
+
+    assert sorted(results) == [(key, items_of(key)) for key in KEYS]
+    assert sorted(write.calls) == KEYS
+
+
+def test_a_fetch_failing_mid_object_is_not_recorded():
+    def failing_fetch(key):
+        yield f"{key}:0"
+        if key == "b.csv":
+            raise OSError("connection reset")
+        yield f"{key}:1"
+
+    write = Recorder()
+
+    results = ImportPipeline(failing_fetch, write, fetch_workers=1).run(KEYS)
+
+    assert [key for key, _ in results] == ["a.csv", "c.csv", "d.csv"]
+    assert write.failed_fetches == ["b.csv"]
+    assert write.recorded == ["a.csv", "c.csv", "d.csv"]
+
+
+def test_a_fetch_failing_before_its_first_item_never_reaches_a_writer():
+    def failing_fetch(key):
+        if key == "b.csv":
+            raise OSError("access denied")
+        yield from items_of(key)
+
+    write = Recorder()
+
+    ImportPipeline(failing_fetch, write, fetch_workers=1).run(KEYS)
+
+    assert write.calls == ["a.csv", "c.csv", "d.csv"]
+
+
+def test_a_writer_error_skips_the_remaining_objects_and_is_raised():
+    write = Recorder(fail_on="b.csv")
+
+    with pytest.raises(RuntimeError, match="b.csv"):
+        ImportPipeline(fetch, write, fetch_workers=1, writers=1, queue_size=1).run(KEYS)
+
+    assert write.recorded == ["a.csv"]
+    assert write.calls == ["a.csv", "b.csv"]
+
+
+def test_a_slow_writer_holds_the_fetchers_back():
+    produced = []
+    release = threading.Event()
+
+    def counting_fetch(key):
+        for item in items_of(key, count=20):
+            produced.append(item)
+            yield item
+
+    def blocked_write(key, items):
+        release.wait(5)
+        return key, list(items)
+
+    pipeline = ImportPipeline(counting_fetch, blocked_write, fetch_workers=2, writers=1, queue_size=2)
+    runner = threading.Thread(target=pipeline.run, args=(["a.csv", "b.csv"],))
+    runner.start()
+    time.sleep(0.2)
+    # The writer holds a.csv: two items wait in its queue and a third is blocked on it. b.csv waits for
+    # the writer with two items queued and a third blocked as well.
+    held_back = len(produced)
+    release.set()
+    runner.join(5)
+
+    assert not runner.is_alive()
+    assert held_back <= 2 * (2 + 1)
+    assert len(produced) == 40
@@ -0,0 +1,40 @@
+import pytest
+
+from core.indicators import MAX_PERIOD, InvalidIndicator, parse_indicators
+
+
+@pytest.mark.parametrize("requested", ["sma:nan", "ema:inf", "rsi:-inf", "bb:20:nan", "bb:20:inf", "macd:12:nan:9"])
+def test_non_finite_parameters_are_rejected(requested):
+    with pytest.raises(InvalidIndicator):
+        parse_indicators(requested)
+
+
+@pytest.mark.parametrize("requested", [f"sma:{MAX_PERIOD + 1}", "sma:100000000", f"macd:12:{MAX_PERIOD + 1}:9",
+                                       f"bb:{MAX_PERIOD + 1}:2"])
+def test_periods_are_capped(requested):
+    with pytest.raises(InvalidIndicator):
+        parse_indicators(requested)
+
+
+def test_longest_period_is_accepted():
+    (spec,) = parse_indicators(f"sma:{MAX_PERIOD}")
+    assert spec.params == (MAX_PERIOD,)
+    assert spec.warmup == MAX_PERIOD - 1
+
+
+@pytest.mark.parametrize("requested", ["sma:0", "ema:2.5", "rsi:-3", "bb:0.5:2"])
+def test_bar_counts_are_positive_integers(requested):
+    with pytest.raises(InvalidIndicator):
+        parse_indicators(requested)
+
+
+@pytest.mark.parametrize("width", ["0.5", "1.5", "2"])
+def test_bollinger_width_can_be_fractional(width):
+    (spec,) = parse_indicators(f"bb:20:{width}")
+    assert spec.params == (20, float(width))
+
+
+@pytest.mark.parametrize("width", ["0", "-1"])
+def test_bollinger_width_must_be_positive(width):
+    with pytest.raises(InvalidIndicator):
+        parse_indicators(f"bb:20:{width}")
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from core.price_validation import Quarantine
+
+
+def bars(closes, symbol=b"AAA", start="2024-01-01"):
+    closes = np.array(closes, dtype=np.float64)
+    return {
+        "symbols": np.full(closes.shape[0], symbol),
+        "times": np.datetime64(start, "us") + np.arange(closes.shape[0]) * np.timedelta64(1, "D"),
+        "opens": closes,
+        "highs": closes,
+        "lows": closes,
+        "closes": closes,
+        "volumes": np.full(closes.shape[0], 100, dtype=np.int64),
+    }
+
+
+def screened_in_chunks(columns, size):
+    """Accepted closes and quarantined (time, reason) of ``columns`` screened ``size`` bars at a time."""
+    quarantine = Quarantine()
+    count = columns["symbols"].shape[0]
+    accepted = []
+    for start in range(0, count, size):
+        chunk = {name: values[start:start + size] for name, values in columns.items()}
+        accepted.append(quarantine.screen("prices.csv", chunk, final=start + size >= count)["closes"])
+    return np.concatenate(accepted).tolist(), [(row[2], row[-1]) for row in quarantine.rows]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 4, 5])
+def test_a_spike_across_chunks_is_quarantined(size):
+    columns = bars([10.0, 10.1, 10.2, 100.0, 10.3, 10.4])
+
+    assert screened_in_chunks(columns, size) == screened_in_chunks(columns, 6)
+    assert screened_in_chunks(columns, size)[1] == [("2024-01-04T00:00:00+00:00", "outlier_return")]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 4])
+def test_order_and_duplicates_across_chunks(size):
+    columns = bars([10.0, 10.1, 10.2, 10.3, 10.4])
+    # The fourth bar repeats the time of the third, the fifth goes back in time.
+    columns["times"][3] = columns["times"][2]
+    columns["times"][4] = columns["times"][0] - np.timedelta64(1, "D")
+
+    closes, quarantined = screened_in_chunks(columns, size)
+
+    assert closes == [10.0, 10.1, 10.3]
+    assert quarantined == [("2024-01-03T00:00:00+00:00", "duplicate_time"),
+                           ("2023-12-31T00:00:00+00:00", "out_of_order")]
+
+
+def test_a_lasting_jump_across_chunks_is_kept():
+    columns = bars([10.0, 10.1, 20.0, 20.1, 20.2])
+
+    assert screened_in_chunks(columns, 2) == ([10.0, 10.1, 20.0, 20.1, 20.2], [])
+
+
+def test_the_last_chunk_may_be_empty():
+    quarantine = Quarantine()
+    columns = bars([10.0, 10.1])
+
+    first = quarantine.screen("prices.csv", columns, final=False)
+    last = quarantine.screen("prices.csv", {name: values[:0] for name, values in columns.items()})
+
+    assert first["closes"].tolist() == [10.0]
+    assert last["closes"].tolist() == [10.1]
+
+
+def test_sources_are_carried_apart():
+    quarantine = Quarantine()
+
+    quarantine.screen("a.csv", bars([10.0, 10.1]), final=False)
+    other = quarantine.screen("b.csv", bars([20.0, 20.1], symbol=b"BBB"))
+    rest = quarantine.screen("a.csv", bars([10.2], start="2024-01-03"))
+
+    assert other["closes"].tolist() == [20.0, 20.1]
+    assert rest["closes"].tolist() == [10.1, 10.2]
+
+
+def test_a_first_session_trades_within_the_wider_band():
+    columns = bars([10.0, 10.1, 10.2])
+    columns["highs"] = columns["highs"] * np.array([1.4, 1.4, 1.0])
+
+    closes, quarantined = screened_in_chunks(columns, 3)
+
+    assert closes == [10.0, 10.2]
+    assert quarantined == [("2024-01-02T00:00:00+00:00", "outlier_range")]
+
+
+@pytest.mark.parametrize("weeks, reasons", [(8, []), (2, ["outlier_return"])])
+def test_a_move_after_a_suspension_is_kept(weeks, reasons):
+    columns = bars([10.0, 10.1, 14.0, 10.2])
+    columns["times"][2:] += np.timedelta64(7 * weeks, "D")
+
+    assert [reason for _, reason in screened_in_chunks(columns, 2)[1]] == reasons
@@ -0,0 +1,37 @@
+import asyncio
+import time
+
+from core.rate_limit import TokenBucket
+
+
+def acquire_times(bucket, count):
+    """Seconds from the start at which each of ``count`` concurrent acquires got its token."""
+    async def run():
+        started = time.monotonic()
+        times = []
+
+        async def acquire():
+            await bucket.acquire()
+            times.append(time.monotonic() - started)
+
+        await asyncio.gather(*(acquire() for _ in range(count)))
+        return sorted(times)
+
+    return asyncio.run(run())
+
+
+def test_a_burst_up_to_the_capacity_is_not_delayed():
+    assert acquire_times(TokenBucket(rate=10, capacity=5), 5)[-1] < 0.05
+
+
+def test_tokens_beyond_the_capacity_come_at_the_rate():
+    times = acquire_times(TokenBucket(rate=50, capacity=2), 7)
+
+    # Two from the burst, the next five one every 20ms.
+    assert times[1] < 0.02
+    assert 0.09 <= times[-1] < 0.3
+
+
+def test_the_capacity_defaults_to_one_second_of_tokens():
+    assert TokenBucket(rate=8).capacity == 8
+    assert TokenBucket(rate=0.5).capacity == 1
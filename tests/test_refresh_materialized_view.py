@@ -0,0 +1,34 @@
+import datetime
+
+import pytest
+import pytz
+
+from core.candle_query import VIEW_INTERVALS
+from scripts.refresh_materialized_view import SCHEDULED_LOOKBACK, refresh_window
+
+LONG_BUCKET_VIEWS = ["one_week_candle", "one_month_candle", "three_months_candle", "six_months_candle",
+                     "one_year_candle"]
+
+
+@pytest.mark.parametrize("view", LONG_BUCKET_VIEWS)
+def test_scheduled_window_covers_the_bucket_in_progress(view):
+    since = datetime.datetime(2026, 10, 18, tzinfo=pytz.utc) - SCHEDULED_LOOKBACK
+    start, end = refresh_window(view, since=since)
+    interval = VIEW_INTERVALS[view]
+    # The end is the bucket after the one holding now(), at least one bucket after the start.
+    assert start == f"time_bucket(INTERVAL '{interval}', TIMESTAMPTZ '2026-10-15 00:00:00+00')"
+    assert end == f"time_bucket(INTERVAL '{interval}', now()) + INTERVAL '{interval}'"
+
+
+def test_window_ends_after_the_bucket_of_until():
+    since = datetime.datetime(2026, 10, 1, tzinfo=pytz.utc)
+    until = datetime.datetime(2026, 10, 2, 7, tzinfo=pytz.utc)
+    start, end = refresh_window("one_month_candle", since=since, until=until)
+    assert start == "time_bucket(INTERVAL '1 month', TIMESTAMPTZ '2026-10-01 00:00:00+00')"
+    assert end == "time_bucket(INTERVAL '1 month', TIMESTAMPTZ '2026-10-02 07:00:00+00') + INTERVAL '1 month'"
+
+
+def test_full_refresh_starts_at_the_beginning():
+    start, end = refresh_window("one_day_candle")
+    assert start == "NULL"
+    assert end == "time_bucket(INTERVAL '1 day', now()) + INTERVAL '1 day'"
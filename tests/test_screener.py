@@ -0,0 +1,84 @@
+import pytest
+
+from core.indicators import MAX_PERIOD
+from core.screener import DAY, InvalidExpression, MarketMatrix, parse_expression, screen
+
+CLOSE, VOLUME = ("series", "close"), ("series", "volume")
+
+
+def number(value):
+    return ("number", float(value))
+
+
+@pytest.mark.parametrize("expression, node", [
+    ("close > 1 + 2 * 3", (">", CLOSE, ("+", number(1), ("*", number(2), number(3))))),
+    ("close > (1 + 2) * 3", (">", CLOSE, ("*", ("+", number(1), number(2)), number(3)))),
+    ("close > 8 - 4 - 2", (">", CLOSE, ("-", ("-", number(8), number(4)), number(2)))),
+    ("close > -volume / 2", (">", CLOSE, ("/", ("neg", VOLUME), number(2)))),
+    ("close > sma(close, 50)", (">", CLOSE, ("call", "sma", CLOSE, 50))),
+    ("close > 1 or close < 2 and volume > 3",
+     ("or", (">", CLOSE, number(1)), ("and", ("<", CLOSE, number(2)), (">", VOLUME, number(3))))),
+    ("(close > 1 or close < 2) and volume > 3",
+     ("and", ("or", (">", CLOSE, number(1)), ("<", CLOSE, number(2))), (">", VOLUME, number(3)))),
+    ("not close > 1 and volume > 3", ("and", ("not", (">", CLOSE, number(1))), (">", VOLUME, number(3)))),
+    ("CLOSE > 1 AND Volume > 3", ("and", (">", CLOSE, number(1)), (">", VOLUME, number(3)))),
+])
+def test_operator_precedence(expression, node):
+    assert parse_expression(expression) == node
+
+
+@pytest.mark.parametrize("expression", ["close > sma(close, 0)", "close > sma(close, 2.5)",
+                                        f"close > sma(close, {MAX_PERIOD + 1})", "close > sma(close, 100000000)",
+                                        "close > sma(close)", "close > sma(close, volume)"])
+def test_invalid_periods_are_rejected(expression):
+    with pytest.raises(InvalidExpression):
+        parse_expression(expression)
+
+
+def test_longest_period_is_accepted():
+    assert parse_expression(f"close > ema(close, {MAX_PERIOD})") == (">", CLOSE, ("call", "ema", CLOSE, MAX_PERIOD))
+
+
+@pytest.mark.parametrize("expression", ["close > macd(close, 12)", "price > 1", "close > sma", "close + 1",
+                                        "close > 1 volume", "close > (1", "close > 1 ; drop", ""])
+def test_unknown_names_and_malformed_filters_are_rejected(expression):
+    with pytest.raises(InvalidExpression):
+        parse_expression(expression)
+
+
+def market(**closes):
+    """A matrix of one close per day for each symbol, ``None`` where the symbol has no bar."""
+    return MarketMatrix.from_records([
+        (symbol, day * DAY, close, 1000)
+        for symbol, series in closes.items()
+        for day, close in enumerate(series)
+        if close is not None
+    ])
+
+
+MARKET = market(
+    AAA=[10, 11, 12, 13, 14, 15, 16, 17],
+    BBB=[17, 16, 15, 14, 13, 12, 11, 10],
+    # Suspended for the last sessions.
+    CCC=[10, 11, None, None, None, None, None, None],
+    # Listed three sessions ago.
+    DDD=[None, None, None, None, None, 5, 6, 7],
+)
+
+
+@pytest.mark.parametrize("expression, symbols", [
+    ("close > 0", ["AAA", "BBB", "DDD"]),
+    ("close > sma(close, 3)", ["AAA", "DDD"]),
+    # DDD has not traded for long enough to settle the average.
+    ("close > sma(close, 5)", ["AAA"]),
+    ("change(close, 1) < 0", ["BBB"]),
+    ("close >= highest(close, 8) or close <= lowest(close, 8)", ["AAA", "BBB"]),
+    ("close > 12 and not change(close, 2) > 20", ["AAA"]),
+    ("volume > 2 * sma(volume, 3)", []),
+])
+def test_screen_matches_on_the_last_day(expression, symbols):
+    assert MARKET.symbols[screen(MARKET, parse_expression(expression))].tolist() == symbols
+
+
+def test_an_empty_market_matches_nothing():
+    assert screen(MarketMatrix.from_records([]), parse_expression("close > 0")).tolist() == []
@@ -0,0 +1,129 @@
+import asyncio
+
+import httpx
+import pytest
+
+from core import statement_crawler
+from core.rate_limit import TokenBucket
+from core.statement_crawler import MAX_ATTEMPTS, StatementJob, statement_hash
+from scripts import download_scfa_data
+
+JOB = StatementJob("AAA", "balancesheet", True)
+STATEMENT = [{"ticker": "AAA", "year": 2023, "cash": 100}]
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    async def sleep(seconds):
+        pass
+
+    monkeypatch.setattr(statement_crawler.asyncio, "sleep", sleep)
+
+
+def fetch_statement(answers):
+    """Run fetch_statement against a TCBS answering ``answers`` in turn, an exception is raised by the transport."""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        answer = answers[len(requests) - 1]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    async def run():
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(transport=transport, base_url=statement_crawler.TCBS_BASE_URL) as client:
+            return await statement_crawler.fetch_statement(client, TokenBucket(1000), JOB)
+
+    return asyncio.run(run()), requests
+
+
+def test_throttling_and_server_errors_are_retried():
+    statement, requests = fetch_statement([httpx.Response(502), httpx.ReadTimeout("slow"),
+                                           httpx.Response(200, json=STATEMENT)])
+
+    assert statement == STATEMENT
+    assert len(requests) == 3
+    assert requests[0].url.path == "/tcanalysis/v1/finance/AAA/balancesheet"
+    assert requests[0].url.params["yearly"] == "1"
+
+
+def test_gives_up_after_max_attempts():
+    statement, requests = fetch_statement([httpx.Response(429)] * MAX_ATTEMPTS)
+
+    assert statement is None
+    assert len(requests) == MAX_ATTEMPTS
+
+
+@pytest.mark.parametrize("answer", [
+    httpx.Response(400, text="Bad ticker"),
+    httpx.Response(200, text="<html>maintenance</html>"),
+    httpx.Response(200, json=[]),
+])
+def test_a_statement_without_content_is_skipped_at_once(answer):
+    statement, requests = fetch_statement([answer])
+
+    assert statement is None
+    assert len(requests) == 1
+
+
+def test_the_hash_ignores_key_order():
+    assert statement_hash({"a": 1, "b": [1, 2]}) == statement_hash({"b": [1, 2], "a": 1})
+    assert statement_hash({"a": 1}) != statement_hash({"a": 2})
+
+
+class FakeSession:
+    """Stands in for the writer session: answers ``stored`` hashes and records the other statements."""
+
+    def __init__(self, stored):
+        self.stored = stored
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, statement, params=None):
+        if "SELECT symbol, yearly, content_hash" in str(statement):
+            return self
+        self.executed.append((str(statement), params))
+
+    def all(self):
+        return self.stored
+
+    def commit(self):
+        pass
+
+
+def write_statements(monkeypatch, batch, stored):
+    """The statements ``write_statements`` executed and the symbols it reported changed."""
+    session = FakeSession(stored)
+    monkeypatch.setattr(download_scfa_data, "Session", lambda engine: session)
+    changed = {}
+    download_scfa_data.write_statements(batch, changed)
+    return session.executed, changed
+
+
+def test_unchanged_statements_are_not_rewritten(monkeypatch):
+    changed_statement = [{"ticker": "BBB", "year": 2023, "cash": 200}]
+    stored = [("AAA", True, statement_hash(STATEMENT)), ("BBB", True, statement_hash(STATEMENT))]
+
+    executed, changed = write_statements(
+        monkeypatch, [(JOB, STATEMENT), (JOB._replace(symbol="BBB"), changed_statement)], stored)
+
+    (upsert, rows), (bump, versions) = executed
+    assert "INSERT INTO balancesheet" in upsert
+    assert [(row["symbol"], row["content_hash"]) for row in rows] == [("BBB", statement_hash(changed_statement))]
+    assert "INSERT INTO dataversion" in bump
+    assert versions == [{"scope": "balancesheet", "symbol": "BBB"}]
+    assert changed == {"balancesheet": {"BBB"}}
+
+
+def test_a_batch_without_changes_writes_nothing(monkeypatch):
+    executed, changed = write_statements(monkeypatch, [(JOB, STATEMENT)], [("AAA", True, statement_hash(STATEMENT))])
+
+    assert executed == []
+    assert changed == {}